@@ -138,6 +138,31 @@ function transformGetHouseResponseToMatches(
   return matches;
 }
 
+// Transform Lambda response from match_complaint to NoiseMatch format
+// Houses hold column arrays: timestamps, noiseClasses (only when no noise class was given) and total
+function transformMatchComplaintResponseToMatches(responseData: any): NoiseMatch[] {
+  const matches: NoiseMatch[] = [];
+
+  if (responseData.houses) {
+    for (const [houseName, record] of Object.entries<any>(responseData.houses)) {
+      const timestamps: number[] = Array.isArray(record.timestamps) ? record.timestamps : [];
+
+      timestamps.forEach((timestamp, i) => {
+        const noiseClass = record.noiseClasses ? record.noiseClasses[i] : responseData.noiseClass;
+        matches.push({
+          id: `${houseName}_${timestamp}`,
+          houseName,
+          timestamp: unixToIsoTimestamp(timestamp),
+          confidenceScore: 0, // Will be calculated in MatchingResults component
+          description: getDescriptionFromNoiseClass(noiseClass),
+        });
+      });
+    }
+  }
+
+  return matches;
+}
+
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json();
@@ -163,7 +188,7 @@ export async function POST(request: NextRequest) {
     }
 
     // Check if mock mode is enabled (for testing)
-    const useMockData = process.env.USE_MOCK_DATA === 'true' || (!process.env.LAMBDA_GET_HOUSE_WITHOUT_LABEL_ENDPOINT && !process.env.LAMBDA_GET_HOUSE_ENDPOINT);
+    const useMockData = process.env.USE_MOCK_DATA === 'true' || (!process.env.LAMBDA_GET_HOUSE_WITHOUT_LABEL_ENDPOINT && !process.env.LAMBDA_GET_HOUSE_ENDPOINT && !process.env.LAMBDA_MATCH_COMPLAINT_ENDPOINT);
     
     if (useMockData) {
       console.log('Using mock data for testing');
@@ -228,6 +253,53 @@ export async function POST(request: NextRequest) {
 
     // Try to determine noise class from description
     const noiseClass = getNoiseClassFromDescription(body.description);
+
+    // Single call: match_complaint returns the matches and the total records together
+    const matchComplaintEndpoint = process.env.LAMBDA_MATCH_COMPLAINT_ENDPOINT;
+    if (matchComplaintEndpoint) {
+      try {
+        const url = new URL(matchComplaintEndpoint);
+        if (noiseClass !== null) {
+          url.searchParams.append('noiseClass', noiseClass.toString());
+        }
+        url.searchParams.append('startTimestamp', startTimestamp.toString());
+        url.searchParams.append('endTimestamp', endTimestamp.toString());
+
+        const lambdaResponse = await fetch(url.toString(), {
+          method: 'GET',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+        });
+
+        if (lambdaResponse.ok) {
+          const lambdaData = await lambdaResponse.json();
+
+          // Handle Lambda response format
+          let responseData = lambdaData;
+          if (lambdaData.statusCode && lambdaData.body) {
+            responseData = typeof lambdaData.body === 'string'
+              ? JSON.parse(lambdaData.body)
+              : lambdaData.body;
+          }
+
+          const matches = transformMatchComplaintResponseToMatches(responseData);
+          return NextResponse.json(
+            {
+              matches,
+              totalRecords: responseData.totalRecords ?? matches.length,
+              message: matches.length > 0
+                ? `Found ${matches.length} matching noise record(s) (via match_complaint)`
+                : 'No matching noise records found in the specified time range'
+            },
+            { status: 200 }
+          );
+        }
+        console.warn(`match_complaint endpoint returned ${lambdaResponse.status}, falling back to get_house/get_house_without_label`);
+      } catch (error) {
+        console.warn('Error calling match_complaint endpoint, falling back to get_house/get_house_without_label:', error);
+      }
+    }
     const getHouseEndpoint = process.env.LAMBDA_GET_HOUSE_ENDPOINT;
     const useGetHouseEndpoint = noiseClass !== null && getHouseEndpoint;
     
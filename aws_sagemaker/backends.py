@@ -0,0 +1,152 @@
+import io
+import time
+import joblib
+import numpy as np
+
+from sklearn.ensemble import (RandomForestClassifier, GradientBoostingClassifier, VotingClassifier,
+                              ExtraTreesClassifier, HistGradientBoostingClassifier)
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline
+
+def build_voting(n_jobs):
+    """Soft-voting RandomForest + GradientBoosting ensemble (the original architecture)."""
+    rf = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10, n_jobs=n_jobs)
+    gb = GradientBoostingClassifier(n_estimators=100, random_state=42, max_depth=5)
+
+    # The two members are fitted in parallel, since GradientBoosting itself is single-threaded
+    return VotingClassifier(
+        estimators=[('rf', rf), ('gb', gb)],
+        voting='soft',
+        n_jobs=n_jobs
+    )
+
+def build_hist_gb(n_jobs):
+    """Histogram-based gradient boosting. Uses all cores through OpenMP, so n_jobs is not used."""
+    return HistGradientBoostingClassifier(max_iter=100, max_depth=5, random_state=42)
+
+def build_extra_trees(n_jobs):
+    """Extremely randomized trees, cheaper to train than a RandomForest of the same size."""
+    return ExtraTreesClassifier(n_estimators=100, max_depth=10, random_state=42, n_jobs=n_jobs)
+
+def build_random_forest(n_jobs):
+    """The RandomForest member of the voting ensemble on its own."""
+    return RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42, n_jobs=n_jobs)
+
+def build_logistic(n_jobs):
+    """Small multinomial linear model, the cheapest to predict."""
+    return LogisticRegression(max_iter=1000)
+
+# Registry of classifier backends selectable with the 'backend' hyperparameter
+BACKENDS = {
+    'voting': build_voting,
+    'hist_gb': build_hist_gb,
+    'extra_trees': build_extra_trees,
+    'random_forest': build_random_forest,
+    'logistic': build_logistic,
+}
+
+def build_pipeline(backend='voting', n_jobs=-1):
+    """
+    Build a new, unfitted scaler + classifier pipeline for the given backend.
+
+    Args:
+        backend: Name of a backend in BACKENDS
+        n_jobs: Number of cores used for training and prediction where the backend supports it (-1 = all)
+
+    Returns:
+        pipeline: Unfitted Pipeline
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+    # Keep the 'voting_classifier' step name so that pipelines saved before the registry still load
+    step_name = 'voting_classifier' if backend == 'voting' else 'classifier'
+
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        (step_name, BACKENDS[backend](n_jobs))
+    ])
+
+def set_inference_n_jobs(pipeline, n_jobs=1):
+    """
+    Set every n_jobs parameter of a fitted pipeline (the VotingClassifier and its members), in place.
+
+    The training n_jobs is saved in model.joblib, and with n_jobs != 1 every predict_proba call of the
+    Lambda (a few rows) goes through joblib's parallel dispatch over the trees, which only adds overhead.
+
+    Returns:
+        pipeline
+    """
+    params = {name: n_jobs for name in pipeline.get_params(deep=True) if name.split('__')[-1] == 'n_jobs'}
+    pipeline.set_params(**params)
+    return pipeline
+
+def model_size_bytes(pipeline):
+    """Size of the pipeline when saved with joblib, i.e. the size of model.joblib."""
+    buffer = io.BytesIO()
+    joblib.dump(pipeline, buffer)
+    return buffer.getbuffer().nbytes
+
+def measure_inference(pipeline, X_test, y_test, n_single=200):
+    """
+    Measure prediction latency and accuracy of a fitted pipeline.
+
+    Single-row latency is what the inference Lambda sees (one frame per call),
+    batch latency is the cost per row when predicting the whole test set at once.
+    Call it on the configuration that is saved, i.e. after set_inference_n_jobs.
+
+    Returns:
+        Dictionary with 'accuracy', 'single_row_ms' (median), 'batch_ms_per_row' and 'model_size_kb'
+    """
+    # Single-row predictions, cycling through the test set
+    single_times = []
+    for i in range(n_single):
+        row = X_test[i % len(X_test)].reshape(1, -1)
+        start = time.perf_counter()
+        pipeline.predict(row)
+        single_times.append(time.perf_counter() - start)
+
+    # Whole test set at once
+    start = time.perf_counter()
+    y_pred = pipeline.predict(X_test)
+    batch_time = time.perf_counter() - start
+
+    return {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'single_row_ms': float(np.median(single_times)) * 1000,
+        'batch_ms_per_row': batch_time * 1000 / len(X_test),
+        'model_size_kb': model_size_bytes(pipeline) / 1024
+    }
+
+def benchmark_backend(backend, X_train, y_train, X_test, y_test, n_jobs=-1):
+    """
+    Train one backend from scratch and measure train time, latency, size and accuracy.
+
+    Returns:
+        pipeline: The fitted pipeline
+        result: Dictionary with the backend name, 'train_s' and the measure_inference results
+    """
+    pipeline = build_pipeline(backend, n_jobs)
+
+    start = time.perf_counter()
+    pipeline.fit(X_train, y_train)
+    train_time = time.perf_counter() - start
+
+    # Latency as the saved model would have it
+    set_inference_n_jobs(pipeline)
+    result = {'backend': backend, 'train_s': train_time}
+    result.update(measure_inference(pipeline, X_test, y_test))
+
+    return pipeline, result
+
+def format_report(results):
+    """Format backend benchmark results as a human-readable table, fastest single-row prediction first."""
+    lines = [f"{'Backend':<15} {'Train (s)':>10} {'1-row (ms)':>11} {'Batch (ms/row)':>15} {'Size (KB)':>10} {'Accuracy':>9}"]
+
+    for r in sorted(results, key=lambda r: r['single_row_ms']):
+        lines.append(f"{r['backend']:<15} {r['train_s']:>10.3f} {r['single_row_ms']:>11.3f} "
+                     f"{r['batch_ms_per_row']:>15.4f} {r['model_size_kb']:>10.1f} {r['accuracy']:>9.4f}")
+
+    return "\n".join(lines)
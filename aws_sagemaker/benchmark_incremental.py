@@ -0,0 +1,83 @@
+###########################################################################
+# Benchmark incremental fine-tuning against a full refit                  #
+# Run locally: python benchmark_incremental.py                            #
+###########################################################################
+
+import time
+import argparse
+
+from sklearn.datasets import make_classification
+
+from backends import build_pipeline
+from incremental import incremental_fit
+
+def make_dataset(n_samples, seed):
+    """
+    Create a synthetic 3-class dataset with the same number of features as extract_spectral_features.
+    """
+    X, y = make_classification(
+        n_samples=n_samples,
+        n_features=13,
+        n_informative=8,
+        n_classes=3,
+        random_state=seed
+    )
+    return X, y
+
+def benchmark(sizes, new_fraction, new_estimators):
+    """
+    For each dataset size, time a full refit on old + new data against an incremental fit on new data only.
+
+    Args:
+        sizes: List of number of frames already trained on
+        new_fraction: Size of the newly added data as a fraction of the existing data
+        new_estimators: Number of trees/stages added to each ensemble member in incremental mode
+
+    Returns:
+        results: List of dictionaries with timings per dataset size
+    """
+    results = []
+
+    for n_samples in sizes:
+        n_new = max(30, int(n_samples * new_fraction))
+        X, y = make_dataset(n_samples + n_new, seed=n_samples)
+        X_old, y_old = X[:n_samples], y[:n_samples]
+        X_new, y_new = X[n_samples:], y[n_samples:]
+
+        # Pretrained model on the existing data
+        pretrained = build_pipeline()
+        pretrained.fit(X_old, y_old)
+
+        # Full refit on everything
+        start = time.perf_counter()
+        build_pipeline().fit(X, y)
+        full_time = time.perf_counter() - start
+
+        # Incremental fit on the new data only
+        start = time.perf_counter()
+        incremental_fit(pretrained, X_new, y_new, n_new_estimators=new_estimators)
+        incremental_time = time.perf_counter() - start
+
+        results.append({
+            "existing_frames": n_samples,
+            "new_frames": n_new,
+            "full_refit_s": full_time,
+            "incremental_s": incremental_time,
+            "speedup": full_time / incremental_time
+        })
+
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000, 50000])
+    parser.add_argument('--new-fraction', type=float, default=0.05)
+    parser.add_argument('--new-estimators', type=int, default=20)
+    args = parser.parse_args()
+
+    results = benchmark(args.sizes, args.new_fraction, args.new_estimators)
+
+    print(f"\n{'Existing':>10} {'New':>8} {'Full refit (s)':>15} {'Incremental (s)':>16} {'Speedup':>8}")
+    for r in results:
+        print(f"{r['existing_frames']:>10} {r['new_frames']:>8} {r['full_refit_s']:>15.3f} "
+              f"{r['incremental_s']:>16.3f} {r['speedup']:>7.1f}x")
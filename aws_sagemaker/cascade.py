@@ -0,0 +1,114 @@
+import json
+import time
+import numpy as np
+
+from sklearn.metrics import accuracy_score
+
+# Columns of the feature array used by the gate (see extract_spectral_features)
+TOTAL_MAGNITUDE_IDX = 6  # np.sum(magnitude)
+LOW_BAND_ENERGY_IDX = 12  # np.sum(magnitude[frequency < 100])
+
+BACKGROUND_LABEL = 0
+
+GATE_FILE_NAME = "energy_gate.json"
+
+def apply_energy_gate(X, gate):
+    """
+    Windows the gate classifies as background without running the model.
+
+    Returns:
+        gated: Boolean array, True where both the total magnitude and the low-band energy are at most the thresholds
+    """
+    return (X[:, TOTAL_MAGNITUDE_IDX] <= gate['max_total']) & (X[:, LOW_BAND_ENERGY_IDX] <= gate['max_low_band'])
+
+def fit_energy_gate(X, y, target_precision=0.99, n_quantiles=20):
+    """
+    Learn the energy gate thresholds.
+
+    Candidate thresholds are quantiles of the total magnitude and low-band energy of the background
+    windows. The pair that lets the most windows through the gate, while at least target_precision
+    of them are background, is kept.
+
+    Args:
+        X: Feature array of shape (n_windows, 13)
+        y: Label array
+        target_precision: Minimum fraction of gated windows that must be background
+
+    Returns:
+        gate: Dictionary with 'max_total', 'max_low_band', 'precision' and 'coverage' (fraction of windows
+              gated), or None if no thresholds reach the target precision
+    """
+    background = X[y == BACKGROUND_LABEL]
+    if len(background) == 0:
+        return None
+
+    levels = np.linspace(0, 100, n_quantiles + 1)
+    total_thresholds = np.percentile(background[:, TOTAL_MAGNITUDE_IDX], levels)
+    low_band_thresholds = np.percentile(background[:, LOW_BAND_ENERGY_IDX], levels)
+
+    gate = None
+    best_gated = 0
+    for max_total in total_thresholds:
+        for max_low_band in low_band_thresholds:
+            candidate = {'max_total': float(max_total), 'max_low_band': float(max_low_band)}
+            gated = apply_energy_gate(X, candidate)
+            n_gated = int(gated.sum())
+            if n_gated <= best_gated:
+                continue
+
+            precision = float(np.mean(y[gated] == BACKGROUND_LABEL))
+            if precision >= target_precision:
+                gate = dict(candidate, precision=precision, coverage=n_gated / len(X))
+                best_gated = n_gated
+
+    return gate
+
+def predict_with_gate(pipeline, gate, X):
+    """
+    Cascade prediction: gated windows are background, only the others go through the model.
+    """
+    y_pred = np.full(len(X), BACKGROUND_LABEL)
+    ungated = ~apply_energy_gate(X, gate)
+    if ungated.any():
+        y_pred[ungated] = pipeline.predict(X[ungated])
+    return y_pred
+
+def evaluate_cascade(pipeline, gate, X_test, y_test, n_single=200):
+    """
+    Compare the cascade with the model alone.
+
+    Latency is measured one window at a time, as windows arrive at the inference Lambda.
+
+    Returns:
+        Dictionary with the fraction of windows short-circuited, the accuracy with and without the gate,
+        and the mean single-window latency (ms) with and without the gate
+    """
+    gated = apply_energy_gate(X_test, gate)
+    model_accuracy = accuracy_score(y_test, pipeline.predict(X_test))
+    cascade_accuracy = accuracy_score(y_test, predict_with_gate(pipeline, gate, X_test))
+
+    rows = X_test[:n_single]
+    start = time.perf_counter()
+    for row in rows:
+        pipeline.predict(row[None, :])
+    model_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+    start = time.perf_counter()
+    for row in rows:
+        predict_with_gate(pipeline, gate, row[None, :])
+    cascade_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+    return {
+        'short_circuited': float(np.mean(gated)),
+        'gate_precision': float(np.mean(y_test[gated] == BACKGROUND_LABEL)) if gated.any() else None,
+        'model_accuracy': model_accuracy,
+        'cascade_accuracy': cascade_accuracy,
+        'accuracy_change': cascade_accuracy - model_accuracy,
+        'model_ms_per_window': model_ms,
+        'cascade_ms_per_window': cascade_ms
+    }
+
+def save_energy_gate(path, gate, report=None):
+    """Save the gate thresholds (and the test report) as JSON, next to model.joblib."""
+    with open(path, 'w') as f:
+        json.dump({**gate, 'test_report': report}, f, indent=4)
@@ -3,6 +3,17 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 
+def split_frame_ids(frame_ids, train_split=0.8, val_split=0.1):
+    """
+    Split frame IDs into train/val/test, the same way for whole and streamed channels.
+
+    Returns:
+        train_frames, val_frames, test_frames
+    """
+    train_frames, temp_frames = train_test_split(frame_ids, train_size=train_split, random_state=42)
+    val_frames, test_frames = train_test_split(temp_frames, train_size=val_split/(1-train_split), random_state=42)
+    return train_frames, val_frames, test_frames
+
 def create_model_dataset(df, train_split=0.8, val_split=0.1):
     """
     Split frequency domain data into train/val/test sets.
@@ -19,8 +30,7 @@ def create_model_dataset(df, train_split=0.8, val_split=0.1):
     frame_ids = df['frame_id'].unique()
     
     # Split frame IDs (not rows)
-    train_frames, temp_frames = train_test_split(frame_ids, train_size=train_split, random_state=42)
-    val_frames, test_frames = train_test_split(temp_frames, train_size=val_split/(1-train_split), random_state=42)
+    train_frames, val_frames, test_frames = split_frame_ids(frame_ids, train_split, val_split)
     
     # Filter DataFrame by frame IDs
     train_df = df[df['frame_id'].isin(train_frames)]
@@ -68,6 +78,46 @@ def extract_spectral_features(freq_df):
     
     return np.array(features)
 
+def extract_spectral_features_batch(frequency, magnitude):
+    """
+    Extract the same features as extract_spectral_features for many frames at once.
+
+    Args:
+        frequency: Array of frequency bins (Hz), shared by all frames
+        magnitude: Array of shape (n_frames, n_bins)
+
+    Returns:
+        features: Array of shape (n_frames, 13)
+    """
+    total = np.sum(magnitude, axis=1)
+
+    # Spectral features
+    spectral_centroid = magnitude @ frequency / total
+    dominant_freq = frequency[np.argmax(magnitude, axis=1)]
+
+    cumsum = np.cumsum(magnitude, axis=1)
+    rolloff_idx = np.argmax(cumsum >= 0.85 * cumsum[:, -1:], axis=1)
+    spectral_rolloff = frequency[rolloff_idx]
+
+    spectral_bandwidth = np.sqrt(np.sum(((frequency - spectral_centroid[:, None]) ** 2) * magnitude, axis=1) / total)
+
+    return np.column_stack([
+        # Statistical features (8 features)
+        np.mean(magnitude, axis=1),
+        np.std(magnitude, axis=1),
+        np.max(magnitude, axis=1),
+        np.median(magnitude, axis=1),
+        np.percentile(magnitude, 25, axis=1),
+        np.percentile(magnitude, 75, axis=1),
+        total,
+        np.var(magnitude, axis=1),
+        spectral_centroid,
+        dominant_freq,
+        spectral_rolloff,
+        spectral_bandwidth,
+        np.sum(magnitude[:, frequency < 100], axis=1)
+    ])
+
 def load_dataset_with_features(df, label_id, split='train'):
     """
     Load dataset with extracted features (one per frame).
@@ -0,0 +1,159 @@
+import os
+import json
+import numpy as np
+
+# Training state is saved next to model.joblib so that the next fine-tune knows which rows are new
+STATE_FILE_NAME = "training_state.json"
+
+# Test windows the model was never trained on, saved next to model.joblib so that the next fine-tune
+# checks its accuracy on the old data as well as on the new test windows
+HOLDOUT_FILE_NAME = "holdout.npz"
+
+# Fewer new frames in a channel cannot be split into train, validation and test sets,
+# so they are left for the next run
+MIN_NEW_FRAMES = 20
+
+def load_training_state(state_path):
+    """
+    Load the training state saved alongside a previous model.
+
+    Args:
+        state_path: Path to training_state.json
+
+    Returns:
+        state: Dictionary with 'frame_size', 'overlap_percent' and per-channel 'rows' consumed,
+               or None if no state file exists
+    """
+    if not os.path.exists(state_path):
+        return None
+
+    with open(state_path, 'r') as f:
+        return json.load(f)
+
+def save_training_state(state_path, channel_rows, frame_size, overlap_percent):
+    """
+    Save how many rows of each channel CSV the current model has been trained on.
+
+    Args:
+        state_path: Path to training_state.json
+        channel_rows: Dictionary of channel name -> number of rows consumed
+        frame_size: Number of data points per frame used for training
+        overlap_percent: Overlap percentage between frames used for training
+    """
+    state = {
+        "frame_size": frame_size,
+        "overlap_percent": overlap_percent,
+        "rows": channel_rows
+    }
+
+    with open(state_path, 'w') as f:
+        json.dump(state, f, indent=4)
+
+def load_holdout(holdout_path):
+    """
+    Load the held-out test windows saved alongside a previous model.
+
+    Returns:
+        X: Feature array of the held-out windows, or None if no holdout file exists
+        y: Label array of the held-out windows, or None
+    """
+    if not os.path.exists(holdout_path):
+        return None, None
+
+    with np.load(holdout_path) as holdout:
+        return holdout['X'], holdout['y']
+
+def save_holdout(holdout_path, X, y):
+    """
+    Save the test windows of a model, which it has not been trained on.
+    """
+    np.savez_compressed(holdout_path, X=X, y=y)
+
+def consumed_rows(state, channel_name):
+    """
+    Number of rows of a channel CSV the pretrained model has been trained on (0 without a state).
+    """
+    if state is None:
+        return 0
+    return state.get("rows", {}).get(channel_name, 0)
+
+def new_rows_start(state, channel_name, frame_size, overlap_percent):
+    """
+    Get the first row of a channel CSV that has not been framed yet.
+
+    A full run starts frames at 0, hop_size, 2 * hop_size, ... while they fit in the rows.
+    The start is the next start on that grid after the last frame that fitted in the rows
+    consumed, so the new frames are exactly the ones a full run would add.
+
+    Returns:
+        start_row: Index of the first row to read, or 0 if the channel is new
+    """
+    rows_consumed = consumed_rows(state, channel_name)
+    hop_size = frame_size - int(frame_size * overlap_percent / 100)
+
+    return max(0, ((rows_consumed - frame_size) // hop_size + 1) * hop_size)
+
+def supports_incremental(pipeline):
+    """
+    Check that every classifier in the pipeline can grow more trees with warm_start.
+    """
+    if not hasattr(pipeline, 'named_steps'):
+        return False
+
+    classifier = pipeline.steps[-1][1]
+    if not hasattr(classifier, 'named_estimators_'):
+        return False
+
+    for name, estimator in classifier.named_estimators_.items():
+        params = estimator.get_params()
+        if 'warm_start' not in params or 'n_estimators' not in params:
+            print(f"  Estimator '{name}' does not support warm_start")
+            return False
+
+    return True
+
+def missing_classes(pipeline, y_new):
+    """
+    Classes of the fitted pipeline that do not appear in the new labels.
+    """
+    classifier = pipeline.steps[-1][1]
+    return sorted(set(classifier.classes_.tolist()) - set(np.unique(y_new).tolist()))
+
+def incremental_fit(pipeline, X_new, y_new, n_new_estimators=20):
+    """
+    Fine-tune a fitted scaler + voting classifier pipeline on new data only.
+
+    Existing trees are kept. Each ensemble member grows by n_new_estimators trees/stages
+    (via warm_start) that are fitted on the new data. The scaler is reused as is: updating it
+    would shift the inputs of the existing trees, whose thresholds were learned on the old scaling.
+
+    Args:
+        pipeline: Fitted Pipeline with a scaler step and a VotingClassifier as last step
+        X_new: Feature array of the new frames
+        y_new: Label array of the new frames
+        n_new_estimators: Number of trees/stages to add to each ensemble member
+
+    Returns:
+        pipeline: The same pipeline, fine-tuned in place
+    """
+    scaler = pipeline.steps[0][1]
+    classifier = pipeline.steps[-1][1]
+
+    # New trees must see the same set of classes as the existing trees
+    missing = missing_classes(pipeline, y_new)
+    if missing:
+        raise ValueError(f"New data is missing classes {missing}; a full refit is required")
+
+    X_scaled = scaler.transform(X_new)
+
+    # VotingClassifier fits its members on encoded labels
+    y_encoded = classifier.le_.transform(y_new)
+
+    for name, estimator in classifier.named_estimators_.items():
+        n_estimators = estimator.get_params()['n_estimators'] + n_new_estimators
+        estimator.set_params(warm_start=True, n_estimators=n_estimators)
+        estimator.fit(X_scaled, y_encoded)
+        estimator.set_params(warm_start=False)
+        print(f"  {name}: grown to {n_estimators} estimators")
+
+    return pipeline
@@ -77,7 +77,45 @@ def fourier_transform(df, frame_size, overlap_percent):
     
     return freq_df, sampling_rate
 
-def process_file(csv_file, frame_size=30, overlap_percent=50):
+def hop_size_for(frame_size, overlap_percent):
+    """
+    Number of data points between the starts of consecutive frames.
+    """
+    overlap_samples = int(frame_size * overlap_percent / 100)
+    return frame_size - overlap_samples
+
+def frame_spectra(signal, time_interval, frame_size, hop_size):
+    """
+    Vectorized windowed FFT of all frames of a signal at once.
+
+    Frames start at 0, hop_size, 2 * hop_size, ... exactly as in fourier_transform,
+    and the magnitudes are the same, but no per-frame DataFrame is built.
+
+    Args:
+        signal: 1D array of analog values
+        time_interval: Time between data points in milliseconds
+        frame_size: Number of data points in each frame/window
+        hop_size: Number of data points between the starts of consecutive frames
+
+    Returns:
+        frequency: Array of the non-negative frequency bins (Hz), shared by all frames
+        magnitude: Array of shape (n_frames, n_bins)
+    """
+    signal = np.asarray(signal, dtype=float)
+    n_bins = (frame_size + 1) // 2
+    frequency = np.arange(n_bins) / (frame_size * time_interval / 1000)
+    if len(signal) < frame_size:
+        return frequency, np.zeros((0, n_bins))
+
+    # (n_frames, frame_size) view of the signal without copying
+    frames = np.lib.stride_tricks.sliding_window_view(signal, frame_size)[::hop_size]
+
+    # Same bins as np.fft.fftfreq(...) >= 0 in fourier_transform
+    magnitude = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1))[:, :n_bins]
+
+    return frequency, magnitude
+
+def process_file(csv_file, frame_size=30, overlap_percent=70, start_row=0):
     """
     Process single CSV file
     Apply FFT to convert from time domain to frequency domain.
@@ -86,6 +124,7 @@ def process_file(csv_file, frame_size=30, overlap_percent=50):
         csv_file: Path to input CSV file
         frame_size: Number of data points in each frame/window
         overlap_percent: Overlap percentage between consecutive frames (0-100)
+        start_row: First data row to read, used to only process newly added data
     Returns:
         freq_df: DataFrame with 'frequency' (Hz) and 'magnitude' columns
         sampling_rate: Sampling rate in Hz
@@ -93,8 +132,8 @@ def process_file(csv_file, frame_size=30, overlap_percent=50):
     
     print(f"Processing {csv_file}...")
     
-    # Read CSV
-    time_df = pd.read_csv(csv_file)
+    # Read CSV, skipping rows that have already been processed (row 0 is the header)
+    time_df = pd.read_csv(csv_file, skiprows=range(1, start_row + 1))
     
     # Convert to frequency domain
     freq_df, sampling_rate = fourier_transform(time_df, frame_size, overlap_percent)
@@ -0,0 +1,198 @@
+###########################################################################
+# Streaming ingestion of channel CSVs for SageMaker File/FastFile/Pipe    #
+# Local check with a named pipe: python streaming.py --rows 1000000       #
+###########################################################################
+
+import os
+import time
+import argparse
+import threading
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from preprocessing import hop_size_for, frame_spectra
+from feature_extract import extract_spectral_features_batch, split_frame_ids
+
+# Rows parsed per chunk. Peak memory depends on this, not on the size of the CSV
+CHUNK_ROWS = 50000
+
+# Fewer frames cannot be split into train, validation and test sets
+MIN_SPLIT_FRAMES = 10
+
+def channel_source(channel_name, local_csv):
+    """
+    Find where to read a channel from.
+
+    SageMaker sets SM_CHANNEL_<NAME> to the channel directory. In Pipe mode the data is a FIFO
+    named <directory>_<epoch> next to it; in File and FastFile mode it is a CSV inside the directory
+    (downloaded up front in File mode, read lazily from S3 in FastFile mode).
+
+    Returns:
+        path: FIFO or CSV path, or local_csv when not running in SageMaker
+    """
+    channel_dir = os.environ.get(f"SM_CHANNEL_{channel_name.upper()}")
+    if channel_dir:
+        fifo = f"{channel_dir}_0"
+        if os.path.exists(fifo):
+            return fifo
+        if os.path.isdir(channel_dir):
+            csvs = sorted(f for f in os.listdir(channel_dir) if f.endswith('.csv'))
+            if csvs:
+                return os.path.join(channel_dir, csvs[0])
+
+    return local_csv
+
+class StreamingFramer:
+    """
+    Frames a signal that arrives in chunks, with the same frames as fourier_transform on the whole signal.
+
+    The points after the start of the next frame are carried over to the next chunk,
+    so frames that straddle a chunk boundary are not lost.
+    """
+
+    def __init__(self, frame_size, overlap_percent):
+        self.frame_size = frame_size
+        self.hop_size = hop_size_for(frame_size, overlap_percent)
+        self.carry = np.zeros(0)
+        self.time_interval = None
+        self.next_frame_id = 0
+
+    def push(self, timestamps, values):
+        """
+        Add a chunk of data points.
+
+        Returns:
+            frame_ids: IDs of the frames completed by this chunk
+            features: Feature array of shape (n_frames, 13)
+        """
+        # Sampling interval from the first two points of the stream, as in fourier_transform
+        if self.time_interval is None and len(timestamps) >= 2:
+            self.time_interval = float(timestamps[1] - timestamps[0])
+
+        buffer = np.concatenate([self.carry, np.asarray(values, dtype=float)])
+
+        if len(buffer) < self.frame_size or self.time_interval is None:
+            self.carry = buffer
+            return np.zeros(0, dtype=int), np.zeros((0, 13))
+
+        n_frames = (len(buffer) - self.frame_size) // self.hop_size + 1
+        frequency, magnitude = frame_spectra(buffer, self.time_interval, self.frame_size, self.hop_size)
+        features = extract_spectral_features_batch(frequency, magnitude)
+
+        frame_ids = np.arange(self.next_frame_id, self.next_frame_id + n_frames)
+        self.next_frame_id += n_frames
+        self.carry = buffer[n_frames * self.hop_size:]
+
+        return frame_ids, features
+
+def stream_channel(path, frame_size, overlap_percent, start_row=0, chunk_rows=CHUNK_ROWS):
+    """
+    Stream a channel CSV (file or FIFO) and yield features as chunks are parsed.
+
+    The stream is read sequentially once, so it works with SageMaker Pipe mode FIFOs.
+
+    Args:
+        path: Path of the CSV file or FIFO with 'timestamp', 'analog_value' and 'label' columns
+        frame_size: Number of data points in each frame/window
+        overlap_percent: Overlap percentage between consecutive frames (0-100)
+        start_row: First data row to use, rows before it are parsed but not framed
+
+    Yields:
+        label: Label of the channel (from its first row)
+        frame_ids: IDs of the frames completed by this chunk
+        features: Feature array of shape (n_frames, 13)
+        rows_read: Number of rows read so far
+    """
+    framer = StreamingFramer(frame_size, overlap_percent)
+    label = None
+    rows_read = 0
+
+    with open(path, 'rb') as stream:
+        for chunk in pd.read_csv(stream, chunksize=chunk_rows):
+            if label is None:
+                label = chunk['label'].iloc[0]
+
+            chunk_start = rows_read
+            rows_read += len(chunk)
+
+            # Skip rows that have already been trained on
+            if rows_read <= start_row:
+                continue
+            chunk = chunk.iloc[max(0, start_row - chunk_start):]
+
+            frame_ids, features = framer.push(chunk['timestamp'].values, chunk['analog_value'].values)
+            yield label, frame_ids, features, rows_read
+
+def load_channel_streaming(path, frame_size, overlap_percent, start_row=0, chunk_rows=CHUNK_ROWS):
+    """
+    Stream a channel into train/validation/test feature arrays.
+
+    Only the features (13 values per frame) are kept, not the signal or its spectra. Once the channel
+    is read, its frames are split with split_frame_ids, so the splits are the same as in File mode
+    (process_file and create_model_dataset).
+
+    Returns:
+        label: Label of the channel
+        splits: List of 3 feature arrays for train, validation and test, in frame order
+        rows_read: Total number of rows in the channel
+    """
+    chunks = []
+    label = None
+    rows_read = 0
+
+    for label, frame_ids, features, rows_read in stream_channel(path, frame_size, overlap_percent, start_row, chunk_rows):
+        chunks.append(features)
+
+    features = np.vstack(chunks) if chunks else np.zeros((0, 13))
+    if len(features) < MIN_SPLIT_FRAMES:
+        return label, [np.zeros((0, 13))] * 3, rows_read
+
+    frame_ids = np.arange(len(features))
+    splits = [features[np.isin(frame_ids, ids)] for ids in split_frame_ids(frame_ids)]
+
+    return label, splits, rows_read
+
+def _write_synthetic_csv(path, rows, chunk_rows=CHUNK_ROWS):
+    """Write a synthetic labelled channel CSV, e.g. into a named pipe."""
+    rng = np.random.default_rng(42)
+    with open(path, 'w') as f:
+        f.write("timestamp,analog_value,label\n")
+        for start in range(0, rows, chunk_rows):
+            n = min(chunk_rows, rows - start)
+            timestamps = (np.arange(start, start + n) * 17)
+            values = 2170 + 10 * rng.standard_normal(n)
+            f.write("".join(f"{t},{v:.1f},drill\n" for t, v in zip(timestamps, values)))
+
+if __name__ == '__main__':
+    # Stream a synthetic channel through a named pipe and report time to first features and peak memory
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000, 5000000])
+    parser.add_argument('--fifo', type=str, default='channel_fifo')
+    args = parser.parse_args()
+
+    print(f"{'Rows':>10} {'First features (s)':>19} {'Total (s)':>10} {'Frames':>9} {'Peak memory (MB)':>17}")
+    for rows in args.rows:
+        if os.path.exists(args.fifo):
+            os.remove(args.fifo)
+        os.mkfifo(args.fifo)
+
+        writer = threading.Thread(target=_write_synthetic_csv, args=(args.fifo, rows))
+        writer.start()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        first_features = None
+        n_frames = 0
+        for label, frame_ids, features, rows_read in stream_channel(args.fifo, 30, 70):
+            if first_features is None and len(frame_ids):
+                first_features = time.perf_counter() - start
+            n_frames += len(frame_ids)
+        total = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        writer.join()
+        os.remove(args.fifo)
+
+        print(f"{rows:>10} {first_features:>19.3f} {total:>10.3f} {n_frames:>9} {peak / 1e6:>17.1f}")
@@ -0,0 +1,238 @@
+###########################################################################
+# Hyperparameter sweep over frame size, overlap and classifier backend    #
+# Run with train.py --mode sweep, or locally: python sweep.py             #
+###########################################################################
+
+import os
+import json
+import math
+import time
+import argparse
+from functools import reduce
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import hop_size_for, frame_spectra
+from feature_extract import extract_spectral_features_batch, split_frame_ids
+from streaming import MIN_SPLIT_FRAMES
+from backends import benchmark_backend
+
+label_map = {'background': 0, 'shout': 1, 'drill': 2}
+
+# Shared signal buffer, attached once per worker process
+_shm = None
+_signals = None
+
+def load_signals(csv_files):
+    """
+    Read each labelled channel CSV once.
+
+    Returns:
+        channels: List of dictionaries with 'name', 'label_id', 'time_interval', 'offset' and 'length'
+                  locating each channel's signal in the concatenated signal
+        signal: All channel signals concatenated into one float64 array
+    """
+    channels = []
+    signals = []
+    offset = 0
+
+    for csv_path in csv_files:
+        df = pd.read_csv(csv_path)
+        timestamps = df['timestamp'].values
+        signal = df['analog_value'].values.astype(np.float64)
+
+        channels.append({
+            'name': os.path.splitext(os.path.basename(csv_path))[0],
+            'label_id': label_map.get(df['label'].iloc[0], 0),
+            'time_interval': float(timestamps[1] - timestamps[0]),
+            'offset': offset,
+            'length': len(signal)
+        })
+        signals.append(signal)
+        offset += len(signal)
+
+        print(f"Loaded {csv_path}: {len(signal)} points")
+
+    return channels, np.concatenate(signals)
+
+def _init_worker(shm_name, total_length):
+    """Attach the shared signal buffer in a worker process."""
+    global _shm, _signals
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _signals = np.ndarray((total_length,), dtype=np.float64, buffer=_shm.buf)
+
+def _channel_signal(channel):
+    return _signals[channel['offset']:channel['offset'] + channel['length']]
+
+def compute_base_features(frame_size, base_hop, channels, n_timing=200):
+    """
+    Compute the FFT and features of every frame at base_hop, for every channel.
+
+    Any overlap whose hop size is a multiple of base_hop reuses these features by taking every k-th frame.
+
+    Returns:
+        frame_size, list of feature arrays (one per channel), median featurization time of one window (ms)
+    """
+    features = []
+    for channel in channels:
+        frequency, magnitude = frame_spectra(_channel_signal(channel), channel['time_interval'], frame_size, base_hop)
+        features.append(extract_spectral_features_batch(frequency, magnitude))
+
+    # Cost of featurizing a single window, as done at inference time
+    channel = channels[0]
+    window = _channel_signal(channel)[:frame_size]
+    times = []
+    for _ in range(n_timing):
+        start = time.perf_counter()
+        frequency, magnitude = frame_spectra(window, channel['time_interval'], frame_size, frame_size)
+        extract_spectral_features_batch(frequency, magnitude)
+        times.append(time.perf_counter() - start)
+
+    return frame_size, features, float(np.median(times)) * 1000
+
+def evaluate_config(frame_size, overlap_percent, backend, step, features, label_ids, feature_ms):
+    """
+    Train and evaluate one backend on one frame size / overlap setting.
+
+    Args:
+        step: Take every step-th frame of the base features to get this overlap's frames
+        features: List of base feature arrays, one per channel
+        label_ids: Label of each channel
+        feature_ms: Featurization time of one window (ms)
+
+    Returns:
+        result: Dictionary with the settings, accuracy and per-window inference cost, or with
+                'skipped' (and no accuracy) when fewer than two channels have enough frames
+    """
+    X_train, y_train, X_test, y_test = [], [], [], []
+    for X, label_id in zip(features, label_ids):
+        X = X[::step]
+        if len(X) < MIN_SPLIT_FRAMES:
+            continue
+        train_frames, _, test_frames = split_frame_ids(np.arange(len(X)))
+        X_train.append(X[train_frames])
+        X_test.append(X[test_frames])
+        y_train.append(np.full(len(train_frames), label_id))
+        y_test.append(np.full(len(test_frames), label_id))
+
+    n_classes = len({int(y[0]) for y in y_train})
+    if n_classes < 2:
+        # Recorded instead of raising, which would fail the whole sweep
+        return {
+            'backend': backend,
+            'frame_size': frame_size,
+            'overlap_percent': overlap_percent,
+            'skipped': f"{n_classes} class(es) with at least {MIN_SPLIT_FRAMES} frames, 2 needed"
+        }
+
+    # Single-threaded per config, the parallelism is across configs
+    _, result = benchmark_backend(backend, np.vstack(X_train), np.hstack(y_train),
+                                  np.vstack(X_test), np.hstack(y_test), n_jobs=1)
+
+    result.update({
+        'frame_size': frame_size,
+        'overlap_percent': overlap_percent,
+        'n_train': int(sum(len(y) for y in y_train)),
+        'feature_ms': feature_ms,
+        'per_window_ms': feature_ms + result['single_row_ms']
+    })
+    return result
+
+def run_sweep(csv_files, frame_sizes, overlaps, backends, workers=None):
+    """
+    Evaluate every frame size x overlap x backend combination across a process pool.
+
+    Each signal is read once into shared memory. The FFT and features are computed once per
+    frame size, at the greatest common divisor of the hop sizes, and shared by all overlaps and backends.
+
+    Returns:
+        results: List of result dictionaries, best accuracy first, then lowest per-window cost
+    """
+    channels, signal = load_signals(csv_files)
+    label_ids = [channel['label_id'] for channel in channels]
+
+    shm = shared_memory.SharedMemory(create=True, size=signal.nbytes)
+    try:
+        np.ndarray(signal.shape, dtype=np.float64, buffer=shm.buf)[:] = signal
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, len(signal))) as pool:
+
+            # Hop sizes per frame size, and the base hop they all share
+            hops = {}
+            for frame_size in frame_sizes:
+                hops[frame_size] = {overlap: hop_size_for(frame_size, overlap) for overlap in overlaps
+                                    if hop_size_for(frame_size, overlap) > 0}
+
+            # Stage 1: one FFT + feature pass per frame size
+            base_futures = []
+            for frame_size, overlap_hops in hops.items():
+                if not overlap_hops:
+                    continue
+                base_hop = reduce(math.gcd, overlap_hops.values())
+                print(f"Frame size {frame_size}: base hop {base_hop} shared by overlaps {list(overlap_hops)}")
+                base_futures.append((base_hop, pool.submit(compute_base_features, frame_size, base_hop, channels)))
+
+            # Stage 2: one task per overlap x backend, reusing the base features
+            config_futures = []
+            for base_hop, future in base_futures:
+                frame_size, features, feature_ms = future.result()
+                for overlap, hop in hops[frame_size].items():
+                    for backend in backends:
+                        config_futures.append(pool.submit(evaluate_config, frame_size, overlap, backend,
+                                                          hop // base_hop, features, label_ids, feature_ms))
+
+            results = [future.result() for future in config_futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Skipped configs last
+    evaluated = [r for r in results if 'skipped' not in r]
+    skipped = [r for r in results if 'skipped' in r]
+    return sorted(evaluated, key=lambda r: (-r['accuracy'], r['per_window_ms'])) + skipped
+
+def format_sweep_report(results):
+    """Format sweep results as one ranked table."""
+    lines = [f"{'Rank':>4} {'Frame':>6} {'Overlap':>8} {'Backend':<15} {'Accuracy':>9} "
+             f"{'Window (ms)':>12} {'Feature (ms)':>13} {'Predict (ms)':>13} {'Train (s)':>10}"]
+
+    for rank, r in enumerate(results, 1):
+        if 'skipped' in r:
+            lines.append(f"{'-':>4} {r['frame_size']:>6} {r['overlap_percent']:>7}% {r['backend']:<15} skipped: {r['skipped']}")
+            continue
+        lines.append(f"{rank:>4} {r['frame_size']:>6} {r['overlap_percent']:>7}% {r['backend']:<15} {r['accuracy']:>9.4f} "
+                     f"{r['per_window_ms']:>12.3f} {r['feature_ms']:>13.3f} {r['single_row_ms']:>13.3f} {r['train_s']:>10.3f}")
+
+    return "\n".join(lines)
+
+def write_sweep_report(results, output_dir):
+    """Print the ranked table and save the results as JSON."""
+    print("\n=== Sweep Report ===")
+    print(format_sweep_report(results))
+
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, "sweep_report.json")
+    with open(report_path, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Sweep report saved to {report_path}")
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv-files', type=str, nargs='+', default=["background.csv", "shout.csv", "drill.csv"])
+    parser.add_argument('--frame-sizes', type=str, default='20,30,40,60')
+    parser.add_argument('--overlaps', type=str, default='50,70,80')
+    parser.add_argument('--backends', type=str, default='voting,hist_gb,extra_trees,logistic')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output-dir', type=str, default='.')
+    args = parser.parse_args()
+
+    results = run_sweep(args.csv_files, parse_int_list(args.frame_sizes), parse_int_list(args.overlaps),
+                        [b for b in args.backends.split(',') if b], args.workers)
+    write_sweep_report(results, args.output_dir)
@@ -0,0 +1,68 @@
+###########################################################################
+# Pipe mode (a named pipe read by streaming.py) gives the same frames,    #
+# features and splits as File mode (process_file, create_model_dataset)  #
+# Run from aws_sagemaker: python -m pytest test_streaming.py             #
+###########################################################################
+
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from preprocessing import process_file
+from feature_extract import create_model_dataset, load_dataset_with_features
+from streaming import load_channel_streaming
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="named pipes need a Unix system")
+
+def write_channel(path, rows, seed=0):
+    """Write a labelled channel CSV with a noisy burst in the middle."""
+    rng = np.random.default_rng(seed)
+    values = 2170 + 10 * rng.standard_normal(rows)
+    values[rows // 3:rows // 2] += 400 * np.sin(np.arange(rows // 2 - rows // 3))
+    with open(path, 'w') as f:
+        f.write("timestamp,analog_value,label\n")
+        f.write("".join(f"{i * 23},{v:.1f},drill\n" for i, v in enumerate(values)))
+
+def file_mode(csv_path, start_row):
+    freq_df, _ = process_file(csv_path, 30, 70, start_row)
+    return [load_dataset_with_features(df, 2, 'split')[0] for df in create_model_dataset(freq_df)]
+
+def pipe_mode(csv_path, fifo_path, start_row, chunk_rows):
+    os.mkfifo(fifo_path)
+
+    def feed():
+        with open(csv_path, 'rb') as source, open(fifo_path, 'wb') as fifo:
+            fifo.write(source.read())
+
+    writer = threading.Thread(target=feed)
+    writer.start()
+    try:
+        label, splits, rows_read = load_channel_streaming(fifo_path, 30, 70, start_row, chunk_rows)
+    finally:
+        writer.join()
+    return label, splits, rows_read
+
+@pytest.mark.parametrize("start_row, chunk_rows", [(0, 1000), (0, 777), (1234, 500)])
+def test_pipe_mode_matches_file_mode(tmp_path, start_row, chunk_rows):
+    csv_path = str(tmp_path / "drill.csv")
+    write_channel(csv_path, 6000)
+
+    expected = file_mode(csv_path, start_row)
+    label, splits, rows_read = pipe_mode(csv_path, str(tmp_path / "drill_0"), start_row, chunk_rows)
+
+    assert label == "drill"
+    assert rows_read == 6000
+    for streamed, whole in zip(splits, expected):
+        assert streamed.shape == whole.shape
+        np.testing.assert_allclose(streamed, whole, rtol=1e-9, atol=1e-6)
+
+def test_too_few_frames_are_not_split(tmp_path):
+    csv_path = str(tmp_path / "drill.csv")
+    write_channel(csv_path, 60)
+
+    _, splits, rows_read = pipe_mode(csv_path, str(tmp_path / "drill_0"), 0, 1000)
+
+    assert rows_read == 60
+    assert [len(X) for X in splits] == [0, 0, 0]
@@ -0,0 +1,36 @@
+###########################################################################
+# Full training reads every sample channel, however small                #
+# Run from aws_sagemaker: python -m pytest test_train.py                 #
+###########################################################################
+
+import os
+
+import numpy as np
+import pytest
+
+import train
+
+@pytest.fixture(autouse=True)
+def sample_channels(monkeypatch):
+    """The channel CSVs are read relative to the working directory, as in a training job."""
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    for channel_name in ("background", "shout", "drill"):
+        monkeypatch.delenv(f"SM_CHANNEL_{channel_name.upper()}", raising=False)
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_full_training_keeps_every_class(streaming):
+    train_split, val_split, test_split, channel_rows = train.load_all_data(None, streaming)
+
+    # shout.csv has fewer frames than MIN_NEW_FRAMES, which only applies to incremental runs
+    assert np.unique(train_split[1]).tolist() == [0, 1, 2]
+    assert 1 in test_split[1]
+    assert channel_rows == {"background": 306, "shout": 176, "drill": 293}
+
+def test_incremental_run_leaves_small_increments_for_later():
+    state = {"frame_size": train.frame_size, "overlap_percent": train.overlap_percentage,
+             "rows": {"background": 0, "shout": 0, "drill": 0}}
+
+    train_split, _, _, channel_rows = train.load_all_data(state)
+
+    assert np.unique(train_split[1]).tolist() == [0, 2]
+    assert channel_rows["shout"] == 0
@@ -0,0 +1,83 @@
+###########################################################################
+# Export a synthetic NoiseLog from the in-memory DynamoDB stand-in with   #
+# 1..N scan segments, then add late and new items and run an incremental #
+# export                                                                  #
+# Run from the repository root: python benchmarks/export_scan.py          #
+###########################################################################
+
+import os
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from run_benchmarks import REPO_DIR, LocalDynamoDB, load_module
+
+export = load_module("export_noise_log", os.path.join(REPO_DIR, "dynamodb", "export_noise_log.py"))
+
+def fill_table(db, n_items, n_houses, n_days, start_timestamp=1764547200000, seed=0):
+    """Put n_items NoiseLog items spread over n_houses and n_days, as noise_inference writes them."""
+    rng = np.random.default_rng(seed)
+    timestamps = start_timestamp + rng.integers(0, n_days * export.DAY_MS, n_items)
+    houses = rng.integers(0, n_houses, n_items)
+    noise_classes = rng.choice([0, 1, 2], n_items, p=[0.8, 0.1, 0.1])
+    for timestamp, house, noise_class in zip(timestamps.tolist(), houses.tolist(), noise_classes.tolist()):
+        db.items[(f"house_{house}", str(timestamp))] = {
+            "houseName": {"S": f"house_{house}"},
+            "timestamp": {"N": str(timestamp)},
+            "noiseClass": {"N": str(noise_class)},
+            "dummy": {"S": "1"}
+        }
+    db._segment_keys.clear()
+    return int(timestamps.max())
+
+def table_columns(db, watermark):
+    """Timestamps and noise classes of every item up to the watermark, sorted, to check the export against."""
+    rows = sorted((float(item["timestamp"]["N"]), item["houseName"]["S"], int(item["noiseClass"]["N"]))
+                  for item in db.items.values() if float(item["timestamp"]["N"]) <= watermark)
+    return np.array([r[0] for r in rows]), np.array([r[2] for r in rows])
+
+def matches_table(db, output_dir, watermark):
+    houses, timestamps, noise_classes = export.load_export(output_dir)
+    expected_timestamps, expected_classes = table_columns(db, watermark)
+    order = np.lexsort((houses.astype(str), timestamps))
+    return bool(np.array_equal(timestamps[order], expected_timestamps)
+                and np.array_equal(noise_classes[order], expected_classes))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--houses', type=int, default=50)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--segments', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--latency-ms', type=float, default=5.0, help="Simulated round trip of each scan page")
+    parser.add_argument('--format', choices=["npz", "parquet"], default="npz")
+    args = parser.parse_args()
+
+    db = LocalDynamoDB(latency_s=args.latency_ms / 1000.0)
+    last_timestamp = fill_table(db, args.items, args.houses, args.days)
+    print(f"{args.items} items, {args.houses} houses, {args.days} days, {args.latency_ms} ms per scan page "
+          f"of {db.page_size} items\n")
+
+    work_dir = tempfile.mkdtemp(prefix="noise_log_export_")
+    try:
+        print(f"{'Segments':>8} {'Seconds':>9} {'Items/s':>12} {'Pages':>7} {'Days':>6}  Same as table")
+        for total_segments in args.segments:
+            output_dir = os.path.join(work_dir, f"segments_{total_segments}")
+            db.scans = 0
+            # Run as if just after the last item: the items of the last hour are left to the next run
+            result = export.export_noise_log(db, output_dir, total_segments, args.format, now_ms=last_timestamp + 1)
+            print(f"{total_segments:>8} {result['total_seconds']:>9.2f} {result['items'] / result['total_seconds']:>12,.0f} "
+                  f"{db.scans:>7} {result['days']:>6}  {matches_table(db, output_dir, result['watermark'])}")
+
+        # Incremental: items written late within the lag and new items, exported into the last output folder
+        n_new = args.items // 10
+        new_last_timestamp = fill_table(db, n_new, args.houses, 1, start_timestamp=last_timestamp - export.DEFAULT_LAG_MS // 2,
+                                        seed=1)
+        result = export.export_noise_log(db, output_dir, args.segments[-1], args.format, incremental=True,
+                                         now_ms=new_last_timestamp + export.DEFAULT_LAG_MS)
+        print(f"\nIncremental run: {result['items']} late, held back and new items exported "
+              f"in {result['total_seconds']:.2f} s, same as table: {matches_table(db, output_dir, result['watermark'])}")
+    finally:
+        shutil.rmtree(work_dir)
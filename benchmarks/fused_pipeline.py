@@ -0,0 +1,168 @@
+###########################################################################
+# Multi-stage preprocessing vs the single-pass pipeline (pipeline.py)     #
+# Run from the repository root: python benchmarks/fused_pipeline.py       #
+###########################################################################
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOISE_PREDICTION_DIR = os.path.join(REPO_DIR, "noise_prediction")
+RAW_DATA_DIR = os.path.join(NOISE_PREDICTION_DIR, "sample_data", "raw_data")
+
+sys.path.insert(0, NOISE_PREDICTION_DIR)
+from preprocessing import process_unstructured_data_to_csv, get_labelled_csv, process_all_files
+from feature_extract import create_model_dataset, load_dataset_with_features
+from pipeline import build_feature_matrix, load_feature_matrix, label_map
+
+TIME_INTERVAL = 23
+FRAME_SIZE = 30
+OVERLAP_PERCENT = 70
+SPLITS = ['train', 'validation', 'test']
+
+def write_scaled_raw_data(raw_dir, scale):
+    """
+    Write the sample raw logs with each recording repeated scale times.
+
+    Returns:
+        n_points: Total number of data points written
+    """
+    os.makedirs(raw_dir, exist_ok=True)
+    n_points = 0
+    for file_name in sorted(os.listdir(RAW_DATA_DIR)):
+        with open(os.path.join(RAW_DATA_DIR, file_name), 'r') as f:
+            raw = json.load(f)
+        raw["sensor_data"] = raw["sensor_data"] * scale
+        raw["total_entries"] = len(raw["sensor_data"])
+        with open(os.path.join(raw_dir, file_name), 'w') as f:
+            json.dump(raw, f, indent=4)
+        n_points += raw["total_entries"]
+    return n_points
+
+def directory_usage(directory):
+    """Number of files and bytes under a directory."""
+    n_files, n_bytes = 0, 0
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            n_files += 1
+            n_bytes += os.path.getsize(os.path.join(root, file_name))
+    return n_files, n_bytes
+
+def run_multi_stage(work_dir):
+    """
+    Run the notebook pipeline: structured CSVs, label schedules, one CSV per frame, split copies, features.
+
+    Returns:
+        features: Dictionary of (split, label) -> feature array
+    """
+    raw_dir = os.path.join(work_dir, 'raw_data')
+    for file_name in sorted(os.listdir(raw_dir)):
+        type = 'shout' if 'shout' in file_name else 'drill'
+        process_unstructured_data_to_csv(os.path.join(raw_dir, file_name), TIME_INTERVAL)
+        get_labelled_csv(os.path.join(raw_dir, file_name.split('.')[0] + '.csv'), type=type, labelling_interval=5)
+
+    process_all_files(os.path.join(work_dir, 'labelled'), os.path.join(work_dir, 'processed'), FRAME_SIZE, OVERLAP_PERCENT)
+    create_model_dataset(os.path.join(work_dir, 'processed'), os.path.join(work_dir, 'model_data'))
+
+    features = {}
+    for split in SPLITS:
+        X, y, _ = load_dataset_with_features(os.path.join(work_dir, 'model_data'), split)
+        features.update({(split, label): X[y == label_id] for label, label_id in label_map.items()})
+    return features
+
+def run_fused(work_dir):
+    """
+    Run build_feature_matrix and load every split, as the model training would.
+
+    Returns:
+        features: Dictionary of (split, label) -> feature array
+    """
+    matrix_path = os.path.join(work_dir, 'model_data', 'features.csv')
+    build_feature_matrix(os.path.join(work_dir, 'raw_data'), matrix_path, TIME_INTERVAL, FRAME_SIZE, OVERLAP_PERCENT)
+
+    features = {}
+    for split in SPLITS:
+        X, y, _ = load_feature_matrix(matrix_path, split)
+        features.update({(split, label): X[y == label_id] for label, label_id in label_map.items()})
+    return features
+
+def same_features(a, b):
+    """Check that two feature arrays have the same rows, in any order."""
+    if a.shape != b.shape:
+        return False
+    return np.allclose(a[np.lexsort(a.T)], b[np.lexsort(b.T)])
+
+def run(scale, paths, work_dir):
+    """
+    Time each path on the sample data scaled up scale times.
+
+    Returns:
+        results: Dictionary of path -> wall time, files and bytes written and features per class
+    """
+    results = {}
+    runners = {'multi_stage': run_multi_stage, 'fused': run_fused}
+
+    for path in paths:
+        path_dir = os.path.join(work_dir, path)
+        n_points = write_scaled_raw_data(os.path.join(path_dir, 'raw_data'), scale)
+        raw_files, raw_bytes = directory_usage(path_dir)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            features = runners[path](path_dir)
+        wall = time.perf_counter() - start
+
+        n_files, n_bytes = directory_usage(path_dir)
+        results[path] = {
+            'points': n_points,
+            'wall_s': wall,
+            'points_per_s': n_points / wall,
+            'files_written': n_files - raw_files,
+            'mb_written': (n_bytes - raw_bytes) / 1e6,
+            'frames': {label: sum(len(X) for (_, l), X in features.items() if l == label) for label in label_map},
+            'features': features
+        }
+
+        # Free the disk space before the next path
+        shutil.rmtree(path_dir, ignore_errors=True)
+
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=1000, help="Times each sample recording is repeated")
+    parser.add_argument('--paths', type=str, nargs='+', default=['multi_stage', 'fused'], choices=['multi_stage', 'fused'])
+    parser.add_argument('--work-dir', type=str, help="Where to write the data (default: a temporary directory)")
+    parser.add_argument('--output', type=str, help="Also save the results to this JSON file")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="noisewatch_fused_")
+    try:
+        results = run(args.scale, args.paths, work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'Path':<12} {'Points':>12} {'Wall (s)':>10} {'Points/s':>12} {'Files written':>14} {'MB written':>11} {'Frames':>9}")
+    for path, r in results.items():
+        print(f"{path:<12} {r['points']:>12} {r['wall_s']:>10.2f} {r['points_per_s']:>12.0f} "
+              f"{r['files_written']:>14} {r['mb_written']:>11.1f} {sum(r['frames'].values()):>9}")
+
+    if len(results) == 2:
+        multi, fused = results['multi_stage'], results['fused']
+        print(f"\nSpeedup of the fused pipeline: {multi['wall_s'] / fused['wall_s']:.1f}x")
+        same = all(same_features(multi['features'][key], fused['features'][key]) for key in multi['features'])
+        print(f"Same features per class and split: {same}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({path: {k: v for k, v in r.items() if k != 'features'} for path, r in results.items()}, f, indent=4)
@@ -0,0 +1,119 @@
+###########################################################################
+# Multi-process local inference: workers that each unpickle model.joblib #
+# against workers sharing the memory-mapped export of shared_model.py    #
+# Run from the repository root: python benchmarks/inference_pool.py      #
+###########################################################################
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from concurrent.futures import wait, FIRST_COMPLETED
+
+import numpy as np
+
+# The spawned workers run the imports of this module again, so the benchmark's own (pandas,
+# run_benchmarks, the Lambda) are in the main block and do not count in the workers' memory
+NOISE_INFERENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "noise_inference")
+# Imported by name, so that the workers can unpickle its functions
+sys.path.insert(0, NOISE_INFERENCE_DIR)
+import shared_model
+
+def make_features(inference, n_recordings, points_per_recording):
+    """Frame features of synthetic shout, drill and background recordings, as the Lambda computes them."""
+    import pandas as pd
+    from synthetic import generate_recording
+
+    features = []
+    for i in range(n_recordings):
+        timestamps, analog_values, _ = generate_recording(['shout', 'drill', 'background'][i % 3],
+                                                          points_per_recording, seed=i)
+        frames, _, _ = inference.frame_features(pd.DataFrame({'timestamp': timestamps, 'analog_value': analog_values}))
+        features.append(frames)
+    return np.vstack(features)
+
+def run_pool(location, n_workers, batches, expected, in_flight):
+    """
+    Classify every batch with a pool of n_workers, keeping at most in_flight requests queued.
+
+    Returns:
+        Dictionary with the startup time, throughput, latency and memory of the workers,
+        and whether every batch got the probabilities of the pipeline
+    """
+    start = time.perf_counter()
+    pool = shared_model.InferencePool(location, n_workers)
+    try:
+        pool.warm_up(batches[0].shape[1])
+        startup_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pending = {}
+        results = [None] * len(batches)
+        for i, batch in enumerate(batches):
+            if len(pending) >= in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+            pending[pool.submit(batch)] = i
+        for future in pending:
+            results[pending[future]] = future.result()
+        seconds = time.perf_counter() - start
+        stats = pool.stats()
+    finally:
+        pool.close()
+
+    workers = list(stats["workers"].values())
+    return {
+        "startup_s": startup_s,
+        "frames_per_second": sum(len(batch) for batch in batches) / seconds,
+        "p50_ms": stats["p50_ms"],
+        "p99_ms": stats["p99_ms"],
+        "compute_p50_ms": stats["compute_p50_ms"],
+        "load_s": float(np.mean([worker["load_s"] for worker in workers])),
+        "rss_mb": float(np.mean([worker.get("rss_mb", np.nan) for worker in workers])),
+        "private_mb": float(np.mean([worker.get("private_mb", np.nan) for worker in workers])),
+        "pss_total_mb": float(np.sum([worker.get("pss_mb", np.nan) for worker in workers])),
+        "same_probabilities": bool(np.allclose(np.vstack(results), expected, rtol=0, atol=1e-9))
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--models', nargs='+', choices=["joblib", "shared"], default=["joblib", "shared"])
+    parser.add_argument('--batch-frames', type=int, default=64, help="Frames per request (a batch of windows)")
+    parser.add_argument('--batches', type=int, default=400)
+    parser.add_argument('--in-flight', type=int, default=0, help="Requests queued at most, 2 per worker by default")
+    args = parser.parse_args()
+
+    from run_benchmarks import load_lambda_function
+    inference = load_lambda_function(os.path.join(NOISE_INFERENCE_DIR, "lambda_function.py"))
+    logging.getLogger().setLevel(logging.CRITICAL)
+    features = make_features(inference, 12, 5000)
+    repeats = -(-args.batches * args.batch_frames // len(features))
+    features = np.tile(features, (repeats, 1))[:args.batches * args.batch_frames]
+    batches = np.split(features, args.batches)
+    expected = inference.model.predict_proba(features)
+
+    export_dir = tempfile.mkdtemp(prefix="model_shared_")
+    try:
+        shared_model.export_shared_model(inference.model, export_dir, check_features=features[:5000])
+        locations = {"joblib": os.path.join(NOISE_INFERENCE_DIR, "model.joblib"), "shared": export_dir}
+        print(f"{args.batches} requests of {args.batch_frames} frames, {os.cpu_count()} CPU(s)\n")
+        print(f"{'Model':<8} {'Workers':>7} {'Frames/s':>9} {'Scaling':>8} {'p50 ms':>7} {'p99 ms':>7} "
+              f"{'Compute ms':>10} {'Startup s':>9} {'Load s':>7} {'RSS MB':>7} {'Private MB':>10} "
+              f"{'PSS total MB':>12}  Same")
+        for name in args.models:
+            single = None
+            for n_workers in args.workers:
+                result = run_pool(locations[name], n_workers, batches, expected, args.in_flight or 2 * n_workers)
+                single = single or result["frames_per_second"]
+                print(f"{name:<8} {n_workers:>7} {result['frames_per_second']:>9.0f} "
+                      f"{result['frames_per_second'] / single:>7.2f}x {result['p50_ms']:>7.1f} {result['p99_ms']:>7.1f} "
+                      f"{result['compute_p50_ms']:>10.2f} {result['startup_s']:>9.2f} {result['load_s']:>7.2f} "
+                      f"{result['rss_mb']:>7.0f} {result['private_mb']:>10.0f} {result['pss_total_mb']:>12.0f}  "
+                      f"{result['same_probabilities']}")
+    finally:
+        shutil.rmtree(export_dir)
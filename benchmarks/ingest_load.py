@@ -0,0 +1,239 @@
+###########################################################################
+# Load test of the ingest paths: windows posted synchronously to a        #
+# concurrency-limited inference function, against windows enqueued and   #
+# classified in batches by queue consumers                                #
+# Run from the repository root: python benchmarks/ingest_load.py          #
+###########################################################################
+
+import os
+import io
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+
+import numpy as np
+
+from run_benchmarks import REPO_DIR, LocalDynamoDB, load_module, load_lambda_function
+from synthetic import generate_recording, recording_to_payload
+
+NOISE_INFERENCE_DIR = os.path.join(REPO_DIR, "lambda", "noise_inference")
+ingest_queue = load_module("ingest_queue", os.path.join(NOISE_INFERENCE_DIR, "ingest_queue.py"))
+queue_consumer = load_module("queue_consumer", os.path.join(NOISE_INFERENCE_DIR, "queue_consumer.py"))
+
+class TimedDynamoDB(LocalDynamoDB):
+    """LocalDynamoDB that records when each item was written, to measure the end-to-end latency."""
+
+    def __init__(self):
+        super().__init__()
+        self.written = {}
+
+    def put_item(self, TableName, Item):
+        super().put_item(TableName, Item)
+        self.written[(Item["houseName"]["S"], Item["timestamp"]["N"])] = time.perf_counter()
+        return {}
+
+    def batch_write_item(self, RequestItems):
+        response = super().batch_write_item(RequestItems)
+        now = time.perf_counter()
+        for requests in RequestItems.values():
+            for request in requests:
+                item = request["PutRequest"]["Item"]
+                self.written[(item["houseName"]["S"], item["timestamp"]["N"])] = now
+        return response
+
+def make_windows(n_windows, n_houses, window_points, n_bad=0, seed=0):
+    """
+    Windows of window_points data points spread over n_houses, as the bridges send them.
+    The first n_bad windows have no data, so the inference fails on them.
+
+    Returns:
+        windows: List of (key, payload), key being the (houseName, timestamp) of the item it writes
+    """
+    per_house = -(-n_windows // n_houses)
+    windows = []
+    for house in range(n_houses):
+        kind = ['shout', 'drill', 'background'][house % 3]
+        timestamps, analog_values, _ = generate_recording(kind, per_house * window_points, seed=seed + house)
+        for first in range(0, per_house * window_points, window_points):
+            payload = recording_to_payload(timestamps[first:first + window_points],
+                                           analog_values[first:first + window_points], f"house_{house}")
+            windows.append(payload)
+    rng = np.random.default_rng(seed)
+    windows = [windows[i] for i in rng.permutation(len(windows))[:n_windows]]
+    for payload in windows[:n_bad]:
+        payload["data"] = []
+    return [((payload["house_id"], str(payload["start_time"])), payload) for payload in windows]
+
+def burst_arrivals(n_windows, burst_size, burst_interval_s, burst_spread_ms, seed=0):
+    """Arrival times (s): bursts of burst_size windows within burst_spread_ms, every burst_interval_s."""
+    rng = np.random.default_rng(seed)
+    bursts = np.arange(n_windows) // burst_size
+    return np.sort(bursts * burst_interval_s + rng.uniform(0, burst_spread_ms / 1000.0, n_windows))
+
+def replay_arrivals(windows, arrivals, send):
+    """Call send(payload) for each window at its arrival time. Returns the arrival perf_counter of each key."""
+    created = {}
+    start = time.perf_counter()
+    for (key, payload), arrival in zip(windows, arrivals):
+        delay = start + arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        created[key] = time.perf_counter()
+        send(payload)
+    return created
+
+def summarize(created, written, expected_keys):
+    """Throughput and latency percentiles of the windows written, in arrival order."""
+    keys = [key for key in expected_keys if key in written]
+    latencies = np.array([written[key] - created[key] for key in keys]) * 1000
+    duration = max(written[key] for key in keys) - min(created.values()) if keys else 0.0
+    return {
+        "written": len(keys),
+        "windows_per_second": len(keys) / duration if duration else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(keys) else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if len(keys) else None
+    }
+
+def run_sync(inference, windows, arrivals, concurrency, invoke_ms, retries):
+    """
+    Each window is posted from its own thread, as the bridges do, to a function with at most
+    concurrency invocations at once. Invocations over the limit are throttled and retried with
+    the bridges' backoff (0.5 s, 1 s, ...), then the window is dropped.
+    """
+    db = TimedDynamoDB()
+    inference.dynamodb = db
+    slots = threading.BoundedSemaphore(concurrency)
+    counters = {"invocations": 0, "throttles": 0, "drops": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def upload(payload):
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+            if not slots.acquire(blocking=False):
+                with lock:
+                    counters["throttles"] += 1
+                continue
+            try:
+                # Round trip and invocation overhead of the endpoint
+                time.sleep(invoke_ms / 1000.0)
+                response = inference.lambda_handler({'body': json.dumps(payload)}, None)
+            finally:
+                slots.release()
+            with lock:
+                counters["invocations"] += 1
+                counters["errors"] += response["statusCode"] != 200
+            return
+        with lock:
+            counters["drops"] += 1
+
+    threads = []
+    def send(payload):
+        thread = threading.Thread(target=upload, args=(payload,))
+        thread.start()
+        threads.append(thread)
+
+    created = replay_arrivals(windows, arrivals, send)
+    for thread in threads:
+        thread.join()
+    return created, db.written, counters
+
+def run_queue(inference, windows, arrivals, concurrency, invoke_ms, batch_size, batch_window_ms, queue_dir,
+              visibility_timeout_s, max_receives, n_bad, timeout_s):
+    """
+    Windows are enqueued into a FileQueue and classified by concurrency consumers in batches of up to
+    batch_size windows or batch_window_ms, one invocation (and invoke_ms overhead) per batch.
+    """
+    db = TimedDynamoDB()
+    inference.dynamodb = db
+    queue = ingest_queue.FileQueue(queue_dir, visibility_timeout_s=visibility_timeout_s, max_receives=max_receives)
+    counters = {"invocations": 0}
+    lock = threading.Lock()
+
+    def handler(event, context):
+        time.sleep(invoke_ms / 1000.0)
+        with lock:
+            counters["invocations"] += 1
+        return inference.sqs_handler(event, context)
+
+    # Consumers stop once every window is written or dead-lettered
+    expected = len(windows) - n_bad
+    done = threading.Event()
+    def should_stop():
+        if done.is_set():
+            return True
+        if len(db.written) >= expected and queue.counts()["dead"] >= n_bad:
+            done.set()
+        return done.is_set()
+
+    totals = [{} for _ in range(concurrency)]
+    consumers = [
+        threading.Thread(target=queue_consumer.run_consumer,
+                         args=(queue, handler, batch_size, batch_window_ms, should_stop, totals[i]))
+        for i in range(concurrency)
+    ]
+    for consumer in consumers:
+        consumer.start()
+
+    created = replay_arrivals(windows, arrivals, lambda payload: ingest_queue.enqueue_window(queue, payload))
+    done.wait(timeout_s)
+    done.set()
+    for consumer in consumers:
+        consumer.join()
+
+    counters.update({name: sum(t.get(name, 0) for t in totals) for name in ("batches", "acked", "failed")})
+    counters["dead"] = queue.counts()["dead"]
+    return created, db.written, counters
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--windows', type=int, default=2000)
+    parser.add_argument('--houses', type=int, default=50)
+    parser.add_argument('--window-points', type=int, default=30, help="Points per window (BUFFER_SIZE of the bridges)")
+    parser.add_argument('--burst-size', type=int, default=100, help="Windows triggered together across the building")
+    parser.add_argument('--burst-interval', type=float, default=0.5, help="Seconds between bursts")
+    parser.add_argument('--burst-spread-ms', type=float, default=100.0)
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent invocations (reserved concurrency)")
+    parser.add_argument('--invoke-ms', type=float, default=30.0, help="Round trip and overhead of each invocation")
+    parser.add_argument('--retries', type=int, default=2, help="UPLOAD_RETRIES of the bridges")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--batch-window-ms', type=int, default=100)
+    parser.add_argument('--bad-windows', type=int, default=5, help="Windows without data, which must end in the dead-letter folder")
+    parser.add_argument('--visibility-timeout', type=float, default=1.0)
+    parser.add_argument('--max-receives', type=int, default=3)
+    args = parser.parse_args()
+
+    inference = load_lambda_function(os.path.join(NOISE_INFERENCE_DIR, "lambda_function.py"))
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    windows = make_windows(args.windows, args.houses, args.window_points, args.bad_windows)
+    arrivals = burst_arrivals(len(windows), args.burst_size, args.burst_interval, args.burst_spread_ms)
+    good_keys = [key for key, payload in windows if payload["data"]]
+    print(f"{len(windows)} windows of {args.window_points} points from {args.houses} houses, bursts of "
+          f"{args.burst_size} every {args.burst_interval} s (offered {len(windows) / arrivals[-1]:.0f} windows/s), "
+          f"{args.concurrency} concurrent invocations of {args.invoke_ms:.0f} ms overhead\n")
+
+    queue_dir = tempfile.mkdtemp(prefix="ingest_queue_")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sync_created, sync_written, sync_counters = run_sync(
+                inference, windows, arrivals, args.concurrency, args.invoke_ms, args.retries)
+            queue_created, queue_written, queue_counters = run_queue(
+                inference, windows, arrivals, args.concurrency, args.invoke_ms, args.batch_size, args.batch_window_ms,
+                queue_dir, args.visibility_timeout, args.max_receives, args.bad_windows, timeout_s=120)
+    finally:
+        shutil.rmtree(queue_dir)
+
+    print(f"{'Path':<12} {'Written':>8} {'Windows/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'Invocations':>12}  Other")
+    for name, created, written, counters in [("synchronous", sync_created, sync_written, sync_counters),
+                                             ("queue", queue_created, queue_written, queue_counters)]:
+        result = summarize(created, written, good_keys)
+        other = ", ".join(f"{key} {value}" for key, value in counters.items() if key != "invocations")
+        print(f"{name:<12} {result['written']:>8} {result['windows_per_second']:>10.1f} {result['p50_ms']:>9.0f} "
+              f"{result['p99_ms']:>9.0f} {counters['invocations']:>12}  {other}")
+    print(f"\nExpected {len(good_keys)} windows written and {args.bad_windows} dead-lettered")
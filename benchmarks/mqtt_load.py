@@ -0,0 +1,381 @@
+###########################################################################
+# MQTT load generator: N simulated sensors publish identifier and 100 Hz  #
+# data messages to a broker, and the sustained ingest rate, message loss  #
+# and CPU per device of the rpi bridge are read from its /metrics         #
+# python benchmarks/mqtt_load.py --devices 50 100 200 --payload binary    #
+###########################################################################
+
+import os
+import time
+import struct
+import asyncio
+import argparse
+import datetime
+import multiprocessing
+import urllib.request
+
+import numpy as np
+
+from synthetic import load_profile, generate_class_signal
+
+# Same layout as BINARY_SAMPLE of rpi/get_MQTT_data.py: Unix time (ms), analog value, digital value
+BINARY_SAMPLE = struct.Struct("<qfB")
+
+TIMESTAMP_FORMATS = ("string", "unix-ms", "mixed")
+
+###########################################################################
+# MQTT 3.1.1 publisher                                                    #
+###########################################################################
+
+def _remaining_length(n):
+    """Variable length encoding of the remaining length of an MQTT packet."""
+    encoded = bytearray()
+    while True:
+        n, digit = n >> 7, n & 0x7F
+        encoded.append(digit | (0x80 if n else 0))
+        if not n:
+            return bytes(encoded)
+
+def _string(value):
+    value = value.encode('utf-8') if isinstance(value, str) else value
+    return struct.pack("!H", len(value)) + value
+
+def publish_packet(topic, payload):
+    """PUBLISH packet with QoS 0, as the sensors' PubSubClient sends them."""
+    variable = _string(topic) + payload
+    return b"\x30" + _remaining_length(len(variable)) + variable
+
+class MqttPublisher:
+    """
+    Minimal MQTT 3.1.1 client on asyncio streams: connect, QoS 0 publish and disconnect.
+
+    paho-mqtt runs one network thread per client, which does not scale to hundreds of simulated
+    devices in one process; here every device is a coroutine on the same event loop. The devices
+    publish at least every tick, so the broker never needs a PINGREQ within the keepalive.
+    """
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self._discard = None
+
+    async def connect(self, host, port, client_id, username=None, password=None, keepalive_s=60):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        flags = 0x02  # Clean session
+        payload = _string(client_id)
+        if username is not None:
+            flags |= 0x80
+            payload += _string(username)
+            if password is not None:
+                flags |= 0x40
+                payload += _string(password)
+        variable = _string("MQTT") + bytes([4, flags]) + struct.pack("!H", keepalive_s) + payload
+        self.writer.write(b"\x10" + _remaining_length(len(variable)) + variable)
+        await self.writer.drain()
+
+        connack = await asyncio.wait_for(self.reader.readexactly(4), timeout=10)
+        if connack[0] != 0x20 or connack[3] != 0:
+            raise ConnectionError(f"{client_id}: CONNACK return code {connack[3]}")
+        # Nothing else is expected from the broker, read it so its socket buffer never fills
+        self._discard = asyncio.ensure_future(self._read_forever())
+
+    async def _read_forever(self):
+        try:
+            while await self.reader.read(4096):
+                pass
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    def publish(self, topic, payload):
+        """Queue a QoS 0 PUBLISH. Call drain() to wait until the socket accepted it."""
+        self.writer.write(publish_packet(topic, payload))
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def close(self):
+        try:
+            self.writer.write(b"\xe0\x00")  # DISCONNECT
+            await self.writer.drain()
+            self.writer.close()
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        if self._discard is not None:
+            self._discard.cancel()
+
+###########################################################################
+# Simulated devices                                                       #
+###########################################################################
+
+def device_signal(n_points, rate_hz, burst_every_s, rng, profile):
+    """
+    Analog and digital values of one device: background with shout or drill bursts of 1 to 4 s,
+    on average every burst_every_s, with the digital trigger rate of each class.
+
+    Returns:
+        analog_values: Array of n_points integer analog values, like analogRead()
+        digital_values: Array of n_points 0/1 digital values
+    """
+    labels = np.full(n_points, 'background', dtype=object)
+    position = int(rng.exponential(burst_every_s) * rate_hz)
+    while position < n_points:
+        length = int(rng.uniform(1, 4) * rate_hz)
+        labels[position:position + length] = rng.choice(['shout', 'drill'])
+        position += length + int(rng.exponential(burst_every_s) * rate_hz)
+
+    analog_values = np.empty(n_points)
+    digital_values = np.empty(n_points, dtype=int)
+    for label in ('background', 'shout', 'drill'):
+        index = np.flatnonzero(labels == label)
+        if len(index):
+            analog_values[index] = generate_class_signal(label, len(index), rng, profile)
+            digital_values[index] = rng.random(len(index)) < profile["classes"][label]["trigger_rate"]
+    return np.round(analog_values).astype(int), digital_values
+
+def encode_sample(timestamp_ms, analog_value, digital_value, payload_format, timestamp_format):
+    """
+    Data message of one sample as the sensors publish it.
+
+    JSON with a "%Y-%m-%d %H:%M:%S.%f" timestamp as sensors/mqtt_test.ino (KY-037), or with the
+    Unix time in ms as sensors/INMP441/publisher_mqtt.ino; binary is one BINARY_SAMPLE.
+    """
+    if payload_format == "binary":
+        return BINARY_SAMPLE.pack(timestamp_ms, analog_value, digital_value)
+    if timestamp_format == "string":
+        seconds = datetime.datetime.fromtimestamp(timestamp_ms // 1000).strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = f'"{seconds}.{timestamp_ms % 1000:03d}"'
+    else:
+        timestamp = str(timestamp_ms)
+    return f'{{"timestamp":{timestamp},"analog":{analog_value},"digital":{digital_value}}}'.encode()
+
+async def run_device(index, args, start, stop, counts, profile):
+    """
+    One simulated sensor: connect, publish its identifier, then args.rate samples per second until stop.
+
+    Samples are sent in ticks of args.tick_ms, each with the timestamp it was due at, so a device
+    that falls behind (because the loop is saturated) catches up with correctly timestamped samples.
+    """
+    rng = np.random.default_rng(args.seed + index)
+    analog_values, digital_values = device_signal(int(args.cycle_s * args.rate), args.rate, args.burst_every, rng, profile)
+    timestamp_format = args.timestamp_format
+    if timestamp_format == "mixed":
+        # Half KY-037 boards, half INMP441 boards
+        timestamp_format = ("string", "unix-ms")[index % 2]
+    device_id = f"{args.device_prefix}{index:04d}"
+
+    publisher = MqttPublisher()
+    await publisher.connect(args.broker, args.port, device_id, args.username, args.password)
+    publisher.publish(args.status_topic, device_id.encode())
+
+    # Spread the devices over the first tick
+    interval_s = 1.0 / args.rate
+    next_sample = start + rng.uniform(0, args.tick_ms / 1000.0)
+    sent = 0
+    try:
+        while True:
+            now = time.time()
+            if now >= stop:
+                break
+            while next_sample <= now:
+                position = sent % len(analog_values)
+                payload = encode_sample(int(next_sample * 1000), int(analog_values[position]),
+                                        int(digital_values[position]), args.payload, timestamp_format)
+                publisher.publish(args.data_topic, payload)
+                sent += 1
+                next_sample += interval_s
+            await publisher.drain()
+            counts[index] = sent
+            await asyncio.sleep(max(0.0, min(next_sample, stop) - time.time(), args.tick_ms / 1000.0))
+    finally:
+        counts[index] = sent
+        await publisher.close()
+
+def publish_worker(indices, args, start, stop, results):
+    """Run the devices of indices on one event loop, and put (published messages, CPU seconds, errors) on results."""
+    profile = load_profile()
+    counts = {index: 0 for index in indices}
+    cpu_start = time.process_time()
+
+    async def main():
+        return await asyncio.gather(*[run_device(index, args, start, stop, counts, profile) for index in indices],
+                                    return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    errors = [f"{type(outcome).__name__}: {outcome}" for outcome in outcomes if isinstance(outcome, BaseException)]
+    results.put((sum(counts.values()), time.process_time() - cpu_start, errors))
+
+###########################################################################
+# Bridge measurements                                                     #
+###########################################################################
+
+def scrape_metrics(url):
+    """Sum of each metric of the bridge's Prometheus endpoint over its labels, e.g. {"bridge_samples_total": 1234.0}."""
+    totals = {}
+    with urllib.request.urlopen(url, timeout=5) as response:
+        for line in response.read().decode().splitlines():
+            if not line or line.startswith('#'):
+                continue
+            name_and_labels, value = line.rsplit(' ', 1)
+            name = name_and_labels.split('{', 1)[0]
+            if name == "bridge_parse_errors_total":
+                # Keep the field, JSON errors are messages the bridge could not use
+                name = name_and_labels
+            totals[name] = totals.get(name, 0.0) + float(value)
+    return totals
+
+def find_bridge_pid(script="get_MQTT_data.py"):
+    """PID of the bridge process on this machine, or None."""
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", 'rb') as f:
+                arguments = f.read().split(b"\0")
+        except OSError:
+            continue
+        if any(argument.endswith(script.encode()) for argument in arguments) and int(pid) != os.getpid():
+            return int(pid)
+    return None
+
+def process_cpu_seconds(pid):
+    """User and system CPU time of a process, from /proc/<pid>/stat (Linux, as on the Raspberry Pi)."""
+    with open(f"/proc/{pid}/stat", 'r') as f:
+        # The command name can contain spaces, the fields after it cannot
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def bridge_snapshot(metrics_url, bridge_pid):
+    metrics = scrape_metrics(metrics_url)
+    return {
+        "time": time.monotonic(),
+        "samples": metrics.get("bridge_samples_total", 0.0),
+        "json_errors": metrics.get('bridge_parse_errors_total{field="json"}', 0.0),
+        "timestamp_errors": metrics.get('bridge_parse_errors_total{field="timestamp"}', 0.0),
+        "cpu": process_cpu_seconds(bridge_pid) if bridge_pid else None
+    }
+
+def wait_for_drain(metrics_url, bridge_pid, expected_samples, timeout_s, poll_s=0.5):
+    """
+    Scrape until the bridge has every expected sample, or its count stops growing for 2 s.
+
+    Returns:
+        snapshot: Last bridge_snapshot
+        settled: False if it was still receiving at timeout_s, i.e. messages are still queued at the broker
+    """
+    snapshot = bridge_snapshot(metrics_url, bridge_pid)
+    deadline = time.monotonic() + timeout_s
+    last_change = time.monotonic()
+    while snapshot["samples"] < expected_samples and time.monotonic() < deadline \
+            and time.monotonic() - last_change < 2.0:
+        time.sleep(poll_s)
+        previous = snapshot["samples"]
+        snapshot = bridge_snapshot(metrics_url, bridge_pid)
+        if snapshot["samples"] != previous:
+            last_change = time.monotonic()
+    settled = snapshot["samples"] >= expected_samples or time.monotonic() - last_change >= 2.0
+    return snapshot, settled
+
+def run_step(n_devices, args, bridge_pid):
+    """
+    Publish from n_devices for args.warmup + args.duration seconds.
+
+    The ingest rate and the bridge CPU are measured over the last args.duration seconds, when every
+    device is connected; the loss over the whole step, after the bridge drained the broker.
+    """
+    # A backlog of the previous step would count as received in this one
+    before, _ = wait_for_drain(args.metrics_url, bridge_pid, float("inf"), args.drain_timeout)
+    start = time.time() + 1.0 + n_devices / 500.0  # Time to connect
+    stop = start + args.warmup + args.duration
+
+    # Devices are dealt round-robin to the processes, each with its own event loop
+    results = multiprocessing.Queue()
+    n_processes = min(args.processes, n_devices)
+    workers = [
+        multiprocessing.Process(target=publish_worker,
+                                args=(list(range(i, n_devices, n_processes)), args, start, stop, results))
+        for i in range(n_processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    time.sleep(max(0.0, start + args.warmup - time.time()))
+    steady_start = bridge_snapshot(args.metrics_url, bridge_pid)
+    time.sleep(max(0.0, stop - time.time()))
+    steady_end = bridge_snapshot(args.metrics_url, bridge_pid)
+
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    published = sum(outcome[0] for outcome in outcomes)
+    generator_cpu = sum(outcome[1] for outcome in outcomes)
+    errors = [error for outcome in outcomes for error in outcome[2]]
+
+    after, settled = wait_for_drain(args.metrics_url, bridge_pid, before["samples"] + published, args.drain_timeout)
+    received = after["samples"] - before["samples"]
+    steady_s = steady_end["time"] - steady_start["time"]
+    bridge_cpu = None
+    if bridge_pid:
+        bridge_cpu = (steady_end["cpu"] - steady_start["cpu"]) / steady_s
+    return {
+        "devices": n_devices,
+        "offered": n_devices * args.rate,
+        "published_per_second": published / (stop - start),
+        "ingest_per_second": (steady_end["samples"] - steady_start["samples"]) / steady_s,
+        "published": published,
+        "received": received,
+        "json_errors": after["json_errors"] - before["json_errors"],
+        "timestamp_errors": after["timestamp_errors"] - before["timestamp_errors"],
+        "loss": 1 - (received + after["json_errors"] - before["json_errors"]) / published if published else 0.0,
+        "bridge_cpu": bridge_cpu,
+        "generator_cpu": generator_cpu / (stop - start),
+        "settled": settled,
+        "errors": errors
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, nargs='+', default=[10, 50, 100, 200], help="Simulated sensors of each step")
+    parser.add_argument('--rate', type=float, default=100.0, help="Samples per second per device")
+    parser.add_argument('--payload', choices=["json", "binary"], default="json")
+    parser.add_argument('--timestamp-format', choices=TIMESTAMP_FORMATS, default="mixed",
+                        help="JSON only: string (KY-037), unix-ms (INMP441) or mixed (half of each)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Measured seconds of each step")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Seconds of each step before the measurement")
+    parser.add_argument('--drain-timeout', type=float, default=30.0, help="Seconds to wait for the bridge to catch up after a step")
+    parser.add_argument('--burst-every', type=float, default=20.0, help="Mean seconds between shout or drill bursts of a device")
+    parser.add_argument('--cycle-s', type=float, default=120.0, help="Seconds of signal generated per device, then repeated")
+    parser.add_argument('--tick-ms', type=float, default=50.0, help="Devices publish the samples due every tick")
+    parser.add_argument('--processes', type=int, default=1, help="Publisher processes, each with its own event loop")
+    parser.add_argument('--broker', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--username', default="cloud")
+    parser.add_argument('--password', default="123")
+    parser.add_argument('--data-topic', default="esp1_data")
+    parser.add_argument('--status-topic', default="esp1_identifier")
+    parser.add_argument('--device-prefix', default="loadgen_")
+    parser.add_argument('--metrics-url', default="http://127.0.0.1:9101/metrics", help="Prometheus endpoint of the bridge")
+    parser.add_argument('--bridge-pid', type=int, help="PID of the bridge for its CPU time, found from its command line by default")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    bridge_pid = args.bridge_pid or find_bridge_pid()
+    if bridge_pid is None:
+        print("Bridge process not found, its CPU is not measured (use --bridge-pid)")
+    payload_name = args.payload if args.payload == "binary" else f"JSON with {args.timestamp_format} timestamps"
+    print(f"Broker {args.broker}:{args.port}, {args.rate:.0f} Hz per device, {payload_name}, "
+          f"{args.warmup:.0f} s warmup + {args.duration:.0f} s per step, {args.processes} publisher process(es)\n")
+
+    print(f"{'Devices':>8} {'Offered/s':>10} {'Sent/s':>9} {'Ingest/s':>9} {'Loss':>7} {'TS errors':>10} "
+          f"{'Bridge CPU':>11} {'CPU ms/device/s':>16} {'Generator CPU':>14}")
+    for n_devices in args.devices:
+        result = run_step(n_devices, args, bridge_pid)
+        bridge_cpu = f"{result['bridge_cpu']:>10.0%}" if result["bridge_cpu"] is not None else f"{'-':>10}"
+        per_device = f"{result['bridge_cpu'] * 1000 / n_devices:>16.2f}" if result["bridge_cpu"] is not None else f"{'-':>16}"
+        print(f"{n_devices:>8} {result['offered']:>10.0f} {result['published_per_second']:>9.0f} "
+              f"{result['ingest_per_second']:>9.0f} {result['loss']:>7.1%} {result['timestamp_errors']:>10.0f} "
+              f"{bridge_cpu} {per_device} {result['generator_cpu']:>13.0%}")
+        for error in result["errors"][:3]:
+            print(f"    {error}")
+        if not result["settled"]:
+            print(f"    Bridge still receiving after {args.drain_timeout:.0f} s: the loss includes messages queued at the broker")
+        if result["generator_cpu"] > 0.9 * args.processes:
+            print("    Generator saturated, the bridge may not be the bottleneck: add --processes")
@@ -0,0 +1,103 @@
+###########################################################################
+# Replay a synthetic noise session through noise_inference with and       #
+# without event coalescing, and compare the NoiseLog writes and items     #
+# Run from the repository root: python benchmarks/replay_coalescing.py    #
+###########################################################################
+
+import os
+import io
+import sys
+import json
+import argparse
+import contextlib
+import numpy as np
+
+from synthetic import load_profile, generate_class_signal, recording_to_payload
+from run_benchmarks import REPO_DIR, load_lambda_function
+
+# (label, seconds) segments of the replayed session: a 10-minute drilling session and a short shout
+DEFAULT_SESSION = [('background', 120), ('drill', 600), ('background', 60), ('shout', 30), ('background', 120)]
+
+def generate_session(session, seed=0, profile=None, start_timestamp=1764603161135):
+    """
+    Generate a continuous recording made of labelled segments.
+
+    Returns:
+        timestamps: Array of timestamps (ms)
+        analog_values: Array of analog values
+    """
+    profile = profile or load_profile()
+    rng = np.random.default_rng(seed)
+    interval = profile["time_interval_ms"]
+    mean_interval = float(np.dot(interval["values"], interval["probabilities"]))
+
+    analog_values = np.concatenate([
+        generate_class_signal(label, int(seconds * 1000 / mean_interval), rng, profile)
+        for label, seconds in session
+    ])
+    steps = rng.choice(interval["values"], size=len(analog_values) - 1, p=interval["probabilities"])
+    timestamps = start_timestamp + np.concatenate([[0], np.cumsum(steps)])
+
+    return timestamps, analog_values
+
+def replay(inference, timestamps, analog_values, payload_points, max_gap_ms, house_id="house_123"):
+    """
+    Send the recording to lambda_handler in payloads of payload_points, as the bridges do.
+
+    Args:
+        max_gap_ms: EVENT_MAX_GAP_MS for the run, None for one item per invocation
+
+    Returns:
+        Dictionary with the number of invocations, puts, updates, queries and items in the table
+    """
+    db = inference.dynamodb.__class__()
+    inference.dynamodb = db
+    inference.EVENT_MAX_GAP_MS = max_gap_ms
+    sys.modules[inference.write_events.__module__]._open_events.clear()
+
+    invocations = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for start in range(0, len(timestamps) - payload_points + 1, payload_points):
+            payload = recording_to_payload(timestamps[start:start + payload_points],
+                                           analog_values[start:start + payload_points], house_id)
+            response = inference.lambda_handler({'body': json.dumps(payload)}, None)
+            if response['statusCode'] != 200:
+                raise RuntimeError(response['body'])
+            invocations += 1
+
+    return {
+        'invocations': invocations,
+        'puts': db.puts,
+        'updates': db.updates,
+        'queries': db.queries,
+        'items': len(db.items),
+        'items_by_class': {
+            label: sum(1 for item in db.items.values() if item['noiseClass']['N'] == str(label_id))
+            for label, label_id in [('background', 0), ('shout', 1), ('drill', 2)]
+        }
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--payload-points', type=int, default=30, help="Data points per invocation (bridge BUFFER_SIZE)")
+    parser.add_argument('--max-gap-ms', type=float, default=2000, help="EVENT_MAX_GAP_MS for the coalescing run")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    inference = load_lambda_function(os.path.join(REPO_DIR, "lambda", "noise_inference", "lambda_function.py"))
+    timestamps, analog_values = generate_session(DEFAULT_SESSION, args.seed)
+    print(f"Session: {', '.join(f'{label} {seconds}s' for label, seconds in DEFAULT_SESSION)} "
+          f"({len(timestamps)} points, {args.payload_points} points per invocation)\n")
+
+    results = {
+        'one item per invocation': replay(inference, timestamps, analog_values, args.payload_points, None),
+        f'coalesced (gap {args.max_gap_ms:.0f} ms)': replay(inference, timestamps, analog_values, args.payload_points, args.max_gap_ms)
+    }
+
+    print(f"{'Run':<28} {'Invocations':>12} {'Puts':>7} {'Updates':>8} {'Queries':>8} {'Items':>7}  Items by class")
+    for name, r in results.items():
+        print(f"{name:<28} {r['invocations']:>12} {r['puts']:>7} {r['updates']:>8} {r['queries']:>8} {r['items']:>7}  {r['items_by_class']}")
+
+    baseline, coalesced = results.values()
+    print(f"\nItems (query result size) reduced {baseline['items'] / coalesced['items']:.1f}x, "
+          f"new items written reduced {baseline['puts'] / max(coalesced['puts'], 1):.1f}x")
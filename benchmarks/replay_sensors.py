@@ -0,0 +1,357 @@
+###########################################################################
+# Replay recorded or synthetic sensor logs from many virtual sensors      #
+# through the bridge capture, trigger and uploader, into noise_inference  #
+# in-process, at 1x to 1000x real time                                    #
+# Run from the repository root: python benchmarks/replay_sensors.py       #
+###########################################################################
+
+import os
+import io
+import sys
+import json
+import glob
+import time
+import argparse
+import datetime
+import threading
+import contextlib
+import logging
+
+import numpy as np
+import requests
+
+from run_benchmarks import REPO_DIR, LocalDynamoDB, load_module, load_lambda_function
+from synthetic import generate_recording
+
+RAW_DATA_DIR = os.path.join(REPO_DIR, "noise_prediction", "sample_data", "raw_data")
+MQTT_BRIDGE = os.path.join(REPO_DIR, "rpi", "get_MQTT_data.py")
+SERIAL_BRIDGE = os.path.join(REPO_DIR, "sensors", "esp32cam", "subscriber.py")
+
+# Virtual time of the first sample of every sensor
+REPLAY_START_MS = 1764547200000
+
+# The pacing loop checks the clock every this many samples
+PACING_CHUNK = 64
+
+class StageRecorder:
+    """Wall times of each window at the end of each stage, keyed by (house, start_time)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.pending = 0
+        self.context = threading.local()
+
+    def mark(self, key, stage, at=None):
+        with self.lock:
+            self.windows.setdefault(key, {})[stage] = time.perf_counter() if at is None else at
+
+class TimedDynamoDB(LocalDynamoDB):
+    """LocalDynamoDB that records the write time of each window and the size of every write."""
+
+    def __init__(self, recorder):
+        super().__init__()
+        self.recorder = recorder
+        self.write_sizes = []
+
+    def _record(self, item):
+        # Approximate item size as DynamoDB counts it: attribute names and values
+        self.write_sizes.append(sum(len(name) + len(next(iter(value.values()))) for name, value in item.items()))
+        window = getattr(self.recorder.context, "window", None)
+        if window is not None:
+            self.recorder.mark(window, "written")
+
+    def put_item(self, TableName, Item):
+        super().put_item(TableName, Item)
+        self._record(Item)
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None):
+        super().update_item(TableName, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression)
+        self._record(self.items[(Key["houseName"]["S"], Key["timestamp"]["N"])])
+        return {}
+
+class InProcessResponse:
+    def __init__(self, lambda_response):
+        self.status_code = lambda_response["statusCode"]
+        self.text = lambda_response["body"]
+
+    def json(self):
+        return json.loads(self.text)
+
+class InProcessRequests:
+    """Stand-in for the requests module of a bridge: post() calls lambda_handler in-process."""
+
+    exceptions = requests.exceptions
+
+    def __init__(self, inference, recorder):
+        self.inference = inference
+        self.recorder = recorder
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        window = (json["house_id"], json["start_time"])
+        self.recorder.context.window = window
+        self.recorder.mark(window, "posted")
+        response = self.inference.lambda_handler({'body': _dumps(json)}, None)
+        self.recorder.mark(window, "answered")
+        return InProcessResponse(response)
+
+_dumps = json.dumps
+
+def load_sensor_logs(source, n_sensors, duration_s, seed=0):
+    """
+    Samples of each virtual sensor over duration_s of virtual time.
+
+    Recorded logs are concatenated one after the other, each sensor starting at another file,
+    and shifted so that every sensor starts at REPLAY_START_MS. Synthetic logs alternate shout,
+    drill and background recordings.
+
+    Returns:
+        logs: List of (timestamps, analog_values, digital_values) arrays per sensor
+    """
+    if source == "recorded":
+        recordings = []
+        for file_name in sorted(glob.glob(os.path.join(RAW_DATA_DIR, "*.json"))):
+            with open(file_name, 'r') as f:
+                data = json.load(f)["sensor_data"]
+            recordings.append((np.array([p["timestamp"] for p in data], dtype=np.float64),
+                               np.array([float(p["analog_value"]) for p in data]),
+                               np.array([p.get("digital_value") or 0 for p in data], dtype=int)))
+
+    logs = []
+    for sensor in range(n_sensors):
+        if source == "recorded":
+            parts = []
+            offset = 0.0
+            index = sensor
+            while offset < duration_s * 1000:
+                timestamps, analog_values, digital_values = recordings[index % len(recordings)]
+                shifted = timestamps - timestamps[0] + offset
+                parts.append((shifted, analog_values, digital_values))
+                # The next recording follows after one sampling interval
+                offset = shifted[-1] + float(np.median(np.diff(timestamps)))
+                index += 1
+            timestamps, analog_values, digital_values = (np.concatenate(column) for column in zip(*parts))
+        else:
+            kind = ['shout', 'drill', 'background'][sensor % 3]
+            n_points = int(duration_s * 1000 / 23) + 1
+            timestamps, analog_values, digital_values = generate_recording(kind, n_points, seed=seed + sensor)
+            timestamps = timestamps - timestamps[0]
+
+        keep = timestamps < duration_s * 1000
+        logs.append((REPLAY_START_MS + timestamps[keep], analog_values[keep], digital_values[keep]))
+    return logs
+
+def load_bridges(bridge, n_sensors, inference, recorder, trigger_mode):
+    """
+    One instance of the bridge module per virtual sensor, with its uploader calling lambda_handler.
+
+    Returns:
+        bridges: List of bridge modules
+    """
+    bridges = []
+    for sensor in range(n_sensors):
+        path = MQTT_BRIDGE if bridge == "mqtt" else SERIAL_BRIDGE
+        module = load_module(f"bridge_{bridge}_{sensor}", path)
+        module.requests = InProcessRequests(inference, recorder)
+        module.TRIGGER_MODE = trigger_mode
+        module.ingest_queue = None
+        if bridge == "serial":
+            module.DEVICE_ID = f"sensor_{sensor}"
+
+        send = module.send_to_lambda_blocking
+        def send_and_record(final_payload, send=send):
+            recorder.mark((final_payload["house_id"], final_payload["start_time"]), "ready")
+            try:
+                send(final_payload)
+            finally:
+                with recorder.lock:
+                    recorder.pending -= 1
+        def start_upload(target, args):
+            with recorder.lock:
+                recorder.pending += 1
+            return threading.Thread(target=send_and_record, args=args)
+        # The bridges start one thread per full window: count them, and mark the window as ready
+        module.threading = _ThreadingProxy(start_upload)
+        bridges.append(module)
+    return bridges
+
+class _ThreadingProxy:
+    """threading module of a bridge whose Thread() goes through start_upload, everything else unchanged."""
+
+    def __init__(self, start_upload):
+        self.start_upload = start_upload
+        self.Lock = threading.Lock
+
+    def Thread(self, target, args):
+        return self.start_upload(target, args)
+
+class _Message:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+def prepare_samples(bridge, bridges, logs):
+    """
+    Everything each bridge receives, in virtual time order, prepared before the replay so that
+    encoding does not slow it down.
+
+    Returns:
+        times: Virtual time (ms) of each sample
+        calls: List of (function, args) to call per sample
+        sample_keys: (sensor, index) of each sample
+        bridge_timestamps: Per sensor, the timestamp the bridge computes for each sample, which
+                           becomes the start_time of the windows starting at that sample
+    """
+    times, calls, sample_keys, bridge_timestamps = [], [], [], []
+    for sensor, (module, (timestamps, analog_values, digital_values)) in enumerate(zip(bridges, logs)):
+        if bridge == "mqtt":
+            # The identifier message first, then one JSON message per sample in the ESP32 timestamp format
+            module.on_message(None, None, _Message(module.STATUS_TOPIC, f"sensor_{sensor}".encode()))
+            strings = [datetime.datetime.fromtimestamp(t / 1000.0).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                       for t in timestamps.tolist()]
+            bridge_timestamps.append({
+                datetime.datetime.strptime(s, "%Y-%m-%d %H:%M:%S.%f").timestamp() * 1000.0: i
+                for i, s in enumerate(strings)})
+            for i, (s, a, d) in enumerate(zip(strings, analog_values.tolist(), digital_values.tolist())):
+                message = _Message(module.DATA_TOPIC, json.dumps({"timestamp": s, "analog": a, "digital": d}).encode())
+                calls.append((module.on_message, (None, None, message)))
+        else:
+            bridge_timestamps.append({t: i for i, t in enumerate(timestamps.tolist())})
+            for t, a, d in zip(timestamps.tolist(), analog_values.tolist(), digital_values.tolist()):
+                calls.append((module.handle_sample, (t, a, d)))
+        times.append(timestamps)
+        sample_keys += [(sensor, i) for i in range(len(timestamps))]
+
+    times = np.concatenate(times)
+    order = np.argsort(times, kind="stable")
+    return times[order], [calls[i] for i in order], [sample_keys[i] for i in order], bridge_timestamps
+
+def replay(times, calls, sample_keys, n_sensors, speed):
+    """
+    Call each bridge at the virtual time of each sample divided by speed.
+
+    Returns:
+        dispatched: Per sensor, the wall time each sample was handed to its bridge
+        wall_seconds: Duration of the replay
+    """
+    dispatched = [dict() for _ in range(n_sensors)]
+    start = time.perf_counter()
+    first_ms = times[0]
+    for chunk in range(0, len(calls), PACING_CHUNK):
+        delay = start + (times[chunk] - first_ms) / 1000.0 / speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter()
+        for i in range(chunk, min(chunk + PACING_CHUNK, len(calls))):
+            function, args = calls[i]
+            function(*args)
+            sensor, index = sample_keys[i]
+            dispatched[sensor][index] = now
+    return dispatched, time.perf_counter() - start
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    if len(values) == 0:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    return {"p50": float(np.percentile(values, 50)), "p90": float(np.percentile(values, 90)),
+            "p99": float(np.percentile(values, 99)), "max": float(values.max())}
+
+def stage_latencies(recorder, dispatched, bridge_timestamps):
+    """
+    Latency of each stage per window (s): capture (first sample handed to the bridge until the
+    window is full), upload_wait (until the bridge posts it), inference (lambda_handler until
+    the write) and end_to_end (first sample until the write).
+    """
+    stages = {"capture": [], "upload_wait": [], "inference": [], "end_to_end": []}
+    house_sensors = {f"sensor_{sensor}": sensor for sensor in range(len(dispatched))}
+    for (house, start_time), marks in recorder.windows.items():
+        sensor = house_sensors.get(house)
+        index = bridge_timestamps[sensor].get(start_time) if sensor is not None else None
+        first = dispatched[sensor].get(index) if index is not None else None
+        if first is not None and "ready" in marks:
+            stages["capture"].append(marks["ready"] - first)
+        if "ready" in marks and "posted" in marks:
+            stages["upload_wait"].append(marks["posted"] - marks["ready"])
+        if "posted" in marks and "written" in marks:
+            stages["inference"].append(marks["written"] - marks["posted"])
+        if first is not None and "written" in marks:
+            stages["end_to_end"].append(marks["written"] - first)
+    return {stage: percentiles(values) for stage, values in stages.items()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', choices=["recorded", "synthetic"], default="recorded",
+                        help="noise_prediction/sample_data/raw_data logs, or benchmarks/synthetic.py recordings")
+    parser.add_argument('--bridge', choices=["mqtt", "serial"], default="mqtt",
+                        help="rpi/get_MQTT_data.py (JSON messages) or sensors/esp32cam/subscriber.py (parsed samples)")
+    parser.add_argument('--sensors', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=60.0, help="Virtual seconds of data per sensor")
+    parser.add_argument('--speed', type=float, nargs='+', default=[1, 10, 100, 1000], help="Multiples of real time")
+    parser.add_argument('--trigger-mode', choices=["digital", "energy", "either"], default="digital")
+    parser.add_argument('--event-max-gap-ms', type=float, default=None, help="EVENT_MAX_GAP_MS of noise_inference")
+    parser.add_argument('--output', default=None, help="Save the results as JSON")
+    args = parser.parse_args()
+
+    inference = load_lambda_function(os.path.join(REPO_DIR, "lambda", "noise_inference", "lambda_function.py"))
+    inference.EVENT_MAX_GAP_MS = args.event_max_gap_ms
+    logging.getLogger().setLevel(logging.CRITICAL)
+    logs = load_sensor_logs(args.source, args.sensors, args.duration)
+    n_samples = sum(len(log[0]) for log in logs)
+    print(f"{args.sensors} sensors x {args.duration:.0f} s of {args.source} data ({n_samples} samples) "
+          f"through the {args.bridge} bridge, trigger {args.trigger_mode}\n")
+
+    results = []
+    header = (f"{'Speed':>6} {'Achieved':>9} {'Windows':>8} {'Windows/s':>10} {'Capture p99':>12} {'Upload p99':>11} "
+              f"{'Inference p50/p99':>18} {'End-to-end p50/p99':>19} {'Items':>6} {'Writes':>7} {'WCU':>6}")
+    print(header)
+    for speed in args.speed:
+        recorder = StageRecorder()
+        db = TimedDynamoDB(recorder)
+        inference.dynamodb = db
+        sys.modules[inference.write_events.__module__]._open_events.clear()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            bridges = load_bridges(args.bridge, args.sensors, inference, recorder, args.trigger_mode)
+            times, calls, sample_keys, bridge_timestamps = prepare_samples(args.bridge, bridges, logs)
+            dispatched, wall_seconds = replay(times, calls, sample_keys, args.sensors, speed)
+            # Wait for the uploads of the last windows
+            while recorder.pending:
+                time.sleep(0.01)
+
+        written = [marks for marks in recorder.windows.values() if "written" in marks]
+        span = max(m["written"] for m in written) - min(min(d.values()) for d in dispatched if d) if written else 0.0
+        latencies = stage_latencies(recorder, dispatched, bridge_timestamps)
+        result = {
+            "speed": speed,
+            "achieved_speed": (times[-1] - times[0]) / 1000.0 / wall_seconds,
+            "windows": len(recorder.windows),
+            "windows_written": len(written),
+            "windows_per_second": len(written) / span if span else 0.0,
+            "stages_ms": latencies,
+            "items": len(db.items),
+            "puts": db.puts,
+            "updates": db.updates,
+            "write_bytes": int(sum(db.write_sizes)),
+            # One write capacity unit per started KB of each written item
+            "wcu": int(sum(-(-size // 1024) for size in db.write_sizes))
+        }
+        results.append(result)
+
+        def pair(stage):
+            values = latencies[stage]
+            return "-" if values["p50"] is None else f"{values['p50']:.0f}/{values['p99']:.0f}"
+        capture_p99 = latencies["capture"]["p99"]
+        upload_p99 = latencies["upload_wait"]["p99"]
+        print(f"{speed:>5.0f}x {result['achieved_speed']:>8.1f}x {result['windows']:>8} {result['windows_per_second']:>10.1f} "
+              f"{capture_p99 if capture_p99 is not None else float('nan'):>12.0f} "
+              f"{upload_p99 if upload_p99 is not None else float('nan'):>11.0f} "
+              f"{pair('inference'):>18} {pair('end_to_end'):>19} {result['items']:>6} "
+              f"{result['puts'] + result['updates']:>7} {result['wcu']:>6}")
+
+    print("\nLatencies in ms. Capture: first sample of the window until the window is full; upload: until the bridge "
+          "posts it; inference: lambda_handler until the item is written.")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=4)
+        print(f"Results saved to {args.output}")
@@ -0,0 +1,116 @@
+###########################################################################
+# Encode time and size of get_house_without_label responses: records vs   #
+# columnar format, with and without gzip                                  #
+# Run from the repository root: python benchmarks/response_encoding.py    #
+###########################################################################
+
+import os
+import gzip
+import json
+import time
+import base64
+import argparse
+from decimal import Decimal
+
+import numpy as np
+
+from run_benchmarks import REPO_DIR, load_module
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-southeast-1")
+os.environ["GZIP_MIN_BYTES"] = "1024"
+get_house_without_label = load_module(
+    "lambda_get_house_without_label",
+    os.path.join(REPO_DIR, "lambda", "get_house_without_label", "lambda_function.py"))
+
+GZIP_EVENT = {"headers": {"Accept-Encoding": "gzip, deflate, br"}}
+
+def synthetic_houses(n_items, n_houses, start_timestamp=1764547200000, seed=0):
+    """Records of one range as the cache returns them: {house: (float64 timestamps, int8 classes)}, sorted."""
+    rng = np.random.default_rng(seed)
+    timestamps = np.sort(start_timestamp + rng.integers(0, 7 * 24 * 3600 * 1000, n_items)).astype(np.float64)
+    houses = rng.integers(0, n_houses, n_items)
+    noise_classes = rng.choice([0, 1, 2], n_items, p=[0.8, 0.1, 0.1]).astype(np.int8)
+    return {f"house_{h}": (timestamps[houses == h], noise_classes[houses == h]) for h in range(n_houses)}
+
+def decimal_items(houses):
+    """The same records as the resource client's items, with Decimal numbers."""
+    return [
+        {"houseName": house, "timestamp": Decimal(int(t)), "noiseClass": Decimal(int(c)), "dummy": "1"}
+        for house, (timestamps, noise_classes) in houses.items()
+        for t, c in zip(timestamps, noise_classes)
+    ]
+
+def encode_decimal_items(items):
+    """Encoding of the original handler: per-item Decimal conversion and a json.dumps callback."""
+    def decimal_default(obj):
+        if isinstance(obj, Decimal):
+            if obj % 1 == 0:
+                return int(obj)
+            return float(obj)
+        raise TypeError
+
+    house_dict = {}
+    for item in items:
+        house = item["houseName"]
+        record = {"house": house, "timestamp": item["timestamp"], "noiseClass": item["noiseClass"]}
+        house_dict.setdefault(house, []).append(record)
+    return {"statusCode": 200, "body": json.dumps({"houses": house_dict}, default=decimal_default)}
+
+def encode(houses, response_format, event):
+    body = {"houses": get_house_without_label.encode_houses(houses, response_format)}
+    return get_house_without_label.http_response(body, event, compact=response_format == "columnar")
+
+def response_bytes(response):
+    """Bytes sent to the client, and the decoded JSON to check every variant returns the same records."""
+    if response.get("isBase64Encoded"):
+        raw = base64.b64decode(response["body"])
+        return len(raw), json.loads(gzip.decompress(raw))
+    return len(response["body"].encode()), json.loads(response["body"])
+
+def as_records(body):
+    """Sorted (house, timestamp, noiseClass) of a decoded body of either format."""
+    records = []
+    for house, value in body["houses"].items():
+        if isinstance(value, dict):
+            records += [(house, t, c) for t, c in zip(value["timestamps"], value["noiseClasses"])]
+        else:
+            records += [(record["house"], record["timestamp"], record["noiseClass"]) for record in value]
+    return sorted(records)
+
+def median_time(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--houses', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    for n_items in args.items:
+        houses = synthetic_houses(n_items, args.houses)
+        items = decimal_items(houses)
+        variants = [
+            ("records, Decimal items (original)", lambda: encode_decimal_items(items)),
+            ("records", lambda: encode(houses, "records", {})),
+            ("records + gzip", lambda: encode(houses, "records", GZIP_EVENT)),
+            ("columnar", lambda: encode(houses, "columnar", {})),
+            ("columnar + gzip", lambda: encode(houses, "columnar", GZIP_EVENT)),
+        ]
+
+        print(f"\n{n_items:,} records, {args.houses} houses")
+        print(f"{'Variant':<36} {'Encode ms':>10} {'Bytes':>12} {'vs original':>12}  Same records")
+        reference = None
+        for name, function in variants:
+            seconds, response = median_time(function, args.repeats)
+            n_bytes, body = response_bytes(response)
+            records = as_records(body)
+            if reference is None:
+                reference = (n_bytes, records)
+            print(f"{name:<36} {seconds * 1000:>10.1f} {n_bytes:>12,} {n_bytes / reference[0]:>11.1%}  "
+                  f"{records == reference[1]}")
@@ -0,0 +1,340 @@
+###########################################################################
+# Benchmarks for the preprocessing, training feature and inference paths  #
+# Run from the repository root: python benchmarks/run_benchmarks.py       #
+###########################################################################
+
+import os
+import io
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import zlib
+import bisect
+import tracemalloc
+import contextlib
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+from synthetic import generate_recording, recording_to_raw_json, recording_to_payload
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_DIR, "benchmarks", "baselines", "baseline.json")
+
+# Offline stages are timed on whole recordings, online stages on single inference payloads
+OFFLINE_SIZES = [1000, 10000, 100000]
+ONLINE_SIZES = [30, 300, 3000]
+
+def load_module(name, path, cwd=None):
+    """
+    Import a module from a file under a unique name.
+
+    The folders have modules with the same names (preprocessing.py, feature_extract.py,
+    lambda_function.py), so they cannot simply be put on sys.path together.
+    """
+    previous_cwd = os.getcwd()
+    module_dir = os.path.dirname(path)
+    sys.path.insert(0, module_dir)
+    try:
+        if cwd:
+            os.chdir(cwd)
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(previous_cwd)
+        sys.path.remove(module_dir)
+    return module
+
+class LocalDynamoDB:
+    """
+    Stand-in for the boto3 DynamoDB client that keeps items in memory, keyed by houseName and timestamp.
+
+    Supports the calls made by noise_inference: put_item, batch_write_item of puts, update_item with a
+    SET expression (plain values or "if_not_exists(name, :a) + :b") and a ConditionExpression of
+    "(attribute_not_exists(name) OR name < :value)" terms joined by AND, and query on houseName, and the
+    segmented scan of dynamodb/export_noise_log.py.
+    """
+
+    def __init__(self, latency_s=0.0, page_size=1000):
+        self.items = {}
+        self.puts = 0
+        self.updates = 0
+        self.queries = 0
+        self.scans = 0
+        self.batch_writes = 0
+        # Round trip time of each scan page, to see the effect of parallel segments
+        self.latency_s = latency_s
+        self.page_size = page_size
+        self._segment_keys = {}  # (Segment, TotalSegments) -> sorted keys, cleared on writes
+
+    def put_item(self, TableName, Item):
+        self.puts += 1
+        self._segment_keys.clear()
+        self.items[(Item["houseName"]["S"], Item["timestamp"]["N"])] = Item
+        return {}
+
+    def batch_write_item(self, RequestItems):
+        self.batch_writes += 1
+        self._segment_keys.clear()
+        for requests in RequestItems.values():
+            for request in requests:
+                item = request["PutRequest"]["Item"]
+                self.puts += 1
+                self.items[(item["houseName"]["S"], item["timestamp"]["N"])] = item
+        return {"UnprocessedItems": {}}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None):
+        self.updates += 1
+        self._segment_keys.clear()
+        values = ExpressionAttributeValues
+        item = self.items.get((Key["houseName"]["S"], Key["timestamp"]["N"]), dict(Key))
+        for name, _, value in re.findall(r"attribute_not_exists\((\w+)\) OR (\w+) < (:\w+)", ConditionExpression or ""):
+            if name in item and not float(item[name]["N"]) < float(values[value]["N"]):
+                error = Exception(f"The conditional request failed: {name} < {value}")
+                error.response = {"Error": {"Code": "ConditionalCheckFailedException"}}
+                raise error
+
+        for assignment in re.split(r",\s*(?![^(]*\))", UpdateExpression[len("SET "):]):
+            name, value = [part.strip() for part in assignment.split("=", 1)]
+            increment = re.fullmatch(r"if_not_exists\((\w+), (:\w+)\) \+ (:\w+)", value)
+            if increment:
+                current = item[increment[1]] if increment[1] in item else values[increment[2]]
+                total = float(current["N"]) + float(values[increment[3]]["N"])
+                item[name] = {"N": str(int(total)) if total.is_integer() else str(total)}
+            else:
+                item[name] = values[value]
+        self.items[(Key["houseName"]["S"], Key["timestamp"]["N"])] = item
+        return {}
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, ScanIndexForward=True, Limit=None):
+        self.queries += 1
+        house = list(ExpressionAttributeValues.values())[0]["S"]
+        items = sorted((item for (h, _), item in self.items.items() if h == house),
+                       key=lambda item: float(item["timestamp"]["N"]), reverse=not ScanIndexForward)
+        return {"Items": items[:Limit]}
+
+    def scan(self, TableName, Segment=0, TotalSegments=1, ExclusiveStartKey=None, FilterExpression=None,
+             ExpressionAttributeNames=None, ExpressionAttributeValues=None, ProjectionExpression=None):
+        """
+        One page of a segmented scan. Items are assigned to segments by a hash of houseName, as DynamoDB
+        assigns them by partition key. Only FilterExpression of the form "#name > :value" is supported.
+        """
+        self.scans += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+        keys = self._segment_keys.get((Segment, TotalSegments))
+        if keys is None:
+            keys = self._segment_keys[(Segment, TotalSegments)] = sorted(
+                key for key in self.items if zlib.crc32(key[0].encode()) % TotalSegments == Segment)
+        first = 0
+        if ExclusiveStartKey is not None:
+            first = bisect.bisect_right(keys, (ExclusiveStartKey["houseName"]["S"], ExclusiveStartKey["timestamp"]["N"]))
+        page = keys[first:first + self.page_size]
+
+        items = [self.items[key] for key in page]
+        if FilterExpression:
+            name, _, value = FilterExpression.split()
+            name = (ExpressionAttributeNames or {}).get(name, name)
+            threshold = float(ExpressionAttributeValues[value]["N"])
+            items = [item for item in items if float(item[name]["N"]) > threshold]
+
+        response = {"Items": items, "Count": len(items), "ScannedCount": len(page)}
+        if first + self.page_size < len(keys):
+            response["LastEvaluatedKey"] = {"houseName": {"S": page[-1][0]}, "timestamp": {"N": page[-1][1]}}
+        return response
+
+def load_lambda_function(path):
+    """Import a Lambda handler module with its model, and DynamoDB replaced by a local stand-in."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "ap-southeast-1")
+    module = load_module(f"lambda_{os.path.basename(os.path.dirname(path))}", path, cwd=os.path.dirname(path))
+    module.dynamodb = LocalDynamoDB()
+    return module
+
+def make_stages(work_dir):
+    """
+    Build the benchmarked stages.
+
+    Returns:
+        stages: Dictionary of stage name -> (sizes, setup), where setup(size) returns a
+                function running the stage once on an input of that many data points
+    """
+    np_pre = load_module("np_preprocessing", os.path.join(REPO_DIR, "noise_prediction", "preprocessing.py"))
+    sm_pre = load_module("sm_preprocessing", os.path.join(REPO_DIR, "aws_sagemaker", "preprocessing.py"))
+    sm_fe = load_module("sm_feature_extract", os.path.join(REPO_DIR, "aws_sagemaker", "feature_extract.py"))
+    inference = load_lambda_function(os.path.join(REPO_DIR, "lambda", "noise_inference", "lambda_function.py"))
+
+    def time_df(size, seed=0):
+        timestamps, analog_values, _ = generate_recording('drill', size, seed=seed)
+        return pd.DataFrame({'timestamp': timestamps, 'analog_value': analog_values})
+
+    def setup_process_unstructured(size):
+        raw_dir = os.path.join(work_dir, "raw_data")
+        os.makedirs(raw_dir, exist_ok=True)
+        file_name = os.path.join(raw_dir, f"drill_{size}.json")
+        with open(file_name, 'w') as f:
+            f.write(recording_to_raw_json(*generate_recording('drill', size)))
+        return lambda: np_pre.process_unstructured_data_to_csv(file_name, 23)
+
+    def setup_fourier_transform(size):
+        df = time_df(size)
+        return lambda: np_pre.fourier_transform(df, 30, 70)
+
+    def setup_load_dataset_with_features(size):
+        freq_df, _ = sm_pre.fourier_transform(time_df(size), 30, 70)
+        return lambda: sm_fe.load_dataset_with_features(freq_df, 2)
+
+    def setup_extract_spectral_features_batch(size):
+        timestamps, analog_values, _ = generate_recording('drill', size)
+        frame_size = min(inference.FRAME_SIZE, size)
+        hop_size = frame_size - int(frame_size * inference.OVERLAP_PERCENT / 100)
+        frequency, magnitude = inference.frame_spectra(analog_values, timestamps[1] - timestamps[0], frame_size, hop_size)
+        return lambda: inference.extract_spectral_features_batch(frequency, magnitude)
+
+    def setup_inference_frame_features(size):
+        df = time_df(size)
+        return lambda: inference.frame_features(df)
+
+    def setup_lambda_handler(size):
+        timestamps, analog_values, _ = generate_recording('drill', size)
+        event = {'body': json.dumps(recording_to_payload(timestamps, analog_values))}
+        return lambda: inference.lambda_handler(event, None)
+
+    return {
+        'process_unstructured_data_to_csv': (OFFLINE_SIZES, setup_process_unstructured),
+        'fourier_transform': (OFFLINE_SIZES, setup_fourier_transform),
+        'load_dataset_with_features': (OFFLINE_SIZES, setup_load_dataset_with_features),
+        'inference_frame_features': (ONLINE_SIZES, setup_inference_frame_features),
+        'extract_spectral_features_batch': (ONLINE_SIZES, setup_extract_spectral_features_batch),
+        'lambda_handler': (ONLINE_SIZES, setup_lambda_handler),
+    }
+
+def measure(run, size, repeats):
+    """
+    Time a stage and measure its peak memory.
+
+    Returns:
+        Dictionary with 'median_s', 'min_s', 'throughput_per_s' (data points per second) and 'peak_memory_kb'
+    """
+    # Warm up, and silence the progress prints of the stages
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()
+
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        # Peak memory in a separate run, since tracing slows the stage down
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    median = float(np.median(times))
+    return {
+        'size': size,
+        'median_s': median,
+        'min_s': float(np.min(times)),
+        'throughput_per_s': size / median,
+        'peak_memory_kb': peak / 1024
+    }
+
+def run_benchmarks(stage_names=None, repeats=5):
+    """
+    Run the benchmarks.
+
+    Returns:
+        results: Dictionary with 'environment' and 'results' keyed by '<stage>@<size>'
+    """
+    work_dir = tempfile.mkdtemp(prefix="noisewatch_bench_")
+    results = {}
+    try:
+        stages = make_stages(work_dir)
+        for name, (sizes, setup) in stages.items():
+            if stage_names and name not in stage_names:
+                continue
+            for size in sizes:
+                result = measure(setup(size), size, repeats)
+                result['stage'] = name
+                results[f"{name}@{size}"] = result
+                print(f"{name:<34} {size:>8} {result['median_s'] * 1000:>11.3f} ms "
+                      f"{result['throughput_per_s']:>14.0f} pts/s {result['peak_memory_kb']:>10.1f} KB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor()
+        },
+        'results': results
+    }
+
+def compare(current, baseline, threshold):
+    """
+    Compare median times with a baseline.
+
+    Returns:
+        regressions: List of (key, baseline median, current median, ratio) slower than the baseline by more than threshold
+    """
+    regressions = []
+    for key, result in current['results'].items():
+        if key not in baseline['results']:
+            continue
+        base = baseline['results'][key]['median_s']
+        ratio = result['median_s'] / base
+        if ratio > 1 + threshold:
+            regressions.append((key, base, result['median_s'], ratio))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stages', type=str, nargs='*', help="Stages to run (default: all)")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Save the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument('--output', type=str, help="Also save the results to this JSON file")
+    args = parser.parse_args()
+
+    print(f"{'Stage':<34} {'Size':>8} {'Median':>14} {'Throughput':>20} {'Peak memory':>13}")
+    current = run_benchmarks(args.stages, args.repeats)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=4)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=4)
+        print(f"\nBaseline saved to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}. Run with --save-baseline to create one.")
+        sys.exit(0)
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}:")
+        for key, base, now, ratio in regressions:
+            print(f"  {key}: {base * 1000:.3f} ms -> {now * 1000:.3f} ms ({ratio:.2f}x)")
+        sys.exit(1)
+
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
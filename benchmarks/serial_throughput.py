@@ -0,0 +1,154 @@
+###########################################################################
+# Compare the per-line serial read of the ESP32-CAM subscriber with the   #
+# batch reader, on a pseudo-terminal standing in for the serial port      #
+# Run from the repository root: python benchmarks/serial_throughput.py    #
+###########################################################################
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+import numpy as np
+import serial
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "sensors", "esp32cam"))
+
+from serial_reader import SerialBatchReader
+
+def generate_lines(n_lines, seed=0):
+    """ESP32 output: n_lines of "RMS_VALUE|DIGITAL_TRIGGER", as publisher-inmp441 prints them."""
+    rng = np.random.default_rng(seed)
+    rms = rng.gamma(2.0, 40.0, n_lines)
+    digital = (rms > 200).astype(int)
+    return "".join(f"{value:.2f}|{trigger}\r\n" for value, trigger in zip(rms, digital)).encode()
+
+def open_pty_port():
+    """Open a pty: the master end is the ESP32, the slave end is opened as the serial port."""
+    master_fd, slave_fd = os.openpty()
+    ser = serial.Serial(os.ttyname(slave_fd), 115200, timeout=0.5)
+    return master_fd, slave_fd, ser
+
+def write_all(master_fd, data, chunk_size=4096):
+    """Write the lines as fast as the reader drains them."""
+    view = memoryview(data)
+    while view:
+        written = os.write(master_fd, view[:chunk_size])
+        view = view[written:]
+
+def write_paced(master_fd, data, sample_interval_ms, group_lines):
+    """
+    Write the lines at the ESP32 rate, group_lines at a time, like the USB-serial adapter
+    delivers them, so that receipt times bunch up while the samples are evenly spaced.
+    """
+    lines = data.splitlines(keepends=True)
+    start = time.monotonic()
+    for first in range(0, len(lines), group_lines):
+        # The group is delivered once its last line has been sampled
+        due = start + (first + group_lines - 1) * sample_interval_ms / 1000.0
+        time.sleep(max(0.0, due - time.monotonic()))
+        write_all(master_fd, b"".join(lines[first:first + group_lines]))
+
+def read_per_line(ser, n_lines):
+    """The previous subscriber loop: readline, decode, split and convert each line, timestamp on receipt."""
+    timestamps = []
+    analog_values = []
+    while len(analog_values) < n_lines:
+        line = ser.readline().decode('utf-8').strip()
+        if not line:
+            continue
+        parts = line.split('|')
+        if len(parts) != 2:
+            continue
+        try:
+            analog_value_float = float(parts[0])
+            digital_value_int = int(parts[1])
+        except ValueError:
+            continue
+        timestamps.append(time.time() * 1000.0)
+        analog_values.append(analog_value_float)
+    return np.array(timestamps), np.array(analog_values)
+
+def read_batches(ser, n_lines, sample_interval_ms):
+    """The batch reader used by the subscriber."""
+    reader = SerialBatchReader(ser, sample_interval_ms)
+    timestamps = []
+    analog_values = []
+    n_read = 0
+    while n_read < n_lines:
+        batch = reader.read_batch()
+        if batch is None:
+            continue
+        timestamps.append(batch[0])
+        analog_values.append(batch[1])
+        n_read += len(batch[1])
+    return np.concatenate(timestamps), np.concatenate(analog_values)
+
+def run(path, data, n_lines, sample_interval_ms, group_lines=None):
+    """
+    Stream the lines through a fresh pty and time the reader.
+
+    Args:
+        group_lines: None to write as fast as possible, else write at the sampling rate in groups of group_lines
+
+    Returns:
+        Dictionary with the wall time, lines per second, parsed values and timestamps
+    """
+    master_fd, slave_fd, ser = open_pty_port()
+    if group_lines is None:
+        writer = threading.Thread(target=write_all, args=(master_fd, data), daemon=True)
+    else:
+        writer = threading.Thread(target=write_paced, args=(master_fd, data, sample_interval_ms, group_lines), daemon=True)
+    try:
+        start = time.perf_counter()
+        writer.start()
+        if path == "per_line":
+            timestamps, analog_values = read_per_line(ser, n_lines)
+        else:
+            timestamps, analog_values = read_batches(ser, n_lines, sample_interval_ms)
+        seconds = time.perf_counter() - start
+        writer.join()
+    finally:
+        ser.close()
+        os.close(slave_fd)
+        os.close(master_fd)
+
+    return {
+        'seconds': seconds,
+        'lines_per_second': n_lines / seconds,
+        'analog_values': analog_values,
+        'timestamps': timestamps
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=200000, help="Lines streamed through the pty")
+    parser.add_argument('--sample-interval-ms', type=float, default=23.0, help="SAMPLE_INTERVAL_MS of the subscriber")
+    parser.add_argument('--paced-seconds', type=float, default=10.0, help="Length of the paced run used for the timestamp jitter")
+    parser.add_argument('--usb-group', type=int, default=4, help="Lines delivered together in the paced run")
+    args = parser.parse_args()
+
+    # 1. Throughput: write as fast as the reader keeps up
+    data = generate_lines(args.lines)
+    print(f"Streaming {args.lines} lines ({len(data) / 1e6:.1f} MB) through a pty as fast as they are read\n")
+
+    results = {path: run(path, data, args.lines, args.sample_interval_ms) for path in ["per_line", "batch"]}
+
+    print(f"{'Reader':<10} {'Seconds':>9} {'Lines/s':>12}")
+    for path, r in results.items():
+        print(f"{path:<10} {r['seconds']:>9.3f} {r['lines_per_second']:>12,.0f}")
+
+    per_line, batch = results['per_line'], results['batch']
+    print(f"\nSpeedup: {per_line['seconds'] / batch['seconds']:.1f}x")
+    print(f"Same values: {np.array_equal(per_line['analog_values'], batch['analog_values'])}")
+
+    # 2. Timestamps: write at the sampling rate in USB-sized groups
+    n_paced = int(args.paced_seconds * 1000 / args.sample_interval_ms)
+    paced_data = generate_lines(n_paced, seed=1)
+    print(f"\nPaced run: {n_paced} lines every {args.sample_interval_ms} ms, delivered {args.usb_group} at a time")
+    print(f"{'Reader':<10} {'Mean step (ms)':>15} {'Step std (ms)':>14}")
+    for path in ["per_line", "batch"]:
+        steps = np.diff(run(path, paced_data, n_paced, args.sample_interval_ms, args.usb_group)['timestamps'])
+        print(f"{path:<10} {np.mean(steps):>15.3f} {np.std(steps):>14.3f}")
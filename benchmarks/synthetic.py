@@ -0,0 +1,170 @@
+###########################################################################
+# Deterministic synthetic shout/drill/background signal generator         #
+# Refit the profile from the sample data: python synthetic.py --fit       #
+###########################################################################
+
+import os
+import glob
+import json
+import argparse
+import numpy as np
+from scipy.signal import lfilter
+from scipy.special import ndtr
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_PATH = os.path.join(BENCHMARK_DIR, "signal_profile.json")
+RAW_DATA_DIR = os.path.join(BENCHMARK_DIR, "..", "noise_prediction", "sample_data", "raw_data")
+
+QUANTILE_LEVELS = np.arange(0, 101, 5)
+
+def _segments(values, kind):
+    """
+    Split a raw recording into (label, values) segments with the same schedule as get_labelled_csv:
+    5 equal intervals, alternating between the noise type and background.
+    """
+    n = len(values)
+    interval_length = n // 5
+    bounds = [0, interval_length, 2 * interval_length, 3 * interval_length, 4 * interval_length, n]
+    for i in range(5):
+        yield (kind if i % 2 == 0 else 'background'), values[bounds[i]:bounds[i + 1]]
+
+def fit_profile(raw_data_dir=RAW_DATA_DIR):
+    """
+    Fit the per-class distribution of the sample recordings.
+
+    For each class this records the quantiles of the analog values, the mean lag-1 autocorrelation
+    and the fraction of points with the digital trigger set. It also records the sampling interval.
+
+    Returns:
+        profile: Dictionary that can be saved as signal_profile.json
+    """
+    values = {'background': [], 'shout': [], 'drill': []}
+    triggers = {'background': [], 'shout': [], 'drill': []}
+    autocorrelations = {'background': [], 'shout': [], 'drill': []}
+    intervals = []
+
+    for file_name in sorted(glob.glob(os.path.join(raw_data_dir, "*.json"))):
+        kind = 'shout' if 'shout' in os.path.basename(file_name) else 'drill'
+        with open(file_name, 'r') as f:
+            sensor_data = json.load(f)["sensor_data"]
+
+        analog = np.array([p["analog_value"] for p in sensor_data], dtype=float)
+        digital = np.array([p.get("digital_value") or 0 for p in sensor_data], dtype=float)
+        intervals.extend(np.diff([p["timestamp"] for p in sensor_data]))
+
+        for (label, segment), (_, digital_segment) in zip(_segments(analog, kind), _segments(digital, kind)):
+            values[label].append(segment)
+            triggers[label].append(digital_segment)
+            centered = segment - segment.mean()
+            autocorrelations[label].append(np.sum(centered[1:] * centered[:-1]) / np.sum(centered ** 2))
+
+    # Keep the two most common sampling intervals
+    interval_values, counts = np.unique(np.round(intervals), return_counts=True)
+    top = np.argsort(counts)[::-1][:2]
+
+    classes = {}
+    for label in values:
+        all_values = np.concatenate(values[label])
+        classes[label] = {
+            "quantiles": [round(float(q), 2) for q in np.percentile(all_values, QUANTILE_LEVELS)],
+            "autocorrelation": round(float(np.mean(autocorrelations[label])), 4),
+            "trigger_rate": round(float(np.mean(np.concatenate(triggers[label]))), 4)
+        }
+
+    return {
+        "source": "noise_prediction/sample_data/raw_data/*.json",
+        "time_interval_ms": {
+            "values": [int(v) for v in interval_values[top]],
+            "probabilities": [round(float(p), 2) for p in counts[top] / counts[top].sum()]
+        },
+        "classes": classes
+    }
+
+def load_profile(profile_path=PROFILE_PATH):
+    with open(profile_path, 'r') as f:
+        return json.load(f)
+
+def generate_class_signal(label, n_points, rng, profile):
+    """
+    Generate analog values for one class.
+
+    An AR(1) Gaussian process with the class's lag-1 autocorrelation is mapped through the class's
+    empirical quantile function, so the values follow the recorded distribution and are similarly smooth.
+    """
+    class_profile = profile["classes"][label]
+    phi = class_profile["autocorrelation"]
+
+    # z[i] = phi * z[i - 1] + scale * noise[i], starting from the stationary distribution
+    noise = rng.standard_normal(n_points)
+    scale = np.sqrt(1 - phi ** 2)
+    noise[0] /= scale
+    z = lfilter([scale], [1, -phi], noise)
+
+    # Standard normal -> uniform -> empirical quantiles
+    return np.interp(ndtr(z) * 100, QUANTILE_LEVELS, class_profile["quantiles"])
+
+def generate_recording(kind='shout', n_points=1077, sample_rate=None, seed=0, profile=None, start_timestamp=1764603161135):
+    """
+    Generate a synthetic raw recording with the same labelling schedule as the sample data
+    (noise type, background, noise type, background, noise type in 5 equal intervals).
+
+    Args:
+        kind: 'shout', 'drill' or 'background' (background only)
+        n_points: Number of data points
+        sample_rate: Sampling rate in Hz. If None, intervals follow the recorded jitter (~23 ms)
+        seed: Random seed, the same seed always gives the same recording
+
+    Returns:
+        timestamps: Array of timestamps (ms)
+        analog_values: Array of analog values
+        digital_values: Array of 0/1 digital trigger values
+    """
+    profile = profile or load_profile()
+    rng = np.random.default_rng(seed)
+
+    # Timestamps
+    if sample_rate is None:
+        interval = profile["time_interval_ms"]
+        steps = rng.choice(interval["values"], size=n_points - 1, p=interval["probabilities"])
+    else:
+        steps = np.full(n_points - 1, 1000.0 / sample_rate)
+    timestamps = start_timestamp + np.concatenate([[0], np.cumsum(steps)])
+
+    # Analog and digital values per labelled segment
+    analog_values = np.empty(n_points)
+    digital_values = np.empty(n_points, dtype=int)
+    for label, index in _segments(np.arange(n_points), kind):
+        analog_values[index] = generate_class_signal(label, len(index), rng, profile)
+        digital_values[index] = rng.random(len(index)) < profile["classes"][label]["trigger_rate"]
+
+    return timestamps, analog_values, digital_values
+
+def recording_to_raw_json(timestamps, analog_values, digital_values):
+    """Format a recording like the raw logs in sample_data/raw_data (collect_data_though_rpi.py output)."""
+    return json.dumps({
+        "aggregation_duration_seconds": round(float(timestamps[-1] - timestamps[0]) / 1000, 1),
+        "total_entries": len(timestamps),
+        "generated_at": "synthetic",
+        "sensor_data": [
+            {"timestamp": int(t), "analog_value": round(float(a), 4), "digital_value": int(d)}
+            for t, a, d in zip(timestamps, analog_values, digital_values)
+        ]
+    }, indent=4)
+
+def recording_to_payload(timestamps, analog_values, house_id="house_123"):
+    """Format a recording like the HTTP POST body sent to the noise_inference Lambda."""
+    return {
+        "start_time": float(timestamps[0]),
+        "house_id": house_id,
+        "data": [{"timestamp": float(t), "analog_value": float(a)} for t, a in zip(timestamps, analog_values)]
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fit', action='store_true', help="Refit signal_profile.json from the sample raw data")
+    args = parser.parse_args()
+
+    if args.fit:
+        with open(PROFILE_PATH, 'w') as f:
+            json.dump(fit_profile(), f, indent=4)
+        print(f"Profile saved to {PROFILE_PATH}")
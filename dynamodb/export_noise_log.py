@@ -0,0 +1,229 @@
+###########################################################################
+# Export NoiseLog to local columnar files, one folder per day             #
+# python export_noise_log.py --output noise_log_export --segments 8       #
+###########################################################################
+
+import os
+import json
+import time
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+TABLE_NAME = "NoiseLog"
+WATERMARK_FILE_NAME = "_watermark.json"
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Items keep arriving with an older sample time for a while (bridge retries, ingest queue
+# redeliveries after the visibility timeout), so a run only exports the items older than this
+DEFAULT_LAG_MS = 60 * 60 * 1000
+
+def scan_segment(dynamodb, segment, total_segments, watermark=None, table_name=TABLE_NAME):
+    """
+    Scan one segment of the table into typed column arrays.
+
+    The low-level client returns numbers as strings, which are converted per page with one
+    NumPy conversion, so items never go through Decimal or JSON.
+
+    Args:
+        watermark: Only export items with a timestamp greater than this (incremental mode)
+
+    Returns:
+        houses: Array of house names
+        timestamps: Array of timestamps (ms, float64: coalesced events have fractional keys)
+        noise_classes: Array of noise classes (int8)
+    """
+    kwargs = {
+        "TableName": table_name,
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "ProjectionExpression": "houseName, #ts, noiseClass",
+        "ExpressionAttributeNames": {"#ts": "timestamp"}
+    }
+    if watermark is not None:
+        # A Scan still reads the whole segment, the filter only drops the old items before they are returned
+        kwargs["FilterExpression"] = "#ts > :watermark"
+        kwargs["ExpressionAttributeValues"] = {":watermark": {"N": repr(float(watermark))}}
+
+    houses, timestamps, noise_classes = [], [], []
+    while True:
+        response = dynamodb.scan(**kwargs)
+        items = response.get("Items", [])
+        if items:
+            houses.append(np.array([item["houseName"]["S"] for item in items], dtype=object))
+            timestamps.append(np.array([item["timestamp"]["N"] for item in items]).astype(np.float64))
+            noise_classes.append(np.array([item["noiseClass"]["N"] for item in items]).astype(np.int8))
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    if not houses:
+        return np.array([], dtype=object), np.array([], dtype=np.float64), np.array([], dtype=np.int8)
+    return np.concatenate(houses), np.concatenate(timestamps), np.concatenate(noise_classes)
+
+def parallel_scan(dynamodb, total_segments=8, watermark=None, table_name=TABLE_NAME):
+    """Scan all segments on a thread pool and concatenate their columns, sorted by timestamp."""
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        parts = list(executor.map(
+            lambda segment: scan_segment(dynamodb, segment, total_segments, watermark, table_name),
+            range(total_segments)))
+
+    houses = np.concatenate([part[0] for part in parts])
+    timestamps = np.concatenate([part[1] for part in parts])
+    noise_classes = np.concatenate([part[2] for part in parts])
+
+    order = np.argsort(timestamps, kind="stable")
+    return houses[order], timestamps[order], noise_classes[order]
+
+def day_of(timestamp_ms):
+    """UTC date (YYYY-MM-DD) of a timestamp in ms."""
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000.0, tz=datetime.timezone.utc).strftime("%Y-%m-%d")
+
+def write_day(path, houses, timestamps, noise_classes, file_format):
+    """Write one day's columns as a compressed NPZ file or a Parquet file."""
+    if file_format == "parquet":
+        # Only needed for Parquet output
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table({
+            "houseName": pa.array(houses.tolist(), type=pa.string()).dictionary_encode(),
+            "timestamp": pa.array(timestamps, type=pa.float64()),
+            "noiseClass": pa.array(noise_classes, type=pa.int8())
+        })
+        pq.write_table(table, path, compression="zstd")
+    else:
+        np.savez_compressed(path, houseName=houses.astype(str), timestamp=timestamps, noiseClass=noise_classes)
+
+def load_watermark(output_dir):
+    """Timestamp up to which the previous runs exported, or None if nothing was exported yet."""
+    path = os.path.join(output_dir, WATERMARK_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)["watermark"]
+
+def save_watermark(output_dir, watermark, run_id):
+    """Save the watermark atomically, after the files of the run are written."""
+    path = os.path.join(output_dir, WATERMARK_FILE_NAME)
+    with open(path + ".tmp", 'w') as f:
+        json.dump({"watermark": watermark, "run": run_id}, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+def export_noise_log(dynamodb, output_dir, total_segments=8, file_format="npz", incremental=False,
+                     table_name=TABLE_NAME, lag_ms=DEFAULT_LAG_MS, now_ms=None):
+    """
+    Export NoiseLog into output_dir/day=YYYY-MM-DD/part-<run>.<npz|parquet>.
+
+    Each run exports the items up to lag_ms before now and saves that cutoff as the watermark, so
+    an incremental run only adds the items between the previous watermark and its own cutoff.
+    Items written more than lag_ms after their timestamp are not picked up by incremental runs;
+    a full run (new output_dir) exports everything up to its cutoff.
+
+    A full run is refused when output_dir already has an export, since load_export reads every
+    part and the rows would be counted twice.
+
+    Args:
+        lag_ms: How long before now items can still be written late
+        now_ms: Time of the run (ms), the current time by default
+
+    Returns:
+        Dictionary with the number of items, days and files written, the watermark and the times (s)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if not incremental and (os.path.exists(os.path.join(output_dir, WATERMARK_FILE_NAME))
+                            or any(name.startswith("day=") for name in os.listdir(output_dir))):
+        raise ValueError(f"{output_dir} already has an export: use incremental mode, or a new folder for a full export")
+    watermark = load_watermark(output_dir) if incremental else None
+    run_id = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    cutoff = (time.time() * 1000 if now_ms is None else now_ms) - lag_ms
+
+    start = time.perf_counter()
+    houses, timestamps, noise_classes = parallel_scan(dynamodb, total_segments, watermark, table_name)
+    scan_seconds = time.perf_counter() - start
+
+    # The items after the cutoff are left to the next run, which starts from it
+    keep = int(np.searchsorted(timestamps, cutoff, side="right"))
+    houses, timestamps, noise_classes = houses[:keep], timestamps[:keep], noise_classes[:keep]
+
+    # Rows are sorted by timestamp, so each day is a contiguous slice
+    day_ids = (timestamps // DAY_MS).astype(np.int64)
+    boundaries = np.flatnonzero(np.diff(day_ids)) + 1
+    starts = np.concatenate([[0], boundaries]) if len(timestamps) else np.array([], dtype=np.int64)
+    ends = np.concatenate([boundaries, [len(timestamps)]]) if len(timestamps) else np.array([], dtype=np.int64)
+
+    extension = "parquet" if file_format == "parquet" else "npz"
+    files = []
+    for lo, hi in zip(starts, ends):
+        day_dir = os.path.join(output_dir, f"day={day_of(timestamps[lo])}")
+        os.makedirs(day_dir, exist_ok=True)
+        path = os.path.join(day_dir, f"part-{run_id}.{extension}")
+        write_day(path, houses[lo:hi], timestamps[lo:hi], noise_classes[lo:hi], file_format)
+        files.append(path)
+
+    watermark = cutoff if watermark is None else max(watermark, cutoff)
+    save_watermark(output_dir, watermark, run_id)
+
+    return {
+        "items": int(len(timestamps)),
+        "days": len(files),
+        "files": files,
+        "watermark": watermark,
+        "scan_seconds": scan_seconds,
+        "total_seconds": time.perf_counter() - start
+    }
+
+def load_export(output_dir, start_day=None, end_day=None):
+    """
+    Read the exported parts back, optionally only the days between start_day and end_day (YYYY-MM-DD).
+
+    Returns:
+        houses, timestamps, noise_classes arrays, sorted by timestamp
+    """
+    houses, timestamps, noise_classes = [], [], []
+    for day_dir in sorted(os.listdir(output_dir)):
+        if not day_dir.startswith("day="):
+            continue
+        day = day_dir[len("day="):]
+        if (start_day and day < start_day) or (end_day and day > end_day):
+            continue
+        for file_name in sorted(os.listdir(os.path.join(output_dir, day_dir))):
+            path = os.path.join(output_dir, day_dir, file_name)
+            if file_name.endswith(".npz"):
+                with np.load(path) as data:
+                    houses.append(data["houseName"].astype(object))
+                    timestamps.append(data["timestamp"])
+                    noise_classes.append(data["noiseClass"])
+            elif file_name.endswith(".parquet"):
+                import pyarrow.parquet as pq
+                table = pq.read_table(path)
+                houses.append(np.array(table.column("houseName").to_pylist(), dtype=object))
+                timestamps.append(table.column("timestamp").to_numpy())
+                noise_classes.append(table.column("noiseClass").to_numpy())
+
+    if not timestamps:
+        return np.array([], dtype=object), np.array([], dtype=np.float64), np.array([], dtype=np.int8)
+    houses, timestamps, noise_classes = np.concatenate(houses), np.concatenate(timestamps), np.concatenate(noise_classes)
+    order = np.argsort(timestamps, kind="stable")
+    return houses[order], timestamps[order], noise_classes[order]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default="noise_log_export", help="Output folder, one day=YYYY-MM-DD folder per day")
+    parser.add_argument('--segments', type=int, default=8, help="Scan segments, each scanned by its own thread")
+    parser.add_argument('--format', choices=["npz", "parquet"], default="npz")
+    parser.add_argument('--incremental', action='store_true', help="Only export items newer than the last watermark")
+    parser.add_argument('--lag-minutes', type=float, default=DEFAULT_LAG_MS / 60000,
+                        help="Only export items older than this, late writes of the last minutes are left to the next run")
+    parser.add_argument('--table', default=TABLE_NAME)
+    parser.add_argument('--endpoint-url', default=None, help="e.g. http://localhost:8000 for DynamoDB Local")
+    args = parser.parse_args()
+
+    import boto3
+    dynamodb = boto3.client("dynamodb", endpoint_url=args.endpoint_url)
+
+    result = export_noise_log(dynamodb, args.output, args.segments, args.format, args.incremental, args.table,
+                              lag_ms=args.lag_minutes * 60000)
+    print(f"Exported {result['items']} items into {result['days']} day folder(s) in {result['total_seconds']:.2f} s "
+          f"(scan {result['scan_seconds']:.2f} s), watermark {result['watermark']}")
@@ -0,0 +1,171 @@
+import os
+import gzip
+import json
+import time
+import boto3
+from decimal import Decimal
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+dynamodb = boto3.client("dynamodb")
+s3 = boto3.client("s3")
+TABLE_NAME = "NoiseLog"
+
+# Same layout as archive.py in the get_house* Lambdas
+ARCHIVE_BUCKET = os.environ.get("ARCHIVE_BUCKET")
+ARCHIVE_PREFIX = os.environ.get("ARCHIVE_PREFIX", "noise-log-archive")
+WATERMARK_FILE_NAME = "_watermark.json"
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Whole days are archived once they are this old. Must be well below RAW_RETENTION_DAYS of
+# noise_inference, so that days are archived before DynamoDB deletes their items.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "7"))
+RAW_RETENTION_DAYS = int(os.environ.get("RAW_RETENTION_DAYS", "14"))
+# Bounds the run time when catching up on a backlog; the next run continues from the watermark
+MAX_DAYS_PER_RUN = int(os.environ.get("MAX_DAYS_PER_RUN", "30"))
+
+# Attributes kept in the archive; the event ones only exist on coalesced items
+EVENT_ATTRIBUTES = ["endTime", "windowCount", "peakEnergy"]
+
+executor = ThreadPoolExecutor(max_workers=8)
+
+def day_name(day):
+    return time.strftime('%Y-%m-%d', time.gmtime(day * DAY_MS / 1000))
+
+def read_watermark():
+    """Last archived day (days since the epoch), or None before the first run."""
+    try:
+        response = s3.get_object(Bucket=ARCHIVE_BUCKET, Key=f"{ARCHIVE_PREFIX}/{WATERMARK_FILE_NAME}")
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(response["Body"].read())["archivedThroughDay"]
+
+def write_watermark(day):
+    s3.put_object(
+        Bucket=ARCHIVE_BUCKET,
+        Key=f"{ARCHIVE_PREFIX}/{WATERMARK_FILE_NAME}",
+        Body=json.dumps({"archivedThroughDay": day, "archivedThrough": day_name(day)}).encode(),
+        ContentType="application/json"
+    )
+
+def oldest_day():
+    """Day of the oldest item in the table, or None if it is empty."""
+    response = dynamodb.query(
+        TableName=TABLE_NAME,
+        IndexName="TimestampIndex",
+        KeyConditionExpression="dummy = :dummy",
+        ExpressionAttributeValues={":dummy": {"S": "1"}},
+        Limit=1
+    )
+    items = response.get("Items", [])
+    return int(float(items[0]["timestamp"]["N"]) // DAY_MS) if items else None
+
+def day_items(day):
+    """Every item of one UTC day from TimestampIndex, following LastEvaluatedKey."""
+    end = (day + 1) * DAY_MS
+    kwargs = {
+        "TableName": TABLE_NAME,
+        "IndexName": "TimestampIndex",
+        "KeyConditionExpression": "dummy = :dummy AND #ts BETWEEN :start AND :end",
+        "ExpressionAttributeNames": {"#ts": "timestamp"},
+        "ExpressionAttributeValues": {
+            ":dummy": {"S": "1"},
+            ":start": {"N": str(day * DAY_MS)},
+            ":end": {"N": str(end)}
+        }
+    }
+    items = []
+    while True:
+        response = dynamodb.query(**kwargs)
+        # Coalesced events have fractional keys, so the day ends exactly at the next one, exclusive,
+        # like the readers split their ranges. Compared as Decimal, which keeps every digit of the key
+        items += [item for item in response.get("Items", []) if Decimal(item["timestamp"]["N"]) < end]
+        if "LastEvaluatedKey" not in response:
+            return items
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+def house_archives(day, items):
+    """
+    Group a day's items into one columnar record per house.
+
+    Returns:
+        archives: {house: {"house", "day", "timestamp", "noiseClass", and the event columns when present}}
+    """
+    archives = {}
+    for item in items:
+        house = item["houseName"]["S"]
+        archived = archives.get(house)
+        if archived is None:
+            archived = archives[house] = {"house": house, "day": day_name(day), "timestamp": [], "noiseClass": [],
+                                          **{name: [] for name in EVENT_ATTRIBUTES}}
+        archived["timestamp"].append(float(item["timestamp"]["N"]))
+        archived["noiseClass"].append(int(item["noiseClass"]["N"]))
+        for name in EVENT_ATTRIBUTES:
+            archived[name].append(float(item[name]["N"]) if name in item else None)
+
+    # Drop the event columns of houses without coalesced items
+    for archived in archives.values():
+        for name in EVENT_ATTRIBUTES:
+            if all(value is None for value in archived[name]):
+                del archived[name]
+    return archives
+
+def put_archive(archived):
+    """Write one house's day as a gzip JSON object. Returns its compressed size."""
+    body = gzip.compress(json.dumps(archived, separators=(",", ":")).encode(), compresslevel=9)
+    s3.put_object(
+        Bucket=ARCHIVE_BUCKET,
+        Key=f"{ARCHIVE_PREFIX}/day={archived['day']}/house={quote(archived['house'], safe='')}.json.gz",
+        Body=body,
+        ContentType="application/json",
+        ContentEncoding="gzip"
+    )
+    return len(body)
+
+def lambda_handler(event, context):
+    """
+    Scheduled job (e.g. daily EventBridge rule): archive the whole days older than ARCHIVE_AFTER_DAYS
+    that are not archived yet into per-house daily objects, then move the watermark.
+    The raw items stay in the table until their expiresAt TTL deletes them.
+    """
+
+    try:
+        if not ARCHIVE_BUCKET:
+            return {"statusCode": 400, "body": json.dumps({"error": "ARCHIVE_BUCKET is not set"})}
+
+        start_time = time.perf_counter()
+        today = int(time.time() * 1000 // DAY_MS)
+        last_day = today - ARCHIVE_AFTER_DAYS - 1
+
+        watermark = read_watermark()
+        first_day = watermark + 1 if watermark is not None else oldest_day()
+        if first_day is None or first_day > last_day:
+            return {"statusCode": 200, "body": json.dumps({"message": "Nothing to archive", "archivedThroughDay": watermark})}
+
+        if today - first_day > RAW_RETENTION_DAYS:
+            # Items of these days may already have been deleted by the TTL
+            print(f"Warning: archiving {day_name(first_day)}, which is older than RAW_RETENTION_DAYS")
+
+        days = []
+        for day in range(first_day, min(last_day, first_day + MAX_DAYS_PER_RUN - 1) + 1):
+            items = day_items(day)
+            archives = house_archives(day, items)
+            sizes = list(executor.map(put_archive, archives.values()))
+            # Only once all the day's objects are written, so readers never see a partial day
+            write_watermark(day)
+            days.append({"day": day_name(day), "items": len(items), "houses": len(archives), "bytes": sum(sizes)})
+
+        summary = {
+            "days": days,
+            "archivedThrough": days[-1]["day"],
+            "durationMs": round((time.perf_counter() - start_time) * 1000, 1)
+        }
+        print(json.dumps(summary))
+
+        return {"statusCode": 200, "body": json.dumps(summary)}
+
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)})
+        }
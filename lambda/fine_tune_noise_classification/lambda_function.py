@@ -8,17 +8,31 @@ def lambda_handler(event, context):
     try:
         job_name = f"noise-train-{int(time.time())}"
 
+        # "full" retrains on all data, "incremental" only trains on data added since the last model
+        params = event.get("queryStringParameters", {}) or {}
+        mode = params.get("mode", "full")
+        if mode not in ("full", "incremental"):
+            return {"statusCode": 400, "body": json.dumps({"error": "mode must be 'full' or 'incremental'"})}
+
+        # "File" (default) downloads the channel CSVs before training. "FastFile" streams them from S3 as they are
+        # read, "Pipe" through a FIFO; both are read in chunks by train.py with streaming enabled.
+        input_mode = params.get("inputMode", "File")
+        if input_mode not in ("File", "FastFile", "Pipe"):
+            return {"statusCode": 400, "body": json.dumps({"error": "inputMode must be 'File', 'FastFile' or 'Pipe'"})}
+
         response = sagemaker_client.create_training_job(
             TrainingJobName=job_name,
             AlgorithmSpecification={
                 "TrainingImage": "121021644041.dkr.ecr.ap-southeast-1.amazonaws.com/sagemaker-scikit-learn:1.2-1-cpu-py3",
-                "TrainingInputMode": "File"
+                "TrainingInputMode": input_mode
             },
             RoleArn="arn:aws:iam::<Account ID>:role/service-role/<Sagemaker execution role>",
             HyperParameters={
                 "sagemaker_program": "train.py",
                 "sagemaker_submit_directory": "s3://my-sagemaker-inputs-noise/aws_sagemaker/source/sourcedir.tar.gz",
-                "sagemaker_requirements": "requirements.txt" 
+                "sagemaker_requirements": "requirements.txt",
+                "mode": mode,
+                "streaming": "false" if input_mode == "File" else "true"
             },
             InputDataConfig=[
                 {
@@ -0,0 +1,98 @@
+# Canonical copy: lambda/get_house/archive.py, check with rpi/check_copies.py
+
+import os
+import gzip
+import json
+import time
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+
+# Archive written by lambda/compact_noise_log: one gzip JSON object per house and day, under
+# <ARCHIVE_PREFIX>/day=YYYY-MM-DD/house=<name>.json.gz, and <ARCHIVE_PREFIX>/_watermark.json with the
+# last archived day. Without ARCHIVE_BUCKET everything is read from the table.
+ARCHIVE_BUCKET = os.environ.get("ARCHIVE_BUCKET")
+ARCHIVE_PREFIX = os.environ.get("ARCHIVE_PREFIX", "noise-log-archive")
+WATERMARK_FILE_NAME = "_watermark.json"
+DAY_MS = 24 * 60 * 60 * 1000
+
+# The watermark only moves once a day, so it is re-read at most every few minutes
+WATERMARK_TTL_S = 300
+
+s3 = boto3.client("s3") if ARCHIVE_BUCKET else None
+executor = ThreadPoolExecutor(max_workers=8)
+_watermark = {"expires_at": 0.0, "end_ms": None}
+
+def archive_end_ms():
+    """
+    End (exclusive, ms) of the archived days: records before it are read from the archive, the others
+    from the table. None if there is no archive.
+    """
+    if s3 is None:
+        return None
+    if time.time() < _watermark["expires_at"]:
+        return _watermark["end_ms"]
+
+    try:
+        response = s3.get_object(Bucket=ARCHIVE_BUCKET, Key=f"{ARCHIVE_PREFIX}/{WATERMARK_FILE_NAME}")
+        watermark = json.loads(response["Body"].read())
+        _watermark["end_ms"] = (watermark["archivedThroughDay"] + 1) * DAY_MS
+    except s3.exceptions.NoSuchKey:
+        _watermark["end_ms"] = None
+    _watermark["expires_at"] = time.time() + WATERMARK_TTL_S
+    return _watermark["end_ms"]
+
+def split_range(start_ts, end_ts):
+    """
+    Split an inclusive time range between the archive and the table.
+
+    Returns:
+        archive_range: (start_ts, end_ts, end_exclusive) to read from the archive, or None
+        table_range: (start_ts, end_ts) to read from the table (inclusive), or None
+    """
+    end_ms = archive_end_ms()
+    if end_ms is None or start_ts >= end_ms:
+        return None, (start_ts, end_ts)
+    if end_ts < end_ms:
+        return (start_ts, end_ts, False), None
+    # Keys can be fractional (float ms from the bridges, coalesced events), so the archive part
+    # ends exactly at the first table day, exclusive, rather than at some key just before it
+    return (start_ts, end_ms, True), (end_ms, end_ts)
+
+def _day_keys(day):
+    """Keys of the house objects of one archived day."""
+    prefix = f"{ARCHIVE_PREFIX}/day={time.strftime('%Y-%m-%d', time.gmtime(day * DAY_MS / 1000))}/"
+    keys = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=ARCHIVE_BUCKET, Prefix=prefix):
+        keys += [obj["Key"] for obj in page.get("Contents", [])]
+    return keys
+
+def _read_object(key):
+    response = s3.get_object(Bucket=ARCHIVE_BUCKET, Key=key)
+    return json.loads(gzip.decompress(response["Body"].read()))
+
+def read_archive(start_ts, end_ts, end_exclusive=False, noise_class=None):
+    """
+    Archived records between start_ts and end_ts (inclusive, or exclusive with end_exclusive),
+    optionally of one noise class.
+
+    Returns:
+        houses: List of house names
+        timestamps: List of timestamps, sorted
+        noise_classes: List of noise classes
+    """
+    last_day = int(end_ts // DAY_MS)
+    if end_exclusive and end_ts % DAY_MS == 0:
+        last_day -= 1
+    days = range(int(start_ts // DAY_MS), last_day + 1)
+    keys = [key for day_keys in executor.map(_day_keys, days) for key in day_keys]
+
+    rows = []
+    for archived in executor.map(_read_object, keys):
+        house = archived["house"]
+        for timestamp, archived_class in zip(archived["timestamp"], archived["noiseClass"]):
+            before_end = timestamp < end_ts if end_exclusive else timestamp <= end_ts
+            if start_ts <= timestamp and before_end and (noise_class is None or archived_class == noise_class):
+                rows.append((timestamp, house, archived_class))
+    rows.sort()
+
+    return [row[1] for row in rows], [row[0] for row in rows], [row[2] for row in rows]
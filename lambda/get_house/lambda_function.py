@@ -1,10 +1,58 @@
 import json
 import boto3
+import numpy as np
 from boto3.dynamodb.conditions import Key
 
+from range_cache import RangeCache
+from archive import split_range, read_archive
+
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table("NoiseLog")
 
+def query_noise_class(noise_class, start_ts, end_ts):
+    """
+    Records of one noise class between start_ts and end_ts from NoiseClassIndex, following LastEvaluatedKey.
+
+    Returns:
+        houses: List of house names
+        timestamps: List of timestamps, sorted
+        noise_classes: List of noise classes
+    """
+    kwargs = {
+        "IndexName": "NoiseClassIndex",
+        "KeyConditionExpression": Key("noiseClass").eq(noise_class) &
+                                  Key("timestamp").between(start_ts, end_ts),
+        "ProjectionExpression": "houseName, #ts",
+        "ExpressionAttributeNames": {"#ts": "timestamp"}
+    }
+    houses = []
+    timestamps = []
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get("Items", []):
+            houses.append(item["houseName"])
+            timestamps.append(float(item["timestamp"]))
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return houses, timestamps, [noise_class] * len(timestamps)
+
+def fetch_noise_class(noise_class, start_ts, end_ts):
+    """Records of one noise class in the range, from the archive for archived days and the table for the others."""
+    archive_range, table_range = split_range(start_ts, end_ts)
+    houses, timestamps, noise_classes = [], [], []
+    # The archived days all come before the table ones, so the result stays sorted
+    if archive_range is not None:
+        for column, values in zip((houses, timestamps, noise_classes), read_archive(*archive_range, noise_class=noise_class)):
+            column += values
+    if table_range is not None:
+        for column, values in zip((houses, timestamps, noise_classes), query_noise_class(noise_class, *table_range)):
+            column += values
+    return houses, timestamps, noise_classes
+
+# Kept while the Lambda is warm, keyed by noise class
+cache = RangeCache(fetch_noise_class)
+
 def lambda_handler(event, context):
     """
     HTTP GET function to return list of houses that match:
@@ -34,33 +82,14 @@ def lambda_handler(event, context):
         start_ts = int(start_ts)
         end_ts = int(end_ts)
 
-        response = table.query(
-            IndexName="NoiseClassIndex",
-            KeyConditionExpression=Key("noiseClass").eq(noise_class) &
-                                   Key("timestamp").between(start_ts, end_ts)
-        )
-
-        items = response.get("Items", [])
-
-        # Extract the list of houses with corresponding "timestamp" attribute
-        house_list = [
-            {
-                "house": item["houseName"],
-                "timestamp": int(item["timestamp"])
-            }
-            for item in items
-        ]
-
-        # Group houses by houseName
-        house_dict = {}
-        for item in house_list:
-            house = item["house"]
-            timestamp = item["timestamp"]
-
-            if house not in house_dict:
-                house_dict[house] = []
-
-            house_dict[house].append(timestamp)
+        # Records of the range grouped by house, from the cached buckets and DynamoDB for the missing ones
+        houses, cache_stats = cache.query(noise_class, start_ts, end_ts)
+        cache.log(cache_stats)
+
+        house_dict = {
+            house: timestamps.astype(np.int64).tolist()
+            for house, (timestamps, _) in houses.items()
+        }
         
         return {
             "statusCode": 200,
@@ -68,7 +97,7 @@ def lambda_handler(event, context):
                 "noiseClass": noise_class,
                 "startTimestamp": start_ts,
                 "endTimestamp": end_ts,
-                "timestampByHouse": house_list
+                "timestampByHouse": house_dict
             })
         }
 
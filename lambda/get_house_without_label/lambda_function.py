@@ -1,11 +1,128 @@
+import os
 import json
+import gzip
+import base64
 import boto3
+import numpy as np
 from boto3.dynamodb.conditions import Key
-from decimal import Decimal
+
+from range_cache import RangeCache
+from archive import split_range, read_archive
 
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table("NoiseLog")
 
+ALL_CLASSES = "all"
+
+# Response formats: "records" (default) repeats house, timestamp and noiseClass for every record,
+# "columnar" gives each house parallel timestamps and noiseClasses arrays
+RESPONSE_FORMATS = ("records", "columnar")
+
+# When set, responses of at least this many bytes are gzipped for clients sending Accept-Encoding: gzip.
+# The body is then base64 encoded, which a REST API only passes through as binary with */* in its
+# binary media types (HTTP APIs decode it as is).
+GZIP_MIN_BYTES = os.environ.get("GZIP_MIN_BYTES")
+if GZIP_MIN_BYTES is not None:
+    GZIP_MIN_BYTES = int(GZIP_MIN_BYTES)
+
+def query_all_classes(key, start_ts, end_ts):
+    """
+    Records of every noise class between start_ts and end_ts from TimestampIndex, following LastEvaluatedKey.
+
+    Returns:
+        houses: List of house names
+        timestamps: List of timestamps, sorted
+        noise_classes: List of noise classes
+    """
+    # 1 is a dummy value for the partition key
+    kwargs = {
+        "IndexName": "TimestampIndex",
+        "KeyConditionExpression": Key("dummy").eq("1") & Key("timestamp").between(start_ts, end_ts),
+        "ProjectionExpression": "houseName, #ts, noiseClass",
+        "ExpressionAttributeNames": {"#ts": "timestamp"}
+    }
+    houses = []
+    timestamps = []
+    noise_classes = []
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get("Items", []):
+            houses.append(item["houseName"])
+            timestamps.append(float(item["timestamp"]))
+            noise_classes.append(int(item["noiseClass"]))
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return houses, timestamps, noise_classes
+
+def fetch_all_classes(key, start_ts, end_ts):
+    """Records of every noise class in the range, from the archive for archived days and the table for the others."""
+    archive_range, table_range = split_range(start_ts, end_ts)
+    houses, timestamps, noise_classes = [], [], []
+    # The archived days all come before the table ones, so the result stays sorted
+    if archive_range is not None:
+        for column, values in zip((houses, timestamps, noise_classes), read_archive(*archive_range)):
+            column += values
+    if table_range is not None:
+        for column, values in zip((houses, timestamps, noise_classes), query_all_classes(key, *table_range)):
+            column += values
+    return houses, timestamps, noise_classes
+
+# Kept while the Lambda is warm, all classes under one key
+cache = RangeCache(fetch_all_classes)
+
+def encode_houses(houses, response_format):
+    """
+    Build the houses of the response from the cached arrays. Timestamps and classes are converted to
+    Python ints with one tolist() per house, so json.dumps never needs a per-value callback.
+
+    Returns:
+        house_dict: {house: [{house, timestamp, noiseClass}]} for "records",
+                    {house: {timestamps, noiseClasses}} for "columnar"
+    """
+    if response_format == "columnar":
+        return {
+            house: {"timestamps": timestamps.astype(np.int64).tolist(), "noiseClasses": noise_classes.tolist()}
+            for house, (timestamps, noise_classes) in houses.items()
+        }
+    return {
+        house: [
+            {"house": house, "timestamp": timestamp, "noiseClass": noise_class}
+            for timestamp, noise_class in zip(timestamps.astype(np.int64).tolist(), noise_classes.tolist())
+        ]
+        for house, (timestamps, noise_classes) in houses.items()
+    }
+
+def accepts_gzip(event):
+    """Whether the request's Accept-Encoding includes gzip (header names are case-insensitive)."""
+    headers = event.get("headers") or {}
+    for name, value in headers.items():
+        if name.lower() == "accept-encoding" and value and "gzip" in value.lower():
+            return True
+    return False
+
+def http_response(body, event, compact):
+    """
+    200 response with the JSON body, gzipped when enabled, large enough and accepted by the client.
+
+    Args:
+        compact: Encode without spaces after separators
+    """
+    if compact:
+        text = json.dumps(body, separators=(",", ":"))
+    else:
+        text = json.dumps(body)
+
+    if GZIP_MIN_BYTES is not None and len(text) >= GZIP_MIN_BYTES and accepts_gzip(event):
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json", "Content-Encoding": "gzip"},
+            "isBase64Encoded": True,
+            # Level 5 is about as small as 9 on these number arrays, at a fraction of the time
+            "body": base64.b64encode(gzip.compress(text.encode(), compresslevel=5)).decode()
+        }
+    return {"statusCode": 200, "body": text}
+
 def lambda_handler(event, context):
     """
     HTTP GET function to return list of houses that have any noiseClass,
@@ -19,55 +136,33 @@ def lambda_handler(event, context):
 
         start_ts = params.get("startTimestamp")
         end_ts = params.get("endTimestamp")
+        response_format = params.get("format", "records")
 
         # Validate inputs
         if start_ts is None:
             return {"statusCode": 400, "body": json.dumps({"error": "startTimestamp is required"})}
         if end_ts is None:
             return {"statusCode": 400, "body": json.dumps({"error": "endTimestamp is required"})}
+        if response_format not in RESPONSE_FORMATS:
+            return {"statusCode": 400, "body": json.dumps({"error": f"format must be one of {', '.join(RESPONSE_FORMATS)}"})}
 
         start_ts = int(start_ts)
         end_ts = int(end_ts)
 
-        # Query TimestampIndex GSI
-        # 1 is a dummy value for the partition key
-        response = table.query(
-            IndexName="TimestampIndex",
-            KeyConditionExpression=Key("dummy").eq("1") & Key("timestamp").between(start_ts, end_ts)
-        )
-
-        items = response.get("Items", [])
-
-        # Convert Decimal to int/float for JSON
-        def decimal_default(obj):
-            if isinstance(obj, Decimal):
-                if obj % 1 == 0:
-                    return int(obj)
-                return float(obj)
-            raise TypeError
-
-        # Group items by houseName using a normal dict
-        house_dict = {}
-        for item in items:
-            house = item["houseName"]
-            record = {
-                "house": house,
-                "timestamp": int(item["timestamp"]),
-                "noiseClass": int(item["noiseClass"])
-            }
-            if house in house_dict:
-                house_dict[house].append(record)
-            else:
-                house_dict[house] = [record]
+        # Records of the range grouped by house, from the cached buckets and TimestampIndex for the missing ones
+        houses, cache_stats = cache.query(ALL_CLASSES, start_ts, end_ts)
+        cache.log(cache_stats)
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps({
-                "startTimestamp": start_ts,
-                "endTimestamp": end_ts,
-                "houses": house_dict
-            }, default=decimal_default)
+        body = {
+            "startTimestamp": start_ts,
+            "endTimestamp": end_ts,
+            "houses": encode_houses(houses, response_format)
         }
+        if response_format == "columnar":
+            body["format"] = "columnar"
+
+        # The records format keeps its original encoding, the columnar one is compact
+        return http_response(body, event, compact=response_format == "columnar")
 
     except Exception as e:
         return {
@@ -0,0 +1,181 @@
+# Canonical copy: lambda/get_house/range_cache.py, check with rpi/check_copies.py
+
+import os
+import time
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+# Records are cached in fixed time buckets, so overlapping ranges share buckets
+BUCKET_MS = int(os.environ.get("CACHE_BUCKET_MS", str(60 * 60 * 1000)))
+MAX_CACHE_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Buckets that can still receive writes (the current one, and late uploads just after it) expire quickly
+OPEN_BUCKET_TTL_S = float(os.environ.get("CACHE_OPEN_TTL_S", "30"))
+CLOSED_BUCKET_TTL_S = float(os.environ.get("CACHE_CLOSED_TTL_S", "600"))
+OPEN_MARGIN_MS = 5 * 60 * 1000
+# Longer ranges go straight to DynamoDB without being cached
+MAX_BUCKETS_PER_QUERY = 2000
+
+# Approximate memory of a cached house entry besides its arrays
+HOUSE_OVERHEAD_BYTES = 200
+
+class RangeCache:
+    """
+    Time-range query cache kept while the Lambda is warm.
+
+    Records of each key (a noise class, or all classes) are kept per time bucket as sorted NumPy
+    arrays per house. A query reads the cached buckets it overlaps, slicing the first and last
+    ones with searchsorted, and fetches only the runs of missing or expired buckets, whole, so
+    they can be cached. Buckets are evicted least recently used first above max_bytes.
+    """
+
+    def __init__(self, fetch, bucket_ms=BUCKET_MS, max_bytes=MAX_CACHE_BYTES,
+                 open_ttl_s=OPEN_BUCKET_TTL_S, closed_ttl_s=CLOSED_BUCKET_TTL_S):
+        """
+        Args:
+            fetch: fetch(key, start_ts, end_ts) returning (houses, timestamps, noise_classes) of the
+                   records in the range, sorted by timestamp: a list of house names and two arrays
+        """
+        self.fetch = fetch
+        self.bucket_ms = bucket_ms
+        self.max_bytes = max_bytes
+        self.open_ttl_s = open_ttl_s
+        self.closed_ttl_s = closed_ttl_s
+
+        # (key, bucket) -> (expires_at, nbytes, {house: (timestamps, noise_classes)})
+        self._buckets = OrderedDict()
+        self.nbytes = 0
+        self.stats = {"queries": 0, "hits": 0, "misses": 0, "expired": 0, "fetches": 0, "evictions": 0, "bypassed": 0}
+
+    def query(self, key, start_ts, end_ts):
+        """
+        Records of key between start_ts and end_ts (inclusive), grouped by house.
+
+        Returns:
+            houses: {house: (timestamps, noise_classes)}, each sorted by timestamp
+            stats: This query's bucket hits, misses, expired buckets and fetches
+        """
+        stats = {"hits": 0, "misses": 0, "expired": 0, "fetches": 0}
+        self.stats["queries"] += 1
+        first_bucket = int(start_ts // self.bucket_ms)
+        last_bucket = int(end_ts // self.bucket_ms)
+
+        if last_bucket - first_bucket + 1 > MAX_BUCKETS_PER_QUERY:
+            self.stats["bypassed"] += 1
+            stats["fetches"] = 1
+            return _group_by_house(*self.fetch(key, start_ts, end_ts)), stats
+
+        # Cached buckets, and runs of consecutive buckets to fetch
+        now = time.time()
+        entries = {}
+        missing_runs = []
+        for bucket in range(first_bucket, last_bucket + 1):
+            cached = self._buckets.get((key, bucket))
+            if cached is not None and cached[0] > now:
+                self._buckets.move_to_end((key, bucket))
+                entries[bucket] = cached[2]
+                stats["hits"] += 1
+                continue
+
+            stats["expired" if cached is not None else "misses"] += 1
+            if missing_runs and missing_runs[-1][1] == bucket - 1:
+                missing_runs[-1][1] = bucket
+            else:
+                missing_runs.append([bucket, bucket])
+
+        for run_first, run_last in missing_runs:
+            entries.update(self._fetch_buckets(key, run_first, run_last, now))
+            stats["fetches"] += 1
+
+        # Slice the edge buckets, take the inner ones whole
+        parts = {}
+        for bucket in range(first_bucket, last_bucket + 1):
+            edge = bucket in (first_bucket, last_bucket)
+            for house, (timestamps, noise_classes) in entries[bucket].items():
+                if edge:
+                    lo = np.searchsorted(timestamps, start_ts, side="left")
+                    hi = np.searchsorted(timestamps, end_ts, side="right")
+                    if lo == hi:
+                        continue
+                    timestamps, noise_classes = timestamps[lo:hi], noise_classes[lo:hi]
+                parts.setdefault(house, []).append((timestamps, noise_classes))
+
+        for name in stats:
+            self.stats[name] += stats[name]
+
+        houses = {
+            house: (np.concatenate([p[0] for p in house_parts]), np.concatenate([p[1] for p in house_parts]))
+            for house, house_parts in parts.items()
+        }
+        return houses, stats
+
+    def _fetch_buckets(self, key, run_first, run_last, now):
+        """Fetch whole buckets run_first..run_last and cache each of them, empty ones included."""
+        # Keys are fractional ms (float timestamps from the bridges, coalesced events), so the run is fetched up
+        # to the start of the next bucket (the fetch is inclusive) and the rows at that start are dropped
+        run_start = run_first * self.bucket_ms
+        run_end = (run_last + 1) * self.bucket_ms
+        house_names, timestamps, noise_classes = self.fetch(key, run_start, run_end)
+
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        n_rows = np.searchsorted(timestamps, run_end, side="left")
+        timestamps = timestamps[:n_rows]
+        noise_classes = np.asarray(noise_classes, dtype=np.int8)[:n_rows]
+        house_names = np.asarray(house_names, dtype=object)[:n_rows]
+
+        # Rows are sorted by timestamp, so each bucket is a contiguous slice
+        bucket_ids = np.arange(run_first, run_last + 1)
+        bounds = np.searchsorted(timestamps, bucket_ids * self.bucket_ms, side="left")
+        bounds = np.append(bounds, len(timestamps))
+
+        # Buckets ending within OPEN_MARGIN_MS of now can still receive writes
+        open_from = (now * 1000 - OPEN_MARGIN_MS) // self.bucket_ms
+
+        entries = {}
+        for i, bucket in enumerate(bucket_ids):
+            lo, hi = bounds[i], bounds[i + 1]
+            entry = _group_by_house(house_names[lo:hi], timestamps[lo:hi], noise_classes[lo:hi])
+            ttl = self.open_ttl_s if bucket >= open_from else self.closed_ttl_s
+            self._store((key, int(bucket)), now + ttl, entry)
+            entries[int(bucket)] = entry
+        return entries
+
+    def _store(self, cache_key, expires_at, entry):
+        nbytes = sum(t.nbytes + c.nbytes + HOUSE_OVERHEAD_BYTES for t, c in entry.values()) + HOUSE_OVERHEAD_BYTES
+        previous = self._buckets.pop(cache_key, None)
+        if previous is not None:
+            self.nbytes -= previous[1]
+        self._buckets[cache_key] = (expires_at, nbytes, entry)
+        self.nbytes += nbytes
+
+        while self.nbytes > self.max_bytes and len(self._buckets) > 1:
+            _, (_, evicted_bytes, _) = self._buckets.popitem(last=False)
+            self.nbytes -= evicted_bytes
+            self.stats["evictions"] += 1
+
+    def log(self, query_stats):
+        """Print one JSON line with this query's bucket stats and the hit rate since the cold start."""
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["expired"]
+        print(json.dumps({
+            "cache": query_stats,
+            "cacheHitRate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+            "cacheTotals": self.stats,
+            "cacheBuckets": len(self._buckets),
+            "cacheBytes": self.nbytes
+        }))
+
+def _group_by_house(house_names, timestamps, noise_classes):
+    """Split rows sorted by timestamp into {house: (timestamps, noise_classes)}, keeping the order."""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    noise_classes = np.asarray(noise_classes, dtype=np.int8)
+    if len(timestamps) == 0:
+        return {}
+
+    names, codes = np.unique(np.asarray(house_names, dtype=object), return_inverse=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    return {
+        str(name): (timestamps[order[bounds[i]:bounds[i + 1]]], noise_classes[order[bounds[i]:bounds[i + 1]]])
+        for i, name in enumerate(names)
+    }
@@ -0,0 +1,230 @@
+import json
+import time
+import boto3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from archive import split_range, read_archive
+
+# The low-level client is thread safe (boto3 resources are not), so one client serves all the reads
+dynamodb = boto3.client("dynamodb")
+TABLE_NAME = "NoiseLog"
+
+BACKGROUND_CLASS = 0
+
+# Reused while the Lambda is warm. The per-house counts are the widest fan-out.
+executor = ThreadPoolExecutor(max_workers=8)
+
+def query_pages(**kwargs):
+    """
+    Run a DynamoDB Query and follow LastEvaluatedKey until the last page.
+
+    Returns:
+        items: Items of all pages (empty with Select=COUNT)
+        count: Sum of the Count of all pages
+    """
+    items = []
+    count = 0
+    while True:
+        response = dynamodb.query(**kwargs)
+        items += response.get("Items", [])
+        count += response.get("Count", 0)
+        if "LastEvaluatedKey" not in response:
+            return items, count
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+def class_records(noise_class, start_ts, end_ts):
+    """House and timestamp of the records of one noise class in the range, from NoiseClassIndex."""
+    items, _ = query_pages(
+        TableName=TABLE_NAME,
+        IndexName="NoiseClassIndex",
+        KeyConditionExpression="noiseClass = :class AND #ts BETWEEN :start AND :end",
+        ExpressionAttributeNames={"#ts": "timestamp"},
+        ExpressionAttributeValues={
+            ":class": {"N": str(noise_class)},
+            ":start": {"N": str(start_ts)},
+            ":end": {"N": str(end_ts)}
+        },
+        ProjectionExpression="houseName, #ts"
+    )
+    return items
+
+def all_records(start_ts, end_ts):
+    """House, timestamp and noise class of every record in the range, from TimestampIndex."""
+    items, _ = query_pages(
+        TableName=TABLE_NAME,
+        IndexName="TimestampIndex",
+        KeyConditionExpression="dummy = :dummy AND #ts BETWEEN :start AND :end",
+        ExpressionAttributeNames={"#ts": "timestamp"},
+        ExpressionAttributeValues={
+            ":dummy": {"S": "1"},
+            ":start": {"N": str(start_ts)},
+            ":end": {"N": str(end_ts)}
+        },
+        ProjectionExpression="houseName, #ts, noiseClass"
+    )
+    return items
+
+def count_all_records(start_ts, end_ts):
+    """Number of records of all houses and classes in the range, counted by DynamoDB."""
+    _, count = query_pages(
+        TableName=TABLE_NAME,
+        IndexName="TimestampIndex",
+        KeyConditionExpression="dummy = :dummy AND #ts BETWEEN :start AND :end",
+        ExpressionAttributeNames={"#ts": "timestamp"},
+        ExpressionAttributeValues={
+            ":dummy": {"S": "1"},
+            ":start": {"N": str(start_ts)},
+            ":end": {"N": str(end_ts)}
+        },
+        Select="COUNT"
+    )
+    return count
+
+def count_house_records(house, start_ts, end_ts):
+    """Number of records of one house (all classes) in the range, counted by DynamoDB on the table's own key."""
+    _, count = query_pages(
+        TableName=TABLE_NAME,
+        KeyConditionExpression="houseName = :house AND #ts BETWEEN :start AND :end",
+        ExpressionAttributeNames={"#ts": "timestamp"},
+        ExpressionAttributeValues={
+            ":house": {"S": house},
+            ":start": {"N": str(start_ts)},
+            ":end": {"N": str(end_ts)}
+        },
+        Select="COUNT"
+    )
+    return count
+
+def archived_records(archive_range):
+    """(house, timestamp, noise class) of every archived record in the range, sorted by timestamp."""
+    if archive_range is None:
+        return []
+    return list(zip(*read_archive(*archive_range)))
+
+def table_rows(items, noise_class=None):
+    """(house, timestamp, noise class) of DynamoDB items, noise_class for items read without their class."""
+    return [
+        (item["houseName"]["S"], float(item["timestamp"]["N"]),
+         int(item["noiseClass"]["N"]) if "noiseClass" in item else noise_class)
+        for item in items
+    ]
+
+def group_by_house(rows, with_class=False):
+    """
+    Group (house, timestamp, noise class) rows into {house: {"timestamps": [...], "noiseClasses": [...]}}.
+
+    Background records are left out of the matches (the UI hides them).
+    """
+    houses = {}
+    for house, timestamp, noise_class in rows:
+        if with_class and noise_class == BACKGROUND_CLASS:
+            continue
+
+        record = houses.get(house)
+        if record is None:
+            record = houses[house] = {"timestamps": []}
+            if with_class:
+                record["noiseClasses"] = []
+        # Coalesced events have fractional millisecond keys
+        record["timestamps"].append(int(timestamp))
+        if with_class:
+            record["noiseClasses"].append(noise_class)
+    return houses
+
+def lambda_handler(event, context):
+    """
+    HTTP GET function to match a complaint with the recorded noise, in one call:
+        - records of noiseClass (or of any non-background class) between startTimestamp and endTimestamp
+        - total records per matched house and over all houses, for the confidence score
+    """
+
+    try:
+        start_time = time.perf_counter()
+
+        # Read query-string parameters from API Gateway
+        params = event.get("queryStringParameters", {}) or {}
+
+        noise_class = params.get("noiseClass")
+        start_ts = params.get("startTimestamp")
+        end_ts = params.get("endTimestamp")
+
+        # Validate inputs
+        if start_ts is None:
+            return {"statusCode": 400, "body": json.dumps({"error": "startTimestamp is required"})}
+        if end_ts is None:
+            return {"statusCode": 400, "body": json.dumps({"error": "endTimestamp is required"})}
+
+        start_ts = int(start_ts)
+        end_ts = int(end_ts)
+        noise_class = int(noise_class) if noise_class not in (None, "") else None
+
+        # Days archived by compact_noise_log are read from S3, the others from the table. An archived
+        # day is read whole (every class), so it gives its matches and its totals at once.
+        archive_range, table_range = split_range(start_ts, end_ts)
+        archive_future = executor.submit(archived_records, archive_range)
+
+        if noise_class is None:
+            # Every record is needed anyway, so the totals are counted from the same read
+            items = all_records(*table_range) if table_range is not None else []
+            # The archived days all come before the table ones, so the rows stay sorted
+            rows = archive_future.result() + table_rows(items)
+            houses = group_by_house(rows, with_class=True)
+            house_totals = Counter(house for house, _, _ in rows)
+            total_records = len(rows)
+            for house, record in houses.items():
+                record["total"] = house_totals[house]
+            reads = 1 if table_range is not None else 0
+        else:
+            if table_range is not None:
+                # The matches and the overall count are independent reads
+                matches_future = executor.submit(class_records, noise_class, *table_range)
+                total_future = executor.submit(count_all_records, *table_range)
+
+            archived = archive_future.result()
+            house_totals = Counter(house for house, _, _ in archived)
+            rows = [row for row in archived if row[2] == noise_class]
+            if table_range is not None:
+                rows += table_rows(matches_future.result(), noise_class)
+
+            houses = group_by_house(rows)
+            # Only the matched houses need their own total
+            house_names = list(houses)
+            if table_range is not None:
+                for house, total in zip(house_names, executor.map(
+                        lambda house: count_house_records(house, *table_range), house_names)):
+                    house_totals[house] += total
+            for house in house_names:
+                houses[house]["total"] = house_totals[house]
+            total_records = len(archived)
+            reads = 0
+            if table_range is not None:
+                total_records += total_future.result()
+                reads = 2 + len(house_names)
+
+        print(json.dumps({
+            "noiseClass": noise_class,
+            "houses": len(houses),
+            "matches": sum(len(record["timestamps"]) for record in houses.values()),
+            "totalRecords": total_records,
+            "reads": reads,
+            "archived": archive_range is not None,
+            "durationMs": round((time.perf_counter() - start_time) * 1000, 1)
+        }))
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "noiseClass": noise_class,
+                "startTimestamp": start_ts,
+                "endTimestamp": end_ts,
+                "totalRecords": total_records,
+                "houses": houses
+            }, separators=(",", ":"))
+        }
+
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)})
+        }
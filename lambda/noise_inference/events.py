@@ -0,0 +1,205 @@
+import numpy as np
+
+# Open event of each house, kept while the execution environment is warm so that most
+# invocations do not need to read the table. Other environments may write events for the
+# same house, so this is best effort: a stale entry only means an event is not merged.
+_open_events = {}
+
+def coalesce_frames(frame_classes, frame_starts, frame_ends, frame_energies):
+    """
+    Merge runs of consecutive frames with the same class into events.
+
+    Args:
+        frame_classes: Array of the predicted class of each frame
+        frame_starts: Array of the timestamp of the first data point of each frame
+        frame_ends: Array of the timestamp of the last data point of each frame
+        frame_energies: Array of the total magnitude of each frame
+
+    Returns:
+        events: List of {'start', 'end', 'noiseClass', 'count', 'peakEnergy'} dictionaries, in time order
+    """
+    frame_classes = np.asarray(frame_classes)
+    if len(frame_classes) == 0:
+        return []
+
+    # Index of the first frame of each run
+    run_starts = np.flatnonzero(np.concatenate([[True], frame_classes[1:] != frame_classes[:-1]]))
+    run_ends = np.concatenate([run_starts[1:], [len(frame_classes)]])
+
+    return [
+        {
+            'start': float(frame_starts[first]),
+            'end': float(frame_ends[last - 1]),
+            'noiseClass': int(frame_classes[first]),
+            'count': int(last - first),
+            'peakEnergy': float(np.max(frame_energies[first:last]))
+        }
+        for first, last in zip(run_starts, run_ends)
+    ]
+
+def _item_to_event(item):
+    """Convert a NoiseLog item to an event. Items written without coalescing are events of one window."""
+    start = float(item['timestamp']['N'])
+    return {
+        'key': item['timestamp']['N'],
+        'start': start,
+        'end': float(item['endTime']['N']) if 'endTime' in item else start,
+        'noiseClass': int(item['noiseClass']['N']),
+        'count': int(item['windowCount']['N']) if 'windowCount' in item else 1,
+        'peakEnergy': float(item['peakEnergy']['N']) if 'peakEnergy' in item else 0.0
+    }
+
+def last_event(dynamodb, table_name, house_id):
+    """
+    Most recent event of a house, from the warm cache or else the latest NoiseLog item.
+
+    Returns:
+        event: Event dictionary with the 'key' of its item, or None if the house has no items
+    """
+    if house_id in _open_events:
+        return _open_events[house_id]
+
+    response = dynamodb.query(
+        TableName=table_name,
+        KeyConditionExpression="houseName = :house",
+        ExpressionAttributeValues={":house": {"S": house_id}},
+        ScanIndexForward=False,
+        Limit=1
+    )
+    items = response.get("Items", [])
+    return _item_to_event(items[0]) if items else None
+
+def _is_conditional_check_failure(error):
+    """True for the ConditionalCheckFailedException of a boto3 client (a ClientError with that code)."""
+    return getattr(error, "response", {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+def _expires_at(event, retention_s):
+    """TTL of an event's item (epoch seconds): retention_s after the event ends."""
+    return int(event['end'] / 1000 + retention_s)
+
+def _extend_item(dynamodb, table_name, house_id, event, stored, retention_s=None):
+    """
+    Add the windows merged into an event that already has an item, and raise its end time and peak energy
+    (and its expiresAt, so that a long event is not deleted while its tail is recent).
+
+    The window count is incremented, never set, and the end time and peak energy are only written
+    when higher than the item's (conditional writes). So another execution environment extending
+    the same event with a stale cache cannot lower what it stored, and neither can a retried window.
+
+    Args:
+        event: The event after merging
+        stored: The event as it was before merging (the cached or queried item)
+        retention_s: When set, expiresAt is raised to this many seconds after the new end time
+    """
+    key = {"houseName": {"S": house_id}, "timestamp": {"N": event['key']}}
+    increment = {":n": {"N": str(event['count'] - stored['count'])}, ":one": {"N": "1"}}
+    # Items written without coalescing have no windowCount and are one window
+    count_expression = "windowCount = if_not_exists(windowCount, :one) + :n"
+    raised = [(name, {"N": str(event[field])}) for name, field in (("endTime", "end"), ("peakEnergy", "peakEnergy"))
+              if event[field] > stored[field]]
+    if retention_s is not None and _expires_at(event, retention_s) > _expires_at(stored, retention_s):
+        raised.append(("expiresAt", {"N": str(_expires_at(event, retention_s))}))
+
+    if raised:
+        try:
+            dynamodb.update_item(
+                TableName=table_name,
+                Key=key,
+                UpdateExpression="SET " + ", ".join([count_expression] + [f"{name} = :{name}" for name, _ in raised]),
+                ConditionExpression=" AND ".join(f"(attribute_not_exists({name}) OR {name} < :{name})" for name, _ in raised),
+                ExpressionAttributeValues=dict(increment, **{f":{name}": value for name, value in raised})
+            )
+            return
+        except Exception as e:
+            if not _is_conditional_check_failure(e):
+                raise
+        # Another writer already raised one of them: raise each on its own, if still lower
+        for name, value in raised:
+            try:
+                dynamodb.update_item(
+                    TableName=table_name,
+                    Key=key,
+                    UpdateExpression=f"SET {name} = :{name}",
+                    ConditionExpression=f"attribute_not_exists({name}) OR {name} < :{name}",
+                    ExpressionAttributeValues={f":{name}": value}
+                )
+            except Exception as e:
+                if not _is_conditional_check_failure(e):
+                    raise
+
+    dynamodb.update_item(
+        TableName=table_name,
+        Key=key,
+        UpdateExpression="SET " + count_expression,
+        ExpressionAttributeValues=increment
+    )
+
+def write_events(dynamodb, table_name, house_id, events, max_gap_ms, retention_s=None):
+    """
+    Write events to NoiseLog, extending the house's last event instead of adding an item when possible.
+
+    An event is merged into the previous one when it has the same class and starts at most
+    max_gap_ms after the previous one ends. Merged events increment the window count of the
+    existing item and raise its end time and peak energy; other events are new items keyed by
+    their start time.
+
+    The cached last event is only replaced once every write succeeded, and dropped when one
+    fails, so a window retried after a failed write is not merged twice into the cache.
+
+    Args:
+        retention_s: When set, items expire (expiresAt TTL attribute) this many seconds after their event ends
+
+    Returns:
+        n_put: Number of new items
+        n_updated: Number of existing items updated
+    """
+    stored = last_event(dynamodb, table_name, house_id)
+    # Merged into a copy, the cache keeps the last written state until the writes succeed
+    previous = dict(stored) if stored is not None else None
+    previous_stored = previous is not None
+
+    # Events to write: (event, whether it already has an item)
+    pending = []
+    for event in events:
+        if (previous is not None and event['noiseClass'] == previous['noiseClass']
+                and event['start'] - previous['end'] <= max_gap_ms):
+            previous['end'] = max(previous['end'], event['end'])
+            previous['count'] += event['count']
+            previous['peakEnergy'] = max(previous['peakEnergy'], event['peakEnergy'])
+            if not pending or pending[-1][0] is not previous:
+                pending.append((previous, previous_stored))
+            continue
+
+        event = dict(event, key=str(event['start']))
+        pending.append((event, False))
+        previous, previous_stored = event, False
+
+    n_put = n_updated = 0
+    try:
+        for event, already_stored in pending:
+            if already_stored:
+                _extend_item(dynamodb, table_name, house_id, event, stored, retention_s)
+                n_updated += 1
+            else:
+                item = {
+                    "houseName": {"S": house_id},
+                    "timestamp": {"N": event['key']},
+                    "noiseClass": {"N": str(event['noiseClass'])},
+                    "dummy": {"S": "1"},
+                    "endTime": {"N": str(event['end'])},
+                    "windowCount": {"N": str(event['count'])},
+                    "peakEnergy": {"N": str(event['peakEnergy'])}
+                }
+                if retention_s is not None:
+                    item["expiresAt"] = {"N": str(_expires_at(event, retention_s))}
+                dynamodb.put_item(TableName=table_name, Item=item)
+                n_put += 1
+    except Exception:
+        # Some writes may have succeeded: the next invocation reads the item back from the table
+        _open_events.pop(house_id, None)
+        raise
+
+    if previous is not None:
+        _open_events[house_id] = previous
+
+    return n_put, n_updated
@@ -0,0 +1,175 @@
+###########################################################################
+# Ingest queue of the bridges: windows are enqueued instead of posted to  #
+# the inference endpoint, and classified in batches by a consumer         #
+# (noise_inference sqs_handler, or queue_consumer.py with a FileQueue)    #
+# Canonical copy: rpi/ingest_queue.py, check with rpi/check_copies.py     #
+###########################################################################
+
+import os
+import json
+import time
+import uuid
+
+class FileQueue:
+    """
+    Local stand-in for SQS, one file per message in a directory, safe across processes.
+
+    Messages are files in ready/. Receiving a message renames it into inflight/ (the rename is
+    atomic, so each message goes to one consumer) and deleting it removes the file. A message
+    not deleted within visibility_timeout_s, e.g. because its consumer crashed or reported it as
+    failed, goes back to ready/. A message received max_receives times without being deleted is
+    moved to dead/, like an SQS redrive policy to a dead-letter queue.
+    """
+
+    def __init__(self, directory, visibility_timeout_s=30.0, max_receives=3):
+        self.directory = directory
+        self.visibility_timeout_s = visibility_timeout_s
+        self.max_receives = max_receives
+        for name in ("tmp", "ready", "inflight", "dead"):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+        self._last_requeue = 0.0
+
+    def _path(self, state, file_name):
+        return os.path.join(self.directory, state, file_name)
+
+    def send(self, body):
+        """
+        Add a message. File names start with the time in ns, so messages are received in about the order sent.
+
+        Returns:
+            message_id
+        """
+        message_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:12]}"
+        # Written in tmp/ and renamed, so a consumer never sees a partial file
+        tmp_path = self._path("tmp", message_id)
+        with open(tmp_path, 'w') as f:
+            f.write(body)
+        os.replace(tmp_path, self._path("ready", f"{message_id}.0"))
+        return message_id
+
+    def _requeue_expired(self):
+        """Move the in-flight messages past their visibility timeout back to ready/."""
+        now = time.time()
+        # Listing inflight/ on every receive would dominate with many consumers
+        if now - self._last_requeue < min(1.0, self.visibility_timeout_s / 4):
+            return
+        self._last_requeue = now
+        for file_name in os.listdir(os.path.join(self.directory, "inflight")):
+            path = self._path("inflight", file_name)
+            try:
+                if now - os.path.getmtime(path) > self.visibility_timeout_s:
+                    os.replace(path, self._path("ready", file_name))
+            except FileNotFoundError:
+                pass  # Deleted or requeued by another consumer meanwhile
+
+    def receive(self, max_messages=10, wait_time_s=0.0):
+        """
+        Receive up to max_messages, waiting up to wait_time_s for the first one (long polling).
+
+        Returns:
+            messages: List of {"messageId", "receiptHandle", "body", "receiveCount"} dictionaries
+        """
+        deadline = time.monotonic() + wait_time_s
+        while True:
+            self._requeue_expired()
+            messages = []
+            for file_name in sorted(os.listdir(os.path.join(self.directory, "ready"))):
+                message_id, receive_count = file_name.rsplit(".", 1)
+                receive_count = int(receive_count) + 1
+                if receive_count > self.max_receives:
+                    try:
+                        os.replace(self._path("ready", file_name), self._path("dead", message_id))
+                    except FileNotFoundError:
+                        pass
+                    continue
+
+                receipt_handle = f"{message_id}.{receive_count}"
+                try:
+                    # The visibility timeout starts now; touched before the rename so that it is
+                    # never in inflight/ with the time it was sent
+                    os.utime(self._path("ready", file_name))
+                    os.replace(self._path("ready", file_name), self._path("inflight", receipt_handle))
+                except FileNotFoundError:
+                    continue  # Received by another consumer
+                with open(self._path("inflight", receipt_handle), 'r') as f:
+                    body = f.read()
+                messages.append({"messageId": message_id, "receiptHandle": receipt_handle,
+                                 "body": body, "receiveCount": receive_count})
+                if len(messages) == max_messages:
+                    break
+
+            if messages or time.monotonic() >= deadline:
+                return messages
+            time.sleep(0.02)
+
+    def delete(self, receipt_handle):
+        """Acknowledge a received message."""
+        try:
+            os.remove(self._path("inflight", receipt_handle))
+        except FileNotFoundError:
+            pass  # Already requeued after its visibility timeout, it will be received again
+
+    def counts(self):
+        """Number of messages ready, in flight and dead."""
+        return {state: len(os.listdir(os.path.join(self.directory, state))) for state in ("ready", "inflight", "dead")}
+
+class SqsQueue:
+    """The same interface on an SQS queue. The dead-letter queue is the redrive policy of the queue."""
+
+    def __init__(self, queue_url):
+        # Only needed for SQS
+        import boto3
+        self.sqs = boto3.client("sqs")
+        self.queue_url = queue_url
+
+    def send(self, body):
+        return self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=body)["MessageId"]
+
+    def receive(self, max_messages=10, wait_time_s=0.0):
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=int(wait_time_s),
+            AttributeNames=["ApproximateReceiveCount"]
+        )
+        return [
+            {"messageId": message["MessageId"], "receiptHandle": message["ReceiptHandle"], "body": message["Body"],
+             "receiveCount": int(message["Attributes"]["ApproximateReceiveCount"])}
+            for message in response.get("Messages", [])
+        ]
+
+    def delete(self, receipt_handle):
+        self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt_handle)
+
+def open_queue(location, **kwargs):
+    """SqsQueue for an SQS queue URL, FileQueue for a directory."""
+    if location.startswith("https://"):
+        return SqsQueue(location)
+    return FileQueue(location, **kwargs)
+
+def receive_batch(queue, max_messages, max_wait_ms, poll_s=1.0):
+    """
+    Collect a batch of up to max_messages, for at most max_wait_ms after its first message,
+    like the batch size and batching window of a Lambda SQS event source.
+
+    Returns:
+        messages: List of received messages, empty if none arrived within poll_s
+    """
+    messages = queue.receive(max_messages, wait_time_s=poll_s)
+    if not messages:
+        return messages
+    deadline = time.monotonic() + max_wait_ms / 1000.0
+    while len(messages) < max_messages:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        more = queue.receive(max_messages - len(messages), wait_time_s=min(remaining, poll_s))
+        if not more:
+            # SQS long polling only takes whole seconds
+            time.sleep(min(remaining, 0.02))
+        messages += more
+    return messages
+
+def enqueue_window(queue, final_payload):
+    """Send one window in the body format of the inference endpoint."""
+    return queue.send(json.dumps(final_payload))
@@ -3,9 +3,14 @@ import numpy as np
 import joblib
 import numpy as np
 import pandas as pd
+import os
 import json
+import time
 import boto3
 
+from metrics import InvocationMetrics
+from events import coalesce_frames, write_events
+
 # Logging for CLoudWatch
 import logging
 logger = logging.getLogger()
@@ -39,7 +44,50 @@ TABLE_NAME = "NoiseLog"
 #     model = joblib.load(temp_path)
 #     return model
 
-model = joblib.load("model.joblib")
+# SHARED_MODEL_DIR: a model exported with shared_model.py --export, memory-mapped instead of
+# unpickling model.joblib, so local consumer processes share one copy of the trees (see README)
+SHARED_MODEL_DIR = os.environ.get("SHARED_MODEL_DIR")
+if SHARED_MODEL_DIR:
+    from shared_model import SharedModel
+    model = SharedModel(SHARED_MODEL_DIR)
+else:
+    model = joblib.load("model.joblib")
+
+# Framing used to train the model (frame_size and overlap_percentage in aws_sagemaker/train.py).
+# Payloads are cut into frames of this size, payloads shorter than one frame are used as a single frame.
+FRAME_SIZE = int(os.environ.get("FRAME_SIZE", "30"))
+OVERLAP_PERCENT = int(os.environ.get("OVERLAP_PERCENT", "70"))
+# Checked at import so that a bad configuration fails the cold start instead of every invocation
+if FRAME_SIZE < 2:
+    raise ValueError(f"FRAME_SIZE must be at least 2, got {FRAME_SIZE}")
+if not 0 <= OVERLAP_PERCENT < 100:
+    raise ValueError(f"OVERLAP_PERCENT must be between 0 and 99, got {OVERLAP_PERCENT}")
+
+# Optional energy gate (thresholds from energy_gate.json, written by aws_sagemaker/train.py).
+# Frames with total magnitude and low-band energy at most these values are background without running the model.
+ENERGY_GATE_MAX_TOTAL = os.environ.get("ENERGY_GATE_MAX_TOTAL")
+ENERGY_GATE_MAX_LOW_BAND = os.environ.get("ENERGY_GATE_MAX_LOW_BAND")
+energy_gate = None
+if ENERGY_GATE_MAX_TOTAL and ENERGY_GATE_MAX_LOW_BAND:
+    energy_gate = (float(ENERGY_GATE_MAX_TOTAL), float(ENERGY_GATE_MAX_LOW_BAND))
+
+BACKGROUND_LABEL = 0
+
+# Event coalescing: when set, consecutive frames of the same class are written as one event item,
+# extending the house's last event if it has the same class and ended at most this many ms before.
+# When unset, one item is written per invocation.
+EVENT_MAX_GAP_MS = os.environ.get("EVENT_MAX_GAP_MS")
+if EVENT_MAX_GAP_MS is not None:
+    EVENT_MAX_GAP_MS = float(EVENT_MAX_GAP_MS)
+
+# BatchWriteItem accepts at most 25 items per request
+BATCH_WRITE_SIZE = 25
+
+# Raw retention: when set, items get an expiresAt attribute (epoch seconds) this many days after their
+# start (after their end for coalesced events), and the table's TTL deletes them once lambda/compact_noise_log has archived their day.
+# When unset, items are kept forever.
+RAW_RETENTION_DAYS = os.environ.get("RAW_RETENTION_DAYS")
+RAW_RETENTION_S = float(RAW_RETENTION_DAYS) * 24 * 60 * 60 if RAW_RETENTION_DAYS else None
 
 def process_unstructured_data_to_csv(dictionary):
     """
@@ -64,100 +112,140 @@ def process_unstructured_data_to_csv(dictionary):
 
     return df
 
-def fourier_transform(df):
+def frame_spectra(signal, time_interval, frame_size, hop_size):
     """
-    Transform time-domain data to frequency domain using windowed FFT.
-    
+    Windowed FFT (Hanning window) of all frames of a signal at once, with the same magnitudes as the
+    per-frame fourier_transform of aws_sagemaker/preprocessing.py used for training.
+
     Args:
-        df: DataFrame with 'timestamp' (ms) and 'analog_value' columns
-        
+        signal: 1D array of analog values
+        time_interval: Time between data points in milliseconds
+        frame_size: Number of data points in each frame/window
+        hop_size: Number of data points between the starts of consecutive frames
+
+    Returns:
+        frequency: Array of the non-negative frequency bins (Hz), shared by all frames
+        magnitude: Array of shape (n_frames, n_bins)
+    """
+    # (n_frames, frame_size) view of the signal without copying
+    frames = np.lib.stride_tricks.sliding_window_view(np.asarray(signal, dtype=float), frame_size)[::hop_size]
+
+    # Same bins as np.fft.fftfreq(...) >= 0
+    n_bins = (frame_size + 1) // 2
+    magnitude = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1))[:, :n_bins]
+    frequency = np.arange(n_bins) / (frame_size * time_interval / 1000)
+
+    return frequency, magnitude
+
+def extract_spectral_features_batch(frequency, magnitude):
+    """
+    Extract the features of aws_sagemaker/feature_extract.py extract_spectral_features (used for
+    training, without normalization) for many frames at once.
+
     Returns:
-        freq_df: DataFrame with 'frequency' (Hz) and 'magnitude' columns
-        sampling_rate: Sampling rate in Hz
+        features: Array of shape (n_frames, 13)
+    """
+    total = np.sum(magnitude, axis=1)
+
+    spectral_centroid = magnitude @ frequency / total
+    cumsum = np.cumsum(magnitude, axis=1)
+    rolloff_idx = np.argmax(cumsum >= 0.85 * cumsum[:, -1:], axis=1)
+
+    return np.column_stack([
+        # Statistical features (8 features)
+        np.mean(magnitude, axis=1),
+        np.std(magnitude, axis=1),
+        np.max(magnitude, axis=1),
+        np.median(magnitude, axis=1),
+        np.percentile(magnitude, 25, axis=1),
+        np.percentile(magnitude, 75, axis=1),
+        total,
+        np.var(magnitude, axis=1),
+        # Spectral features
+        spectral_centroid,
+        frequency[np.argmax(magnitude, axis=1)],
+        frequency[rolloff_idx],
+        np.sqrt(np.sum(((frequency - spectral_centroid[:, None]) ** 2) * magnitude, axis=1) / total),
+        np.sum(magnitude[:, frequency < 100], axis=1)
+    ])
+
+def frame_features(df, frame_size=FRAME_SIZE, overlap_percent=OVERLAP_PERCENT):
     """
+    Cut a payload of any length into frames and featurize all of them in one batch.
 
-    # Get frame size from number of rows in df
-    frame_size = len(df)
+    Args:
+        df: DataFrame with 'timestamp' (ms) and 'analog_value' columns
 
-    # Extract values
-    timestamps = df['timestamp'].values  # in milliseconds
+    Returns:
+        features: Array of shape (n_frames, 13)
+        frame_starts: Array of the timestamp of the first data point of each frame
+        frame_ends: Array of the timestamp of the last data point of each frame
+    """
+    timestamps = df['timestamp'].values
     signal = df['analog_value'].values
-    
-    # Calculate sampling parameters
     time_interval = timestamps[1] - timestamps[0]  # ms between samples
-    sampling_rate = 1000 / time_interval  # Convert to Hz (samples per second)
-    
-    # Initialize lists to store results
-    all_frequencies = []
-    all_magnitudes = []
-    
-    frame = signal
-    
-    # Apply window function (Hanning) to reduce spectral leakage
-    window = np.hanning(frame_size)
-    windowed_frame = frame * window
-    
-    # Perform FFT on this frame
-    fft_values = np.fft.fft(windowed_frame)
-    fft_freq = np.fft.fftfreq(frame_size, d=time_interval/1000)  # Frequency bins in Hz
-    
-    # Get magnitude (absolute value) and only positive frequencies
-    magnitude = np.abs(fft_values)
-    positive_freq_idx = fft_freq >= 0
-    
-    # Store results with frame ID
-    frame_frequencies = fft_freq[positive_freq_idx]
-    frame_magnitudes = magnitude[positive_freq_idx]
-    
-    all_frequencies.extend(frame_frequencies)
-    all_magnitudes.extend(frame_magnitudes)
-        
-    # Create frequency domain dataframe
-    freq_df = pd.DataFrame({
-        'frequency': all_frequencies,
-        'magnitude': all_magnitudes
-    })
-    
-    return freq_df, sampling_rate
 
-def extract_spectral_features(freq_df):
-    """Extract features without normalization."""
-    magnitude = freq_df['magnitude'].values
-    frequency = freq_df['frequency'].values
-    
-    features = []
+    # A payload shorter than one frame is used as a single frame, as before
+    frame_size = min(frame_size, len(signal))
+    hop_size = frame_size - int(frame_size * overlap_percent / 100)
 
-    sum = np.sum(magnitude)
-    
-    # Statistical features (8 features)
-    features.append(np.mean(magnitude))
-    features.append(np.std(magnitude))
-    features.append(np.max(magnitude))
-    features.append(np.median(magnitude))
-    features.append(np.percentile(magnitude, 25))
-    features.append(np.percentile(magnitude, 75))
-    features.append(sum)
-    features.append(np.var(magnitude))
-    
-    # Spectral features
-    spectral_centroid = np.sum(frequency * magnitude) / sum
-    features.append(spectral_centroid)
-    
-    dominant_freq = frequency[np.argmax(magnitude)]
-    features.append(dominant_freq)
-    
-    cumsum = np.cumsum(magnitude)
-    rolloff_threshold = 0.85 * cumsum[-1]
-    rolloff_idx = np.where(cumsum >= rolloff_threshold)[0][0]
-    spectral_rolloff = frequency[rolloff_idx]
-    features.append(spectral_rolloff)
-    
-    spectral_bandwidth = np.sqrt(np.sum(((frequency - spectral_centroid) ** 2) * magnitude) / sum)
-    features.append(spectral_bandwidth)
-    
-    features.append(np.sum(magnitude[frequency < 100]))
-    
-    return np.array(features)
+    frequency, magnitude = frame_spectra(signal, time_interval, frame_size, hop_size)
+    features = extract_spectral_features_batch(frequency, magnitude)
+
+    first_points = np.arange(len(features)) * hop_size
+    return features, timestamps[first_points], timestamps[first_points + frame_size - 1]
+
+def frame_probabilities(features):
+    """
+    Class probabilities of all frames with one predict_proba call.
+
+    With the energy gate enabled, frames under both energy thresholds are background
+    and only the other frames go through the model.
+
+    Returns:
+        probabilities: Array of shape (n_frames, n_classes), columns in the order of model.classes_
+        n_gated: Number of frames classified by the energy gate
+    """
+    probabilities = np.zeros((len(features), len(model.classes_)))
+
+    gated = np.zeros(len(features), dtype=bool)
+    if energy_gate is not None:
+        # Columns 6 and 12 of the features are the total magnitude and the energy below 100 Hz
+        gated = (features[:, 6] <= energy_gate[0]) & (features[:, 12] <= energy_gate[1])
+        probabilities[gated, list(model.classes_).index(BACKGROUND_LABEL)] = 1.0
+
+    if not gated.all():
+        probabilities[~gated] = model.predict_proba(features[~gated])
+
+    return probabilities, int(gated.sum())
+
+def classify_frames(features):
+    """
+    Classify all frames with one predict_proba call.
+
+    Returns:
+        frame_classes: Array of the predicted class of each frame
+        event_class: Class of the whole payload, from the mean of the frame probabilities
+        n_gated: Number of frames classified by the energy gate
+    """
+    probabilities, n_gated = frame_probabilities(features)
+
+    frame_classes = model.classes_[np.argmax(probabilities, axis=1)]
+    event_class = model.classes_[np.argmax(probabilities.mean(axis=0))]
+
+    return frame_classes, event_class, n_gated
+
+def noise_log_item(house_id, start_time, prediction):
+    """NoiseLog item of one window written without coalescing, with its TTL when RAW_RETENTION_DAYS is set."""
+    item = {
+        "houseName": {"S": house_id},
+        "timestamp": {"N": str(start_time)},
+        "noiseClass": {"N": str(prediction)},
+        "dummy": {"S": "1"}
+    }
+    if RAW_RETENTION_S is not None:
+        item["expiresAt"] = {"N": str(int(float(start_time) / 1000 + RAW_RETENTION_S))}
+    return item
 
 def lambda_handler(event, context):
     """
@@ -167,13 +255,20 @@ def lambda_handler(event, context):
         event: Dictionary containing input data in specified format.
         context: Lambda Context runtime methods and attributes.
     Returns:
-        prediction: Predicted label.
+        prediction: Predicted label of the whole payload, the label and start time of each frame
+                    and the number of frames classified per second.
     """
 
     # model = load_model()
 
+    # Per-stage latency, emitted as one structured metrics record per (sampled) invocation
+    metrics = InvocationMetrics()
+    metrics.set("EnergyGate", "on" if energy_gate is not None else "off")
+
     try:
+        metrics.set("PayloadBytes", len(event['body']))
         body = json.loads(event['body'])  # data from HTTP POST
+        metrics.mark("Parse")
 
         # Get "house_id" if needed
         house_id = body.get("house_id")
@@ -183,36 +278,171 @@ def lambda_handler(event, context):
 
         # Get data from input to this function
         df = process_unstructured_data_to_csv(body)
+        metrics.set("Points", len(df))
+        metrics.mark("DataFrame")
+
+        classify_start = time.perf_counter()
+        features, frame_starts, frame_ends = frame_features(df)
+        metrics.mark("Features")
 
-        freq_df, sampling_rate = fourier_transform(df)
+        frame_classes, prediction, n_gated = classify_frames(features)
+        metrics.mark("Predict")
+        metrics.set("GatedFrames", n_gated)
 
-        features = extract_spectral_features(freq_df)
+        frames_per_second = len(frame_classes) / (time.perf_counter() - classify_start)
+        metrics.set("Frames", len(frame_classes))
+        metrics.set("FramesPerSecond", round(frames_per_second, 1))
 
-        prediction = model.predict([features])
+        logger.info(f"Prediction successful: {prediction} from {len(frame_classes)} frames ({frames_per_second:.0f} frames/s)")
 
-        logger.info(f"Prediction successful: {prediction[0]}")
+        if EVENT_MAX_GAP_MS is None:
+            dynamodb.put_item(TableName=TABLE_NAME, Item=noise_log_item(house_id, start_time, prediction))
+        else:
+            # Column 6 of the features is the total magnitude of the frame
+            events = coalesce_frames(frame_classes, frame_starts, frame_ends, features[:, 6])
+            n_put, n_updated = write_events(dynamodb, TABLE_NAME, house_id, events, EVENT_MAX_GAP_MS,
+                                           RAW_RETENTION_S)
+            metrics.set("ItemsPut", n_put)
+            metrics.set("ItemsUpdated", n_updated)
 
-        dynamodb.put_item(
-            TableName=TABLE_NAME,
-            Item={
-                "houseName": {"S": house_id},
-                "timestamp": {"N": str(start_time)},
-                "noiseClass": {"N": str(prediction[0])},
-                "dummy": {"S": "1"}
-            }
-        )
+        metrics.mark("PutItem")
 
         logger.info("Successfully inserted item into DynamoDB")
 
+        metrics.emit()
         return {
             'statusCode': 200,
-            'body': json.dumps({'predicted_label': int(prediction[0])})
+            'body': json.dumps({
+                'predicted_label': int(prediction),
+                'frame_labels': [int(c) for c in frame_classes],
+                'frame_start_times': [float(t) for t in frame_starts],
+                'frames_per_second': round(frames_per_second, 1)
+            })
         }
     
     except Exception as e:
         logger.error(f"Error occurred: {str(e)}", exc_info=True)
+        metrics.emit(status="error")
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
-    
\ No newline at end of file
+    
+
+def batch_put_items(items, max_attempts=5):
+    """
+    Write items with BatchWriteItem, 25 per request, retrying unprocessed items with backoff.
+
+    A request that raises (throttling after the client's own retries, a validation error) fails
+    every item of its chunk, the other chunks are still written.
+
+    Returns:
+        failed_keys: Set of (houseName, timestamp) of the items still unprocessed after the last attempt
+    """
+    failed_keys = set()
+    for first in range(0, len(items), BATCH_WRITE_SIZE):
+        chunk = items[first:first + BATCH_WRITE_SIZE]
+        requests = [{"PutRequest": {"Item": item}} for item in chunk]
+        try:
+            for attempt in range(max_attempts):
+                if attempt:
+                    time.sleep(0.05 * 2 ** (attempt - 1))
+                response = dynamodb.batch_write_item(RequestItems={TABLE_NAME: requests})
+                requests = response.get("UnprocessedItems", {}).get(TABLE_NAME, [])
+                if not requests:
+                    break
+        except Exception as e:
+            logger.error(f"BatchWriteItem of {len(chunk)} items failed: {e}")
+            # Puts are idempotent, so the whole chunk is retried
+            requests = [{"PutRequest": {"Item": item}} for item in chunk]
+        failed_keys.update((r["PutRequest"]["Item"]["houseName"]["S"], r["PutRequest"]["Item"]["timestamp"]["N"])
+                           for r in requests)
+    return failed_keys
+
+def sqs_handler(event, context):
+    """
+    AWS Lambda handler for the ingest queue (SQS event source with ReportBatchItemFailures).
+
+    Each message body is one window, in the same format as the body of lambda_handler. The frames
+    of all windows of the batch are classified with one predict_proba call and the results are
+    written together: with BatchWriteItem, or through the event coalescing of each house when
+    EVENT_MAX_GAP_MS is set.
+
+    Args:
+        event: {"Records": [{"messageId": <id>, "body": <window JSON>}, ...]}
+
+    Returns:
+        batchItemFailures: The messages that could not be parsed, classified or written. SQS deletes
+                           the others, and makes these visible again until the redrive policy moves
+                           them to the dead-letter queue.
+    """
+    metrics = InvocationMetrics()
+    metrics.set("EnergyGate", "on" if energy_gate is not None else "off")
+
+    records = event.get("Records", [])
+    failed = set()
+
+    # Featurize each window on its own, a bad window only fails its message
+    windows = []
+    for record in records:
+        try:
+            body = json.loads(record["body"])
+            df = process_unstructured_data_to_csv(body)
+            features, frame_starts, frame_ends = frame_features(df)
+            windows.append((record["messageId"], body["house_id"], body["start_time"], features, frame_starts, frame_ends))
+        except Exception as e:
+            logger.error(f"Window of message {record.get('messageId')} rejected: {e}")
+            failed.add(record.get("messageId"))
+    metrics.set("Windows", len(records))
+    metrics.mark("Features")
+
+    if windows:
+        classify_start = time.perf_counter()
+        all_features = np.concatenate([window[3] for window in windows])
+        probabilities, n_gated = frame_probabilities(all_features)
+        frame_classes = model.classes_[np.argmax(probabilities, axis=1)]
+        metrics.mark("Predict")
+        metrics.set("GatedFrames", n_gated)
+        metrics.set("Frames", len(all_features))
+        metrics.set("FramesPerSecond", round(len(all_features) / (time.perf_counter() - classify_start), 1))
+
+        # Frames of each window are a contiguous slice of the batch
+        bounds = np.cumsum([0] + [len(window[3]) for window in windows])
+
+        if EVENT_MAX_GAP_MS is None:
+            items = {}
+            for (message_id, house_id, start_time, _, _, _), lo, hi in zip(windows, bounds[:-1], bounds[1:]):
+                prediction = model.classes_[np.argmax(probabilities[lo:hi].mean(axis=0))]
+                item = noise_log_item(house_id, start_time, prediction)
+                # BatchWriteItem rejects two puts of the same key, the later window wins as with put_item
+                items[(house_id, item["timestamp"]["N"])] = (message_id, item)
+            failed_keys = batch_put_items([item for _, item in items.values()])
+            failed.update(message_id for key, (message_id, _) in items.items() if key in failed_keys)
+            metrics.set("ItemsPut", len(items) - len(failed_keys))
+        else:
+            # Windows of each house in time order, so its events are coalesced as if they came one by one
+            by_house = {}
+            for window, lo, hi in zip(windows, bounds[:-1], bounds[1:]):
+                by_house.setdefault(window[1], []).append((float(window[2]), window, lo, hi))
+            n_put = n_updated = 0
+            for house_id, house_windows in by_house.items():
+                house_windows.sort(key=lambda entry: entry[0])
+                try:
+                    events = []
+                    for _, (_, _, _, features, frame_starts, frame_ends), lo, hi in house_windows:
+                        # Column 6 of the features is the total magnitude of the frame
+                        events += coalesce_frames(frame_classes[lo:hi], frame_starts, frame_ends, features[:, 6])
+                    put, updated = write_events(dynamodb, TABLE_NAME, house_id, events, EVENT_MAX_GAP_MS,
+                                                RAW_RETENTION_S)
+                    n_put += put
+                    n_updated += updated
+                except Exception as e:
+                    logger.error(f"Events of {house_id} not written: {e}")
+                    failed.update(entry[1][0] for entry in house_windows)
+            metrics.set("ItemsPut", n_put)
+            metrics.set("ItemsUpdated", n_updated)
+        metrics.mark("PutItem")
+
+    metrics.set("FailedWindows", len(failed))
+    metrics.emit(status="partial" if failed else "success")
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in sorted(failed)]}
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import random
+
+# Metrics are written to stdout in CloudWatch Embedded Metric Format (EMF),
+# so CloudWatch extracts them from the logs without any PutMetricData calls.
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "NoiseWatch/Inference")
+
+# Fraction of invocations that emit a metrics record (0 disables metrics, 1 records every invocation)
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", "1.0"))
+
+FUNCTION_NAME = os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "noise_inference")
+
+# Units of the per-invocation values that are also published as metrics
+VALUE_METRICS = {"PayloadBytes": "Bytes", "Points": "Count", "Frames": "Count", "FramesPerSecond": "Count/Second",
+                 "GatedFrames": "Count", "ItemsPut": "Count", "ItemsUpdated": "Count", "Windows": "Count",
+                 "FailedWindows": "Count"}
+
+# True until the first invocation of this execution environment has been recorded
+_cold_start = True
+
+class InvocationMetrics:
+    """
+    Per-invocation stage timer.
+
+    Call mark(stage) at the end of each stage to record the time since the previous mark.
+    When the invocation is not sampled, mark() and emit() return immediately.
+    """
+
+    def __init__(self, sample_rate=None):
+        global _cold_start
+        self.cold_start = _cold_start
+        _cold_start = False
+
+        sample_rate = METRICS_SAMPLE_RATE if sample_rate is None else sample_rate
+
+        # Unless metrics are disabled, cold starts are always recorded, they are rare and the most interesting
+        self.enabled = sample_rate > 0 and (self.cold_start or random.random() < sample_rate)
+
+        self.stages = {}
+        self.properties = {}
+        self._start = time.perf_counter() if self.enabled else 0.0
+        self._last = self._start
+
+    def mark(self, stage):
+        """Record the time since the previous mark (or the start) as <stage>Ms."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.stages[stage] = (now - self._last) * 1000
+        self._last = now
+
+    def set(self, name, value):
+        """Attach a value to the record, e.g. the payload size."""
+        if self.enabled:
+            self.properties[name] = value
+
+    def record(self, status):
+        """
+        Build the EMF record.
+
+        Returns:
+            Dictionary with the '_aws' metadata, one '<stage>Ms' metric per stage, 'TotalMs',
+            the VALUE_METRICS that were set, and 'ColdStart', 'Status' and any other properties
+        """
+        metrics = {f"{stage}Ms": round(ms, 3) for stage, ms in self.stages.items()}
+        metrics["TotalMs"] = round((time.perf_counter() - self._start) * 1000, 3)
+
+        definitions = [{"Name": name, "Unit": "Milliseconds"} for name in metrics]
+        for name, unit in VALUE_METRICS.items():
+            if name in self.properties:
+                metrics[name] = self.properties[name]
+                definitions.append({"Name": name, "Unit": unit})
+
+        # Average latency with and without the energy gate can be compared on the EnergyGate dimension
+        dimensions = [["FunctionName", "ColdStart"]]
+        if "EnergyGate" in self.properties:
+            dimensions.append(["FunctionName", "EnergyGate"])
+
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": dimensions,
+                    "Metrics": definitions
+                }]
+            },
+            "FunctionName": FUNCTION_NAME,
+            "ColdStart": "true" if self.cold_start else "false",
+            "Status": status
+        }
+        record.update({k: v for k, v in self.properties.items() if k not in metrics})
+        record.update(metrics)
+
+        return record
+
+    def emit(self, status="success"):
+        """Print the EMF record as one JSON line on stdout."""
+        if self.enabled:
+            print(json.dumps(self.record(status)))
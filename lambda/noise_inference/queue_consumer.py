@@ -0,0 +1,87 @@
+###########################################################################
+# Local consumer of the ingest queue, for a FileQueue or SQS without the  #
+# Lambda event source: classifies windows in batches with sqs_handler     #
+# python queue_consumer.py --queue /var/lib/noise_watch/ingest_queue      #
+###########################################################################
+
+import time
+import argparse
+
+from ingest_queue import open_queue, receive_batch
+
+def consume_batch(queue, messages, handler):
+    """
+    Classify one batch with the SQS handler and delete the messages it did not report as failed.
+
+    Failed messages are left in flight: they are received again after the visibility timeout,
+    and moved to the dead-letter queue after max_receives attempts.
+
+    Returns:
+        n_acked: Number of messages deleted
+        n_failed: Number of messages left for a retry
+    """
+    event = {"Records": [{"messageId": message["messageId"], "body": message["body"]} for message in messages]}
+    try:
+        response = handler(event, None)
+        failed = {failure["itemIdentifier"] for failure in response.get("batchItemFailures", [])}
+    except Exception as e:
+        # The whole batch is retried, as SQS does when a handler raises
+        print(f"Batch of {len(messages)} failed: {e}")
+        failed = {message["messageId"] for message in messages}
+
+    for message in messages:
+        if message["messageId"] not in failed:
+            queue.delete(message["receiptHandle"])
+    return len(messages) - len(failed), len(failed)
+
+def run_consumer(queue, handler, batch_size=32, batch_window_ms=200, should_stop=lambda: False, totals=None):
+    """
+    Receive and classify batches of up to batch_size windows, waiting at most batch_window_ms
+    after the first window of a batch, until should_stop() is true.
+
+    Args:
+        totals: Dictionary updated as batches are consumed, so it can be read from another thread
+
+    Returns:
+        Dictionary with the number of batches, acknowledged and failed messages
+    """
+    if totals is None:
+        totals = {}
+    for name in ("batches", "acked", "failed"):
+        totals.setdefault(name, 0)
+    while not should_stop():
+        messages = receive_batch(queue, batch_size, batch_window_ms)
+        if not messages:
+            continue
+        n_acked, n_failed = consume_batch(queue, messages, handler)
+        totals["batches"] += 1
+        totals["acked"] += n_acked
+        totals["failed"] += n_failed
+    return totals
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queue', required=True, help="Directory of a FileQueue, or an SQS queue URL")
+    parser.add_argument('--batch-size', type=int, default=32, help="Windows classified together at most")
+    parser.add_argument('--batch-window-ms', type=int, default=200, help="Wait after the first window of a batch")
+    parser.add_argument('--visibility-timeout', type=float, default=30.0, help="FileQueue only: seconds before an unacknowledged window is retried")
+    parser.add_argument('--max-receives', type=int, default=3, help="FileQueue only: receives before a window is moved to dead/")
+    args = parser.parse_args()
+
+    # Loads the model and the DynamoDB client
+    import lambda_function
+
+    if args.queue.startswith("https://"):
+        queue = open_queue(args.queue)
+    else:
+        queue = open_queue(args.queue, visibility_timeout_s=args.visibility_timeout, max_receives=args.max_receives)
+
+    print(f"Consuming {args.queue} in batches of up to {args.batch_size} windows / {args.batch_window_ms} ms")
+    start = time.monotonic()
+    totals = {}
+    try:
+        run_consumer(queue, lambda_function.sqs_handler, args.batch_size, args.batch_window_ms, totals=totals)
+    except KeyboardInterrupt:
+        pass
+    print(f"Stopped after {time.monotonic() - start:.0f} s: {totals.get('batches', 0)} batches, "
+          f"{totals.get('acked', 0)} windows acknowledged, {totals.get('failed', 0)} failed")
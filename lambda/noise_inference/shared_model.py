@@ -0,0 +1,305 @@
+###########################################################################
+# Shared-memory model for local multi-process inference: the pipeline is  #
+# exported once to flat .npy arrays that every worker memory-maps         #
+# read-only, so N workers share one copy of the trees                     #
+# Export: python shared_model.py --export model_shared                    #
+###########################################################################
+
+import os
+import json
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+# Arrays of an exported model, one .npy file each
+ARRAY_NAMES = ("scaler_mean", "scaler_scale",
+               "rf_roots", "rf_feature", "rf_threshold", "rf_children", "rf_value",
+               "gb_init", "gb_roots", "gb_feature", "gb_threshold", "gb_children", "gb_value")
+
+def _flatten_trees(trees):
+    """
+    Concatenate the nodes of several fitted sklearn trees into flat arrays.
+
+    The children of node i are children[2 * i] (feature <= threshold) and children[2 * i + 1].
+    Leaves point to themselves with an infinite threshold, so every tree can be walked for
+    max_depth steps without checking for leaves.
+
+    Returns:
+        arrays: Dictionary of roots, feature, threshold, children and value (one row per node)
+        max_depth: Deepest tree
+    """
+    roots, features, thresholds, children, values = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        t = tree.tree_
+        index = np.arange(t.node_count)
+        leaf = t.children_left == -1
+        roots.append(offset)
+        features.append(np.where(leaf, 0, t.feature))
+        thresholds.append(np.where(leaf, np.inf, t.threshold))
+        children.append(offset + np.column_stack([np.where(leaf, index, t.children_left),
+                                                  np.where(leaf, index, t.children_right)]).ravel())
+        values.append(t.value[:, 0, :])
+        offset += t.node_count
+        max_depth = max(max_depth, t.max_depth)
+    arrays = {
+        "roots": np.array(roots, dtype=np.int32),
+        "feature": np.concatenate(features).astype(np.int32),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "children": np.concatenate(children).astype(np.int32),
+        "value": np.concatenate(values).astype(np.float64)
+    }
+    return arrays, max_depth
+
+def export_shared_model(model, directory, check_features=None):
+    """
+    Write the StandardScaler + soft VotingClassifier(RandomForest, GradientBoosting) pipeline
+    of model.joblib as flat arrays that SharedModel memory-maps.
+
+    Args:
+        model: The fitted pipeline
+        directory: Output directory, one .npy file per array and model.json
+        check_features: Optional feature matrix; the export is checked to give the same
+                        probabilities as the pipeline on it
+
+    Returns:
+        meta: Contents of model.json
+    """
+    scaler = model.steps[0][1]
+    voting = model.steps[-1][1]
+    estimators = dict(zip(voting.named_estimators_.keys(), voting.estimators_))
+    rf, gb = estimators.get("rf"), estimators.get("gb")
+    if len(model.steps) != 2 or voting.voting != "soft" or voting.weights is not None or rf is None or gb is None \
+            or len(estimators) != 2:
+        raise ValueError("Only StandardScaler + soft VotingClassifier(rf, gb) pipelines can be exported")
+
+    rf_arrays, rf_depth = _flatten_trees(rf.estimators_)
+    # Leaf class counts (or fractions) -> probabilities, as DecisionTreeClassifier.predict_proba
+    rf_arrays["value"] /= np.maximum(rf_arrays["value"].sum(axis=1, keepdims=True), np.finfo(np.float64).tiny)
+
+    # estimators_ has one regression tree per (stage, class), walked stage by stage
+    gb_arrays, gb_depth = _flatten_trees(gb.estimators_.ravel())
+    gb_arrays["value"] = gb_arrays["value"][:, 0] * gb.learning_rate
+    n_features = scaler.n_features_in_
+    # The initial raw prediction (log prior) is the same for every row
+    gb_init = gb._raw_predict_init(np.zeros((1, n_features)))[0]
+
+    arrays = {"scaler_mean": scaler.mean_ if scaler.with_mean else np.zeros(n_features),
+              "scaler_scale": scaler.scale_ if scaler.with_std else np.ones(n_features),
+              "gb_init": gb_init.astype(np.float64)}
+    arrays.update({f"rf_{name}": value for name, value in rf_arrays.items()})
+    arrays.update({f"gb_{name}": value for name, value in gb_arrays.items()})
+
+    os.makedirs(directory, exist_ok=True)
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+    meta = {
+        "classes": [int(c) for c in model.classes_],
+        "n_features": int(n_features),
+        "rf_max_depth": int(rf_depth),
+        "gb_max_depth": int(gb_depth),
+        "gb_n_classes": int(gb.estimators_.shape[1])
+    }
+    with open(os.path.join(directory, "model.json"), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    if check_features is not None:
+        expected = model.predict_proba(check_features)
+        actual = SharedModel(directory).predict_proba(check_features)
+        if not np.allclose(expected, actual, rtol=0, atol=1e-9):
+            raise ValueError(f"Exported model differs from the pipeline by up to {np.abs(expected - actual).max():.3g}")
+    return meta
+
+def _leaves(X, roots, feature, threshold, children, max_depth):
+    """Leaf node reached by every row in every tree, shape (n_trees, n_rows)."""
+    n_rows, n_features = X.shape
+    X = X.ravel()
+    row_offsets = np.arange(n_rows) * n_features
+    node = np.repeat(roots[:, None], n_rows, axis=1)
+    for _ in range(max_depth):
+        # np.take on flat arrays is cheaper than 2D fancy indexing and np.where
+        right = np.take(X, row_offsets + np.take(feature, node)) > np.take(threshold, node)
+        node = np.take(children, 2 * node + right)
+    return node
+
+class SharedModel:
+    """
+    Read-only, memory-mapped copy of the exported pipeline, with predict_proba and classes_ like it.
+
+    The arrays are mapped from the files written by export_shared_model, so every process using
+    the same directory shares their pages through the page cache, and none imports scikit-learn.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "model.json"), 'r') as f:
+            self.meta = json.load(f)
+        # Plain ndarray views of the maps: indexing an np.memmap wraps every result in a memmap
+        self.arrays = {name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r'))
+                       for name in ARRAY_NAMES}
+        self.classes_ = np.array(self.meta["classes"])
+        self.n_features_in_ = self.meta["n_features"]
+
+    def _tree_arrays(self, prefix):
+        a = self.arrays
+        return a[f"{prefix}_roots"], a[f"{prefix}_feature"], a[f"{prefix}_threshold"], a[f"{prefix}_children"]
+
+    def predict_proba(self, X):
+        a = self.arrays
+        X = (np.asarray(X, dtype=np.float64) - a["scaler_mean"]) / a["scaler_scale"]
+        # sklearn trees compare float32 features against float64 thresholds
+        X = X.astype(np.float32).astype(np.float64)
+
+        rf_leaves = _leaves(X, *self._tree_arrays("rf"), self.meta["rf_max_depth"])
+        rf_proba = a["rf_value"][rf_leaves].mean(axis=0)
+
+        gb_leaves = _leaves(X, *self._tree_arrays("gb"), self.meta["gb_max_depth"])
+        n_classes = self.meta["gb_n_classes"]
+        raw = a["gb_init"] + a["gb_value"][gb_leaves].reshape(-1, n_classes, len(X)).sum(axis=0).T
+        if n_classes == 1:
+            positive = 1 / (1 + np.exp(-raw[:, 0]))
+            gb_proba = np.column_stack([1 - positive, positive])
+        else:
+            raw = np.exp(raw - raw.max(axis=1, keepdims=True))
+            gb_proba = raw / raw.sum(axis=1, keepdims=True)
+
+        return (rf_proba + gb_proba) / 2
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+###########################################################################
+# Worker pool                                                             #
+###########################################################################
+
+# Model of a worker process, loaded by _init_worker
+_worker_model = None
+_worker_load_s = 0.0
+
+def load_model(location):
+    """SharedModel for an exported directory, the unpickled pipeline for a .joblib file (one private copy)."""
+    if os.path.isdir(location):
+        return SharedModel(location)
+    import joblib
+    return joblib.load(location)
+
+def _init_worker(location):
+    global _worker_model, _worker_load_s
+    start = time.perf_counter()
+    _worker_model = load_model(location)
+    # Touch every page once, so the first request does not pay for the page faults
+    _worker_model.predict_proba(np.zeros((1, _worker_model.n_features_in_)))
+    _worker_load_s = time.perf_counter() - start
+
+def _score(features):
+    start = time.perf_counter()
+    probabilities = _worker_model.predict_proba(features)
+    return probabilities, os.getpid(), time.perf_counter() - start, _worker_load_s
+
+def process_memory(pid):
+    """
+    RSS, private (anonymous) and proportional set size of a process in MB, from /proc (Linux).
+
+    Memory-mapped model pages count in the RSS of every process mapping them, but only once in
+    the sum of the PSS, which divides shared pages between the processes sharing them.
+    """
+    memory = {}
+    for path, fields in ((f"/proc/{pid}/status", {"VmRSS": "rss_mb", "RssAnon": "private_mb"}),
+                         (f"/proc/{pid}/smaps_rollup", {"Pss": "pss_mb"})):
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    name, _, value = line.partition(':')
+                    if name in fields:
+                        memory[fields[name]] = int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return memory
+
+class InferencePool:
+    """
+    Worker processes classifying feature batches, each with the model at location: an exported
+    directory (shared, memory-mapped) or model.joblib (a private copy per worker).
+
+    Workers are started with spawn, so they hold only what they load themselves and not a
+    copy-on-write image of the caller. Each request's latency from submit to result is recorded.
+    """
+
+    def __init__(self, location, n_workers):
+        self.executor = ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker, initargs=(location,))
+        self.n_workers = n_workers
+        self.latencies = []
+        self.compute_seconds = []
+        self.load_seconds = {}
+        self._lock = threading.Lock()
+
+    def submit(self, features):
+        """Classify one batch. Returns a future of its probabilities (n_rows, n_classes)."""
+        submitted = time.perf_counter()
+        future = self.executor.submit(_score, features)
+        result = Future()
+
+        def done(f):
+            try:
+                probabilities, pid, compute_s, load_s = f.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            with self._lock:
+                self.latencies.append(time.perf_counter() - submitted)
+                self.compute_seconds.append(compute_s)
+                self.load_seconds[pid] = load_s
+            result.set_result(probabilities)
+
+        future.add_done_callback(done)
+        return result
+
+    def warm_up(self, n_features, timeout_s=120):
+        """Wait until every worker loaded the model, and clear the recorded latencies."""
+        while len(self.load_seconds) < self.n_workers:
+            batch = [self.submit(np.zeros((1, n_features))) for _ in range(self.n_workers * 2)]
+            for future in batch:
+                future.result(timeout=timeout_s)
+        with self._lock:
+            self.latencies.clear()
+            self.compute_seconds.clear()
+
+    def stats(self):
+        """Request latency percentiles (ms) and the model load time and memory of each worker."""
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            compute = np.array(self.compute_seconds) * 1000
+            load_seconds = dict(self.load_seconds)
+        return {
+            "requests": len(latencies),
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "compute_p50_ms": float(np.percentile(compute, 50)) if len(compute) else None,
+            "workers": {pid: dict(process_memory(pid), load_s=load_s) for pid, load_s in load_seconds.items()}
+        }
+
+    def close(self):
+        self.executor.shutdown()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export', metavar="DIRECTORY", required=True, help="Directory to write the shared model to")
+    parser.add_argument('--model', default="model.joblib")
+    args = parser.parse_args()
+
+    import joblib
+    model = joblib.load(args.model)
+    # Check on random rows around the training data (after scaling, standard normal)
+    scaler = model.steps[0][1]
+    rng = np.random.default_rng(0)
+    check = scaler.mean_ + rng.standard_normal((5000, scaler.n_features_in_)) * scaler.scale_ * 2
+    meta = export_shared_model(model, args.export, check_features=check)
+    size = sum(os.path.getsize(os.path.join(args.export, f"{name}.npy")) for name in ARRAY_NAMES)
+    print(f"Exported {args.model} to {args.export}: {size / 1e6:.1f} MB of arrays, classes {meta['classes']}, "
+          f"same probabilities as the pipeline on {len(check)} rows")
@@ -0,0 +1,118 @@
+###########################################################################
+# NoiseLog writes of events.write_events against the in-memory DynamoDB  #
+# stand-in of the benchmarks                                              #
+# Run from lambda/noise_inference: python -m pytest test_events.py       #
+###########################################################################
+
+import os
+import sys
+
+import pytest
+
+import events
+from events import write_events
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "benchmarks"))
+from run_benchmarks import LocalDynamoDB
+
+TABLE_NAME = "NoiseLog"
+HOUSE = "house_123"
+MAX_GAP_MS = 2000
+
+class FailingDynamoDB(LocalDynamoDB):
+    """LocalDynamoDB whose next calls of the methods in fail_next raise, as a throttled request would."""
+
+    def __init__(self):
+        super().__init__()
+        self.fail_next = set()
+
+    def put_item(self, **kwargs):
+        if "put_item" in self.fail_next:
+            self.fail_next.discard("put_item")
+            raise Exception("ProvisionedThroughputExceededException")
+        return super().put_item(**kwargs)
+
+    def update_item(self, **kwargs):
+        if "update_item" in self.fail_next:
+            self.fail_next.discard("update_item")
+            raise Exception("ProvisionedThroughputExceededException")
+        return super().update_item(**kwargs)
+
+@pytest.fixture(autouse=True)
+def cold_start(monkeypatch):
+    """Every test starts in a fresh execution environment, with no cached event."""
+    monkeypatch.setattr(events, "_open_events", {})
+
+@pytest.fixture
+def db():
+    return FailingDynamoDB()
+
+def event(start, end, count=1, noise_class=2, peak_energy=10.0):
+    return {'start': float(start), 'end': float(end), 'noiseClass': noise_class, 'count': count, 'peakEnergy': peak_energy}
+
+def stored_item(db, start):
+    item = db.items[(HOUSE, str(float(start)))]
+    return float(item["endTime"]["N"]), int(item["windowCount"]["N"]), float(item["peakEnergy"]["N"])
+
+def test_merges_across_invocations(db):
+    assert write_events(db, TABLE_NAME, HOUSE, [event(0, 1000, count=3, peak_energy=5.0)], MAX_GAP_MS) == (1, 0)
+    assert write_events(db, TABLE_NAME, HOUSE, [event(1500, 2500, count=2, peak_energy=7.0)], MAX_GAP_MS) == (0, 1)
+    # A cold environment reads the open event back from the table
+    events._open_events.clear()
+    assert write_events(db, TABLE_NAME, HOUSE, [event(3000, 4000, peak_energy=6.0)], MAX_GAP_MS) == (0, 1)
+
+    assert len(db.items) == 1
+    assert stored_item(db, 0) == (4000.0, 6, 7.0)
+
+def test_gap_or_class_change_starts_a_new_item(db):
+    write_events(db, TABLE_NAME, HOUSE, [event(0, 1000)], MAX_GAP_MS)
+    write_events(db, TABLE_NAME, HOUSE, [event(1500, 2000, noise_class=1), event(5000, 6000, noise_class=1)], MAX_GAP_MS)
+
+    assert sorted(float(timestamp) for _, timestamp in db.items) == [0.0, 1500.0, 5000.0]
+
+def test_stale_cache_does_not_lower_the_stored_event(db):
+    write_events(db, TABLE_NAME, HOUSE, [event(0, 1000, count=3, peak_energy=5.0)], MAX_GAP_MS)
+    # Another execution environment extended the same event: the cache here is stale
+    item = db.items[(HOUSE, "0.0")]
+    item["endTime"] = {"N": "5000.0"}
+    item["peakEnergy"] = {"N": "100.0"}
+    item["windowCount"] = {"N": "8"}
+
+    # endTime and peakEnergy are higher than the cached ones but lower than the stored ones
+    assert write_events(db, TABLE_NAME, HOUSE, [event(2000, 3000, count=2, peak_energy=20.0)], MAX_GAP_MS) == (0, 1)
+
+    assert stored_item(db, 0) == (5000.0, 10, 100.0)
+
+def test_stale_cache_still_raises_what_is_lower(db):
+    write_events(db, TABLE_NAME, HOUSE, [event(0, 1000, count=3, peak_energy=5.0)], MAX_GAP_MS)
+    db.items[(HOUSE, "0.0")]["endTime"] = {"N": "5000.0"}
+
+    # The combined update fails on endTime, peakEnergy is then raised on its own
+    write_events(db, TABLE_NAME, HOUSE, [event(2000, 3000, count=2, peak_energy=20.0)], MAX_GAP_MS)
+
+    assert stored_item(db, 0) == (5000.0, 5, 20.0)
+
+def test_failed_put_does_not_change_the_cached_event(db):
+    write_events(db, TABLE_NAME, HOUSE, [event(0, 1000, count=3)], MAX_GAP_MS)
+    cached = dict(events._open_events[HOUSE])
+
+    db.fail_next.add("put_item")
+    with pytest.raises(Exception):
+        write_events(db, TABLE_NAME, HOUSE, [event(1500, 2500, count=2, noise_class=1)], MAX_GAP_MS)
+    assert events._open_events.get(HOUSE, cached) == cached
+
+    # The retried window is written once
+    write_events(db, TABLE_NAME, HOUSE, [event(1500, 2500, count=2, noise_class=1)], MAX_GAP_MS)
+    assert stored_item(db, 0) == (1000.0, 3, 10.0)
+    assert stored_item(db, 1500) == (2500.0, 2, 10.0)
+
+def test_failed_update_is_not_merged_twice(db):
+    write_events(db, TABLE_NAME, HOUSE, [event(0, 1000, count=3)], MAX_GAP_MS)
+
+    db.fail_next.add("update_item")
+    with pytest.raises(Exception):
+        write_events(db, TABLE_NAME, HOUSE, [event(1500, 2500, count=2)], MAX_GAP_MS)
+    assert stored_item(db, 0) == (1000.0, 3, 10.0)
+
+    write_events(db, TABLE_NAME, HOUSE, [event(1500, 2500, count=2)], MAX_GAP_MS)
+    assert stored_item(db, 0) == (2500.0, 5, 10.0)
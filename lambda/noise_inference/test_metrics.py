@@ -0,0 +1,81 @@
+###########################################################################
+# Schema of the EMF record written by metrics.InvocationMetrics          #
+# Run from lambda/noise_inference: python -m pytest test_metrics.py      #
+###########################################################################
+
+import json
+
+import pytest
+
+import metrics
+from metrics import InvocationMetrics, VALUE_METRICS
+
+@pytest.fixture(autouse=True)
+def cold_start(monkeypatch):
+    """Every test starts as the first invocation of a fresh execution environment."""
+    monkeypatch.setattr(metrics, "_cold_start", True)
+
+def invocation(sample_rate=None):
+    m = InvocationMetrics(sample_rate=sample_rate)
+    m.set("EnergyGate", "off")
+    m.set("PayloadBytes", 1234)
+    m.mark("Parse")
+    m.mark("DataFrame")
+    m.mark("Features")
+    m.set("Frames", 7)
+    m.mark("Predict")
+    m.mark("PutItem")
+    return m
+
+def test_record_layout():
+    record = invocation().record("success")
+
+    assert isinstance(record["_aws"]["Timestamp"], int)
+    [directive] = record["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == metrics.METRICS_NAMESPACE
+    assert directive["Dimensions"] == [["FunctionName", "ColdStart"], ["FunctionName", "EnergyGate"]]
+    # Every dimension and every declared metric is a top-level key of the record
+    for dimension in directive["Dimensions"]:
+        for key in dimension:
+            assert key in record
+    for definition in directive["Metrics"]:
+        assert set(definition) == {"Name", "Unit"}
+        assert definition["Name"] in record
+
+    assert record["FunctionName"] == metrics.FUNCTION_NAME
+    assert record["Status"] == "success"
+    assert record["EnergyGate"] == "off"
+
+def test_stage_and_value_metrics():
+    record = invocation().record("success")
+    units = {d["Name"]: d["Unit"] for d in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+
+    for stage in ("Parse", "DataFrame", "Features", "Predict", "PutItem", "Total"):
+        assert units[f"{stage}Ms"] == "Milliseconds"
+        assert record[f"{stage}Ms"] >= 0
+    assert record["PayloadBytes"] == 1234
+    assert units["PayloadBytes"] == VALUE_METRICS["PayloadBytes"]
+    assert record["Frames"] == 7
+    # Values that were not set are not declared
+    assert "ItemsPut" not in units and "ItemsPut" not in record
+
+def test_cold_then_warm():
+    assert invocation().record("success")["ColdStart"] == "true"
+    assert invocation().record("success")["ColdStart"] == "false"
+
+def test_emit_prints_one_json_line(capsys):
+    invocation().emit(status="error")
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["Status"] == "error"
+
+def test_emit_disabled_at_sample_rate_zero(capsys, monkeypatch):
+    # Not even the cold start is recorded
+    monkeypatch.setattr(metrics, "METRICS_SAMPLE_RATE", 0.0)
+    for _ in range(20):
+        invocation().emit()
+    assert capsys.readouterr().out == ""
+
+def test_cold_start_always_sampled(capsys):
+    invocation(sample_rate=1e-9).emit()
+    assert len(capsys.readouterr().out.splitlines()) == 1
@@ -0,0 +1,187 @@
+###########################################################################
+# Incremental dataset builder: only new or changed recordings are redone  #
+# python dataset.py --raw-dir sample_data/raw_data --dataset-dir dataset  #
+###########################################################################
+
+import os
+import json
+import hashlib
+import argparse
+import pandas as pd
+
+from pipeline import MATRIX_COLUMNS, featurize_recording, split_features
+
+MANIFEST_FILE_NAME = "manifest.json"
+PARTS_DIR_NAME = "parts"
+
+# Bump when featurize_recording changes its output or the parts are laid out differently,
+# so existing datasets are rebuilt
+DATASET_FORMAT_VERSION = 3
+
+def file_sha256(path, block_size=1 << 20):
+    """SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(dataset_dir):
+    """
+    Load the dataset manifest.
+
+    Returns:
+        manifest: Dictionary with 'params' and 'sources', or None if the dataset has not been built
+    """
+    manifest_path = os.path.join(dataset_dir, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(dataset_dir, manifest):
+    """Write the manifest atomically, so an interrupted build leaves the previous one intact."""
+    manifest_path = os.path.join(dataset_dir, MANIFEST_FILE_NAME)
+    with open(manifest_path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+def source_fingerprint(path, previous=None):
+    """
+    Size, modification time and content hash of a source file.
+
+    The file is only hashed again when its size or modification time changed since the previous build.
+    """
+    stat = os.stat(path)
+    if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+        sha256 = previous['sha256']
+    else:
+        sha256 = file_sha256(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+
+def update_dataset(raw_dir, dataset_dir, time_interval=23, frame_size=30, overlap_percent=70,
+                   labelling_interval=5, rebuild=False):
+    """
+    Bring the feature dataset up to date with the raw logs.
+
+    Each raw log has its own feature file in <dataset_dir>/parts, and manifest.json records the content
+    hash, processing parameters and feature file of every source. Only added or modified logs are
+    processed, and everything is rebuilt when the parameters change. Once the manifest is written,
+    the feature files it no longer lists (deleted logs, parts of earlier parameters) are removed. Splits come from a hash of the frame name, so unchanged frames keep their split.
+
+    Args:
+        raw_dir: Directory with the raw logs (the noise type is taken from the file name, 'shout' or 'drill')
+        dataset_dir: Directory of the dataset (manifest and feature files)
+        time_interval: Time between data points in milliseconds
+        frame_size: Number of data points in each frame/window
+        overlap_percent: Overlap percentage between consecutive frames (0-100)
+        rebuild: Process all logs even if they have not changed
+
+    Returns:
+        changes: Dictionary with the lists of 'added', 'modified', 'deleted' and 'unchanged' sources
+    """
+    params = {
+        'format_version': DATASET_FORMAT_VERSION,
+        'time_interval': time_interval,
+        'frame_size': frame_size,
+        'overlap_percent': overlap_percent,
+        'labelling_interval': labelling_interval
+    }
+
+    parts_dir = os.path.join(dataset_dir, PARTS_DIR_NAME)
+    os.makedirs(parts_dir, exist_ok=True)
+
+    manifest = load_manifest(dataset_dir)
+    old_sources = manifest['sources'] if manifest is not None else {}
+    if manifest is None or manifest['params'] != params or rebuild:
+        if manifest is not None and manifest['params'] != params:
+            print(f"Parameters changed from {manifest['params']}, rebuilding all sources")
+        previous_sources = {}
+    else:
+        previous_sources = manifest['sources']
+
+    file_names = sorted(f for f in os.listdir(raw_dir) if 'shout' in f or 'drill' in f)
+    changes = {'added': [], 'modified': [], 'deleted': [], 'unchanged': []}
+    sources = {}
+
+    for file_name in file_names:
+        path = os.path.join(raw_dir, file_name)
+        previous = previous_sources.get(file_name)
+        fingerprint = source_fingerprint(path, previous)
+
+        if previous and previous['sha256'] == fingerprint['sha256'] and os.path.exists(os.path.join(dataset_dir, previous['output'])):
+            sources[file_name] = {**previous, **fingerprint}
+            changes['unchanged'].append(file_name)
+            continue
+
+        changes['modified' if previous else 'added'].append(file_name)
+        print(f"Processing {file_name}...")
+
+        type = 'shout' if 'shout' in file_name else 'drill'
+        df = featurize_recording(path, time_interval, type, frame_size, overlap_percent, labelling_interval)
+
+        # Named after the whole file name: logs with the same stem (drill1.json, drill1.txt) get their own part.
+        # Written to a temporary file first, so the previous features stay valid if this is interrupted
+        output = os.path.join(PARTS_DIR_NAME, file_name + '.csv')
+        output_path = os.path.join(dataset_dir, output)
+        df.to_csv(output_path + ".tmp", index=False)
+        os.replace(output_path + ".tmp", output_path)
+
+        sources[file_name] = {**fingerprint, 'output': output, 'frames': len(df)}
+
+    changes['deleted'] = [file_name for file_name in old_sources if file_name not in sources]
+
+    save_manifest(dataset_dir, {'params': params, 'sources': sources})
+
+    # Only now that the new manifest is written, drop the feature files it does not list: those of deleted
+    # logs, those written with other parameters, and temporary files of interrupted builds
+    listed = {os.path.basename(source['output']) for source in sources.values()}
+    for name in os.listdir(parts_dir):
+        if name not in listed:
+            os.remove(os.path.join(parts_dir, name))
+
+    print(f"{len(changes['added'])} added, {len(changes['modified'])} modified, {len(changes['deleted'])} deleted, "
+          f"{len(changes['unchanged'])} unchanged, {sum(s['frames'] for s in sources.values())} frames in {dataset_dir}")
+
+    return changes
+
+def load_dataset(dataset_dir):
+    """
+    Load the feature files of all sources in the manifest.
+
+    Returns:
+        df: DataFrame in the format of build_feature_matrix
+    """
+    manifest = load_manifest(dataset_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST_FILE_NAME} in {dataset_dir}, run update_dataset first")
+
+    # No sources (e.g. no recordings yet) is an empty dataset rather than an error
+    if not manifest['sources']:
+        return pd.DataFrame(columns=MATRIX_COLUMNS)
+
+    parts = [pd.read_csv(os.path.join(dataset_dir, source['output'])) for source in manifest['sources'].values()]
+    return pd.concat(parts, ignore_index=True)
+
+def load_dataset_split(dataset_dir, split='train'):
+    """
+    Load one split of the dataset, with the same outputs as load_dataset_with_features.
+
+    Returns:
+        X: Feature array of shape (n_frames, n_features)
+        y: Label array of shape (n_frames,)
+        n_features: Number of features
+    """
+    return split_features(load_dataset(dataset_dir), split)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--raw-dir', type=str, default=os.path.join('sample_data', 'raw_data'))
+    parser.add_argument('--dataset-dir', type=str, default=os.path.join('model_data', 'dataset'))
+    parser.add_argument('--time-interval', type=float, default=23, help="Milliseconds between data points")
+    parser.add_argument('--frame-size', type=int, default=30)
+    parser.add_argument('--overlap', type=int, default=70)
+    parser.add_argument('--rebuild', action='store_true', help="Process all logs even if they have not changed")
+    args = parser.parse_args()
+
+    update_dataset(args.raw_dir, args.dataset_dir, args.time_interval, args.frame_size, args.overlap, rebuild=args.rebuild)
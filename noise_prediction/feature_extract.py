@@ -3,6 +3,21 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 
+from profiling import profiler
+
+def split_frame_files(files, train_split=0.85, val_split=0.07):
+    """
+    Split the frame files of one class into train/val/test, as create_model_dataset does.
+
+    The files are sorted first, so the split does not depend on the directory listing order.
+
+    Returns:
+        train_files, val_files, test_files
+    """
+    train_files, temp_files = train_test_split(sorted(files), train_size=train_split, random_state=42)
+    val_files, test_files = train_test_split(temp_files, train_size=val_split/(1-train_split), random_state=42)
+    return train_files, val_files, test_files
+
 def create_model_dataset(freq_domain_dir, output_dir, train_split=0.85, val_split=0.07):
     """
     Split frequency domain data into train/val/test sets.
@@ -21,8 +36,7 @@ def create_model_dataset(freq_domain_dir, output_dir, train_split=0.85, val_spli
         files = [f for f in os.listdir(class_dir) if f.endswith('.csv')]
         
         # Split files
-        train_files, temp_files = train_test_split(files, train_size=train_split, random_state=42)
-        val_files, test_files = train_test_split(temp_files, train_size=val_split/(1-train_split), random_state=42)
+        train_files, val_files, test_files = split_frame_files(files, train_split, val_split)
         
         # Copy to respective directories
         for split_name, split_files in [('train', train_files), ('validation', val_files), ('test', test_files)]:
@@ -32,7 +46,10 @@ def create_model_dataset(freq_domain_dir, output_dir, train_split=0.85, val_spli
             for file_name in split_files:
                 src = os.path.join(class_dir, file_name)
                 dst = os.path.join(split_dir, file_name)
-                pd.read_csv(src).to_csv(dst, index=False)
+                with profiler.stage("create_model_dataset.copy", src) as stage:
+                    pd.read_csv(src).to_csv(dst, index=False)
+                    stage.read(src)
+                    stage.written(dst)
         
         print(f"{class_name}: {len(train_files)} train, {len(val_files)} val, {len(test_files)} test")
 
@@ -116,6 +133,50 @@ def extract_spectral_features(freq_df):
     
     return np.array(features)
 
+# Names of the features returned by extract_spectral_features, in order
+FEATURE_NAMES = ['mean', 'std', 'max', 'median', 'p25', 'p75', 'sum', 'var',
+                 'spectral_centroid', 'dominant_freq', 'spectral_rolloff', 'spectral_bandwidth', 'low_band_energy']
+
+def extract_spectral_features_batch(frequency, magnitude):
+    """
+    Extract the same features as extract_spectral_features for many frames at once.
+
+    Args:
+        frequency: Array of frequency bins (Hz), shared by all frames
+        magnitude: Array of shape (n_frames, n_bins)
+
+    Returns:
+        features: Array of shape (n_frames, 13)
+    """
+    total = np.sum(magnitude, axis=1)
+
+    # Spectral features
+    spectral_centroid = magnitude @ frequency / total
+    dominant_freq = frequency[np.argmax(magnitude, axis=1)]
+
+    cumsum = np.cumsum(magnitude, axis=1)
+    rolloff_idx = np.argmax(cumsum >= 0.85 * cumsum[:, -1:], axis=1)
+    spectral_rolloff = frequency[rolloff_idx]
+
+    spectral_bandwidth = np.sqrt(np.sum(((frequency - spectral_centroid[:, None]) ** 2) * magnitude, axis=1) / total)
+
+    return np.column_stack([
+        # Statistical features (8 features)
+        np.mean(magnitude, axis=1),
+        np.std(magnitude, axis=1),
+        np.max(magnitude, axis=1),
+        np.median(magnitude, axis=1),
+        np.percentile(magnitude, 25, axis=1),
+        np.percentile(magnitude, 75, axis=1),
+        total,
+        np.var(magnitude, axis=1),
+        spectral_centroid,
+        dominant_freq,
+        spectral_rolloff,
+        spectral_bandwidth,
+        np.sum(magnitude[:, frequency < 100], axis=1)
+    ])
+
 def load_dataset_with_features(data_dir, split='train'):
     """
     Load dataset with extracted features (fixed length).
@@ -138,10 +199,13 @@ def load_dataset_with_features(data_dir, split='train'):
         
         for file_name in files:
             file_path = os.path.join(class_dir, file_name)
-            df = pd.read_csv(file_path)
+            with profiler.stage("load_dataset_with_features.read", file_path) as stage:
+                df = pd.read_csv(file_path)
+                stage.read(file_path)
             
             # Extract fixed-length features
-            features = extract_spectral_features(df)
+            with profiler.stage("load_dataset_with_features.features", file_path):
+                features = extract_spectral_features(df)
             X_list.append(features)
             y_list.append(label_map[class_name])
     
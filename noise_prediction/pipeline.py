@@ -0,0 +1,231 @@
+###########################################################################
+# Single-pass pipeline from raw logs to a labelled feature matrix         #
+# python pipeline.py --raw-dir sample_data/raw_data --output features.csv #
+###########################################################################
+
+import os
+import re
+import zlib
+import argparse
+import numpy as np
+import pandas as pd
+
+from preprocessing import hop_size_for, frame_spectra, label_schedule, save_label_schedule, label_frames
+from feature_extract import FEATURE_NAMES, extract_spectral_features_batch, split_frame_files
+from profiling import profiler
+
+# Same parsing rule as process_unstructured_data_to_csv: the first number after "analog_value": on each line
+ANALOG_VALUE_PATTERN = re.compile(r'^[^\n]*?analog_value":[^\n]*?([-+]?\d*\.?\d+)', re.MULTILINE)
+
+# The INMP441 sound sensor never reports more than this, larger values are transmission errors
+MAX_ANALOG_VALUE = 420426
+
+# Intermediate outputs that can be written for debugging, in the layout of the multi-stage pipeline
+INTERMEDIATES = ('structured', 'labelled', 'processed')
+
+label_map = {'background': 0, 'shout': 1, 'drill': 2}
+
+# Columns of the feature matrix, the frame's origin, label and split before its features
+MATRIX_COLUMNS = ['source', 'frame_id', 'segment', 'label', 'split'] + list(FEATURE_NAMES)
+
+def parse_raw_log(file_name):
+    """
+    Extract the analog values of a raw log, with the same result as process_unstructured_data_to_csv.
+
+    Values above MAX_ANALOG_VALUE are replaced by the previous value (0 at the start of the file).
+
+    Returns:
+        analog_values: 1D array of analog values
+    """
+    with open(file_name, 'r') as file:
+        text = file.read()
+
+    analog_values = np.array(ANALOG_VALUE_PATTERN.findall(text), dtype=float)
+
+    # Forward fill invalid values from the last valid one
+    valid = analog_values <= MAX_ANALOG_VALUE
+    last_valid = np.where(valid, np.arange(len(analog_values)), -1)
+    np.maximum.accumulate(last_valid, out=last_valid)
+    return np.where(last_valid >= 0, analog_values[np.maximum(last_valid, 0)], 0.0)
+
+def assign_split(keys, train_split=0.85, val_split=0.07):
+    """
+    Assign frames to 'train', 'validation' or 'test' from a hash of their key (e.g. 'drill11_frame3').
+
+    The proportions are the same as create_model_dataset, but a frame always gets the same split,
+    whatever other files are processed with it. Used by the incremental dataset (dataset.py), whose
+    parts must not change when logs are added; build_feature_matrix uses model_dataset_split instead.
+    """
+    u = np.array([zlib.crc32(key.encode()) for key in keys], dtype=float) / 2 ** 32
+    return np.where(u < train_split, 'train', np.where(u < train_split + val_split, 'validation', 'test'))
+
+def model_dataset_split(df):
+    """
+    Split of each frame of a feature matrix, as create_model_dataset assigns it: per label, over the names
+    of the frame CSVs that process_all_files would write.
+
+    Returns:
+        split: Array of 'train', 'validation' or 'test', one per row
+    """
+    split = np.empty(len(df), dtype=object)
+    names = (df['source'] + '_frame' + df['frame_id'].astype(str) + '.csv').values
+    labels = df['label'].values
+    for label in np.unique(labels):
+        rows = np.flatnonzero(labels == label)
+        for split_name, files in zip(('train', 'validation', 'test'), split_frame_files(names[rows])):
+            split[rows[np.isin(names[rows], files)]] = split_name
+    return split
+
+def featurize_recording(file_name, time_interval, type, frame_size=30, overlap_percent=70,
+                        labelling_interval=5, materialize=(), debug_dir=None):
+    """
+    Parse one raw log and compute the features of all its frames, keeping everything in memory.
+
+    The whole recording is framed as one contiguous signal, and each frame is labelled from the
+    label schedule of get_labelled_csv, as in process_all_files.
+
+    Args:
+        file_name: Path of the raw log
+        time_interval: Time between data points in milliseconds
+        type: 'shout' or 'drill'
+        materialize: Intermediates to also write to debug_dir (any of INTERMEDIATES)
+
+    Returns:
+        df: DataFrame with 'source', 'frame_id', 'segment', 'label', 'split' (assign_split) and one column per feature
+    """
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+
+    with profiler.stage("build_feature_matrix.parse", file_name) as stage:
+        analog_values = parse_raw_log(file_name)
+        stage.read(file_name)
+    hop_size = hop_size_for(frame_size, overlap_percent)
+    segments = label_schedule(len(analog_values), type, labelling_interval)
+
+    if 'structured' in materialize:
+        structured_dir = os.path.join(debug_dir, 'structured')
+        os.makedirs(structured_dir, exist_ok=True)
+        timestamps = np.arange(len(analog_values)) * time_interval
+        pd.DataFrame({'timestamp': timestamps, 'analog_value': analog_values}).to_csv(
+            os.path.join(structured_dir, base_name + '_structured.csv'), index=False)
+
+    if 'labelled' in materialize:
+        labelled_dir = os.path.join(debug_dir, 'labelled')
+        os.makedirs(labelled_dir, exist_ok=True)
+        save_label_schedule(os.path.join(labelled_dir, f"{base_name}_labels.json"),
+                            os.path.join('..', 'structured', base_name + '_structured.csv'), type, segments)
+
+    with profiler.stage("build_feature_matrix.features", file_name):
+        frequency, magnitude = frame_spectra(analog_values, time_interval, frame_size, hop_size)
+        features = extract_spectral_features_batch(frequency, magnitude)
+        labels, segment_ids = label_frames(np.arange(len(magnitude)) * hop_size, frame_size, segments)
+
+    # Frames outside all segments have no label
+    keep = np.flatnonzero(segment_ids >= 0)
+
+    if 'processed' in materialize:
+        for frame_id in keep:
+            processed_dir = os.path.join(debug_dir, 'processed', labels[frame_id])
+            os.makedirs(processed_dir, exist_ok=True)
+            pd.DataFrame({'frame_id': frame_id, 'frequency': frequency, 'magnitude': magnitude[frame_id]}).to_csv(
+                os.path.join(processed_dir, f"{base_name}_frame{frame_id}.csv"), index=False)
+
+    df = pd.DataFrame(features[keep], columns=FEATURE_NAMES)
+    df.insert(0, 'source', base_name)
+    df.insert(1, 'frame_id', keep)
+    df.insert(2, 'segment', segment_ids[keep] + 1)
+    df.insert(3, 'label', labels[keep])
+    df.insert(4, 'split', assign_split([f"{base_name}_frame{i}" for i in keep]))
+
+    return df
+
+def build_feature_matrix(raw_dir, output_path, time_interval=23, frame_size=30, overlap_percent=70,
+                         labelling_interval=5, materialize=(), debug_dir=None):
+    """
+    Go from the raw logs to the labelled feature matrix in one pass, without intermediate files.
+
+    Replaces process_unstructured_data_to_csv, get_labelled_csv, process_all_files, create_model_dataset
+    and load_dataset_with_features, with the same frames, labels and train/validation/test split.
+    Each raw log is read once and only the final matrix is written.
+
+    Args:
+        raw_dir: Directory with the raw logs (the noise type is taken from the file name, 'shout' or 'drill')
+        output_path: Path of the feature matrix CSV
+        time_interval: Time between data points in milliseconds
+        frame_size: Number of data points in each frame/window
+        overlap_percent: Overlap percentage between consecutive frames (0-100)
+        materialize: Intermediates to also write for debugging, any of 'structured', 'labelled', 'processed'
+        debug_dir: Where to write the intermediates (default: the parent of raw_dir, as the multi-stage pipeline)
+
+    Returns:
+        n_frames: Number of frames in the feature matrix
+    """
+    unknown = set(materialize) - set(INTERMEDIATES)
+    if unknown:
+        raise ValueError(f"Unknown intermediates {sorted(unknown)}, expected any of {INTERMEDIATES}")
+    debug_dir = debug_dir or os.path.dirname(os.path.abspath(raw_dir))
+
+    file_names = sorted(f for f in os.listdir(raw_dir) if 'shout' in f or 'drill' in f)
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    parts = []
+    for file_name in file_names:
+        type = 'shout' if 'shout' in file_name else 'drill'
+        parts.append(featurize_recording(os.path.join(raw_dir, file_name), time_interval, type, frame_size,
+                                         overlap_percent, labelling_interval, materialize, debug_dir))
+
+    # The split of create_model_dataset depends on all the frames of a class, so the rows (the features,
+    # not the spectra) are kept until every log is featurized, then split and written at once
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=MATRIX_COLUMNS)
+    df['split'] = model_dataset_split(df)
+    with profiler.stage("build_feature_matrix.write", output_path):
+        df.to_csv(output_path, index=False)
+
+    print(f"Feature matrix with {len(df)} frames from {len(file_names)} files saved to {output_path}")
+
+    return len(df)
+
+def split_features(df, split='train'):
+    """
+    Select one split of a feature matrix DataFrame.
+
+    Returns:
+        X: Feature array of shape (n_frames, n_features)
+        y: Label array of shape (n_frames,)
+        n_features: Number of features
+    """
+    df = df[df['split'] == split]
+
+    X = df[FEATURE_NAMES].values
+    y = df['label'].map(label_map).values
+
+    print(f"{split} set: {X.shape[0]} samples, {X.shape[1]} features (fixed length)")
+
+    return X, y, X.shape[1]
+
+def load_feature_matrix(matrix_path, split='train'):
+    """
+    Load one split of a feature matrix written by build_feature_matrix.
+
+    Returns:
+        X: Feature array of shape (n_frames, n_features)
+        y: Label array of shape (n_frames,)
+        n_features: Number of features
+    """
+    return split_features(pd.read_csv(matrix_path), split)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--raw-dir', type=str, default=os.path.join('sample_data', 'raw_data'))
+    parser.add_argument('--output', type=str, default=os.path.join('model_data', 'features.csv'))
+    parser.add_argument('--time-interval', type=float, default=23, help="Milliseconds between data points")
+    parser.add_argument('--frame-size', type=int, default=30)
+    parser.add_argument('--overlap', type=int, default=70)
+    parser.add_argument('--materialize', type=str, nargs='*', default=[], choices=INTERMEDIATES,
+                        help="Also write these intermediates, for debugging")
+    parser.add_argument('--debug-dir', type=str, help="Where to write the intermediates (default: parent of --raw-dir)")
+    args = parser.parse_args()
+
+    build_feature_matrix(args.raw_dir, args.output, args.time_interval, args.frame_size, args.overlap,
+                         materialize=args.materialize, debug_dir=args.debug_dir)
@@ -2,8 +2,11 @@ import pandas as pd
 import numpy as np
 import re
 import os
+import json
 import matplotlib.pyplot as plt
 
+from profiling import profiler
+
 def process_unstructured_data_to_csv(file_name, time_interval):
     """
     Convert raw data in file into pandas dataframe based on the specified time interval (in ms). Will save the dataframe as a CSV file.
@@ -13,81 +16,162 @@ def process_unstructured_data_to_csv(file_name, time_interval):
         time_interval: Time interval in milliseconds for data aggregation.
     """
     
-    # Read file line by line
-    with open(file_name, 'r') as file:
-
-        lines = file.readlines()
-
-        # Initialise pandas dataframe
-        df = pd.DataFrame(columns=['timestamp', 'analog_value'])
-
-        # Initialise list to hold timestamp and analog values
-        timestamps = []
-        analog_values = []
-
-        # Extract all lines containing "analog_value", and add to dataframe. For timestamp, increment by the time interval for each line.
-        timestamp = 0
-        for line in lines:
-            if "analog_value\":" in line:
-                # Extract analog value
-                analog_value_str = line.split("analog_value\":")[1]
-
-                # Extract just the number (remove commas, brackets, quotes, etc.)
-                match = re.search(r'[-+]?\d*\.?\d+', analog_value_str)
-                if match:
-                    analog_value = float(match.group())
-
-                ######## UNCOMMENT IF YOU ARE USING DATA FROM KY-038 SOUND SENSOR ########
-                # These values might be wrong, due to the transmission delay and overlapping of data packets when we log values from the microcontroller. We are not able to parse a clean data set from the raw data log.
-                # Hence, we need to check that data is NEVER above 4096 (12-bit ADC max value). If it is, we set it to the previous value.
-                # We assume that the value will never drop to below 1000 (tested values range from 2000+ to 3000+) If it is, we set it to the previous value as well.
-                # if analog_value > 4096:
-                #     if len(analog_values) > 0:
-                #         analog_value = analog_values[-1]
-                #     else:
-                #         analog_value = 0.0  # If it's the first value, set to 0
-
-                # if analog_value <= 1000:
-                #     if len(analog_values) > 0:
-                #         analog_value = analog_values[-1]
-                #     else:
-                #         analog_value = 0.0  # If it's the first value, set to 0
-
-                ######## For the new Mems INMP441 sound sensor, the analog value will be at maximum 420426
-                if analog_value > 420426:
-                    if len(analog_values) > 0:
-                        analog_value = analog_values[-1]
-                    else:
-                        analog_value = 0.0  # If it's the first value, set to 0
-
-                # Add analog value and timestamp to list
-                analog_values.append(analog_value)
-                timestamps.append(timestamp)
-
-                # Increment timestamp
-                timestamp += time_interval
-
-        # Add lists to dataframe
-        df['timestamp'] = timestamps
-        df['analog_value'] = analog_values
-
-        # Save dataframe as CSV into the "structured" directory that is one level up from the raw data file
-        directory = os.path.dirname(os.path.dirname(file_name))
-        structured_dir = os.path.join(directory, 'structured')
-        os.makedirs(structured_dir, exist_ok=True)
-        print("Directory:", directory)
-        base_name = os.path.splitext(os.path.basename(file_name))[0]
-        csv_file_name = os.path.join(structured_dir, base_name + '_structured.csv')
+    with profiler.stage("process_unstructured_data_to_csv.parse", file_name) as stage:
+        stage.read(file_name)
+
+        # Read file line by line
+        with open(file_name, 'r') as file:
+
+            lines = file.readlines()
+
+            # Initialise pandas dataframe
+            df = pd.DataFrame(columns=['timestamp', 'analog_value'])
+
+            # Initialise list to hold timestamp and analog values
+            timestamps = []
+            analog_values = []
+
+            # Extract all lines containing "analog_value", and add to dataframe. For timestamp, increment by the time interval for each line.
+            timestamp = 0
+            for line in lines:
+                if "analog_value\":" in line:
+                    # Extract analog value
+                    analog_value_str = line.split("analog_value\":")[1]
+
+                    # Extract just the number (remove commas, brackets, quotes, etc.)
+                    match = re.search(r'[-+]?\d*\.?\d+', analog_value_str)
+                    if match:
+                        analog_value = float(match.group())
+
+                    ######## UNCOMMENT IF YOU ARE USING DATA FROM KY-038 SOUND SENSOR ########
+                    # These values might be wrong, due to the transmission delay and overlapping of data packets when we log values from the microcontroller. We are not able to parse a clean data set from the raw data log.
+                    # Hence, we need to check that data is NEVER above 4096 (12-bit ADC max value). If it is, we set it to the previous value.
+                    # We assume that the value will never drop to below 1000 (tested values range from 2000+ to 3000+) If it is, we set it to the previous value as well.
+                    # if analog_value > 4096:
+                    #     if len(analog_values) > 0:
+                    #         analog_value = analog_values[-1]
+                    #     else:
+                    #         analog_value = 0.0  # If it's the first value, set to 0
+
+                    # if analog_value <= 1000:
+                    #     if len(analog_values) > 0:
+                    #         analog_value = analog_values[-1]
+                    #     else:
+                    #         analog_value = 0.0  # If it's the first value, set to 0
+
+                    ######## For the new Mems INMP441 sound sensor, the analog value will be at maximum 420426
+                    if analog_value > 420426:
+                        if len(analog_values) > 0:
+                            analog_value = analog_values[-1]
+                        else:
+                            analog_value = 0.0  # If it's the first value, set to 0
+
+                    # Add analog value and timestamp to list
+                    analog_values.append(analog_value)
+                    timestamps.append(timestamp)
+
+                    # Increment timestamp
+                    timestamp += time_interval
+
+            # Add lists to dataframe
+            df['timestamp'] = timestamps
+            df['analog_value'] = analog_values
+
+    # Save dataframe as CSV into the "structured" directory that is one level up from the raw data file
+    directory = os.path.dirname(os.path.dirname(file_name))
+    structured_dir = os.path.join(directory, 'structured')
+    os.makedirs(structured_dir, exist_ok=True)
+    print("Directory:", directory)
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+    csv_file_name = os.path.join(structured_dir, base_name + '_structured.csv')
+    with profiler.stage("process_unstructured_data_to_csv.write", file_name) as stage:
         df.to_csv(csv_file_name, index=False)
+        stage.written(csv_file_name)
+
+    print(f"CSV file saved as {csv_file_name}")
 
-        print(f"CSV file saved as {csv_file_name}")
 
+def label_schedule(n_points, type='shout', labelling_interval=5):
+    """
+    Alternating label schedule of a recording, in 5 equal intervals:
+    "shout"/"drill" in intervals 1, 3 and 5, "background" in intervals 2 and 4.
+
+    Args:
+        n_points: Number of data points in the recording
+        type: 'shout' or 'drill' to indicate the type of noise event.
+        labelling_interval: Number of intervals the recording is divided into
+
+    Returns:
+        segments: List of {'start', 'end', 'label'} segments, with start and end (exclusive) as data point indices
+    """
+    interval_length = n_points // labelling_interval
+    bounds = [0, interval_length, 2 * interval_length, 3 * interval_length, 4 * interval_length, n_points]
+    return [
+        {'start': bounds[i], 'end': bounds[i + 1], 'label': type if i % 2 == 0 else 'background'}
+        for i in range(5)
+    ]
+
+def save_label_schedule(schedule_path, source, type, segments):
+    """
+    Save a label schedule as JSON. The signal itself stays in the source CSV.
+
+    Args:
+        source: Path of the structured CSV, relative to the schedule's directory
+        type: Noise type of the recording ('shout' or 'drill')
+        segments: List of {'start', 'end', 'label'} segments
+    """
+    with open(schedule_path, 'w') as f:
+        json.dump({'source': source, 'type': type, 'segments': segments}, f, indent=4)
+
+def load_label_schedule(schedule_path):
+    """
+    Load a label schedule saved by save_label_schedule.
+
+    Returns:
+        schedule: Dictionary with 'source' (absolute path of the structured CSV), 'type' and 'segments'
+    """
+    with open(schedule_path, 'r') as f:
+        schedule = json.load(f)
+    schedule['source'] = os.path.normpath(os.path.join(os.path.dirname(schedule_path), schedule['source']))
+    return schedule
+
+def label_frames(frame_starts, frame_size, segments):
+    """
+    Label frames from a label schedule with a vectorized interval lookup.
+
+    A frame gets the label of the segment that contains its middle data point, so frames
+    straddling a label boundary are kept and labelled with the segment they mostly cover.
+
+    Args:
+        frame_starts: Array of the index of the first data point of each frame
+        frame_size: Number of data points in each frame/window
+        segments: List of {'start', 'end', 'label'} segments, sorted by start
+
+    Returns:
+        labels: Array of frame labels, None for frames outside all segments
+        segment_ids: Array of the index of each frame's segment (-1 if none)
+    """
+    starts = np.array([s['start'] for s in segments])
+    ends = np.array([s['end'] for s in segments])
+    names = np.array([s['label'] for s in segments], dtype=object)
+
+    middles = np.asarray(frame_starts) + frame_size // 2
+    segment_ids = np.searchsorted(starts, middles, side='right') - 1
+    inside = (segment_ids >= 0) & (middles < ends[segment_ids.clip(0)])
+    segment_ids = np.where(inside, segment_ids, -1)
+
+    labels = np.where(inside, names[segment_ids.clip(0)], None)
+
+    return labels, segment_ids
 
 def get_labelled_csv(csv_file_name, type='shout', labelling_interval=5):
     """
-    Convert the csv into labelled csv files based on time intervals. 
+    Label the structured CSV based on time intervals, without copying its data.
     Label data as "shout"/"drill" at: 0s - 5s, 10s - 15s, 20s - 25s
     Label data as "background" at: 5s - 10s, 15s - 20s
+
+    The labels are saved as a label schedule (labelled/<name>_labels.json) of segments with
+    start/end data point indices and a class. Frames are labelled from it in process_all_files.
     
     Args:
         csv_file_name: File name of the processed CSV data.
@@ -105,47 +189,28 @@ def get_labelled_csv(csv_file_name, type='shout', labelling_interval=5):
         else:
             csv_file_name = base_name + '_structured.csv'
 
-    # Read CSV file into pandas dataframe
-    df = pd.read_csv(csv_file_name)
-
-    # Divide df into 6 intervals based on the labelling scheme
-    df_length = len(df)
-    interval_length = df_length // labelling_interval  # Length of each interval for label
+    # Count the data points, the data itself is not needed
+    with profiler.stage("get_labelled_csv.read", csv_file_name) as stage:
+        with open(csv_file_name, 'r') as f:
+            df_length = sum(1 for _ in f) - 1  # Minus the header
+        stage.read(csv_file_name)
     
     # Get base name for output files (remove '_structured' suffix if present)
     base_name = os.path.splitext(os.path.basename(csv_file_name))[0]
     if base_name.endswith('_structured'):
         base_name = base_name[:-11]  # Remove '_structured'
     
-    # Create labelled directory and subdirectories
+    # Create labelled directory
     directory = os.path.dirname(os.path.dirname(csv_file_name))
     labelled_dir = os.path.join(directory, 'labelled')
-    # Get 'type' subdirectories
-    class_dir = os.path.join(labelled_dir, type)
-    background_dir = os.path.join(labelled_dir, 'background')
-    
-    os.makedirs(class_dir, exist_ok=True)
-    os.makedirs(background_dir, exist_ok=True)
+    os.makedirs(labelled_dir, exist_ok=True)
     
-    # Create 5 separate CSV files
-    intervals = [
-        (0, interval_length, f"{base_name}_1.csv", type, class_dir),
-        (interval_length, 2 * interval_length, f"{base_name}_2.csv","background", background_dir),
-        (2 * interval_length, 3 * interval_length, f"{base_name}_3.csv", type, class_dir),
-        (3 * interval_length, 4 * interval_length, f"{base_name}_4.csv","background", background_dir),
-        (4 * interval_length, df_length, f"{base_name}_5.csv", type, class_dir),
-    ]
-    
-    for start_idx, end_idx, filename, label, output_dir in intervals:
-        # Extract subset of dataframe
-        subset_df = df.iloc[start_idx:end_idx].copy()
-        
-        # Add label column
-        subset_df['label'] = label
-        
-        # Save to CSV in appropriate label directory
-        output_path = os.path.join(output_dir, filename)
-        subset_df.to_csv(output_path, index=False)
+    # Save the label schedule, pointing to the structured CSV
+    schedule_path = os.path.join(labelled_dir, f"{base_name}_labels.json")
+    with profiler.stage("get_labelled_csv.write", csv_file_name) as stage:
+        save_label_schedule(schedule_path, os.path.relpath(csv_file_name, labelled_dir), type,
+                            label_schedule(df_length, type, labelling_interval))
+        stage.written(schedule_path)
         
 def fourier_transform(df, frame_size, overlap_percent):
     """
@@ -220,6 +285,44 @@ def fourier_transform(df, frame_size, overlap_percent):
     
     return freq_df, sampling_rate
 
+def hop_size_for(frame_size, overlap_percent):
+    """
+    Number of data points between the starts of consecutive frames.
+    """
+    overlap_samples = int(frame_size * overlap_percent / 100)
+    return frame_size - overlap_samples
+
+def frame_spectra(signal, time_interval, frame_size, hop_size):
+    """
+    Vectorized windowed FFT of all frames of a signal at once.
+
+    Frames start at 0, hop_size, 2 * hop_size, ... exactly as in fourier_transform,
+    and the magnitudes are the same, but no per-frame DataFrame is built.
+
+    Args:
+        signal: 1D array of analog values
+        time_interval: Time between data points in milliseconds
+        frame_size: Number of data points in each frame/window
+        hop_size: Number of data points between the starts of consecutive frames
+
+    Returns:
+        frequency: Array of the non-negative frequency bins (Hz), shared by all frames
+        magnitude: Array of shape (n_frames, n_bins)
+    """
+    signal = np.asarray(signal, dtype=float)
+    n_bins = (frame_size + 1) // 2
+    frequency = np.arange(n_bins) / (frame_size * time_interval / 1000)
+    if len(signal) < frame_size:
+        return frequency, np.zeros((0, n_bins))
+
+    # (n_frames, frame_size) view of the signal without copying
+    frames = np.lib.stride_tricks.sliding_window_view(signal, frame_size)[::hop_size]
+
+    # Same bins as np.fft.fftfreq(...) >= 0 in fourier_transform
+    magnitude = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1))[:, :n_bins]
+
+    return frequency, magnitude
+
 def plot_frequency_spectrum(time_df, freq_df, title="Frequency Spectrum", directory="spectrograms"):
     """Plot both time and frequency domain representations of the signal. Save in specified directory.
     Args:
@@ -256,48 +359,51 @@ def plot_frequency_spectrum(time_df, freq_df, title="Frequency Spectrum", direct
     plt.savefig(plot_file_name)
     plt.close()
 
-def process_all_files(input_base_dir, output_base_dir, frame_size=30, overlap_percent=50):
+def process_all_files(input_base_dir, output_base_dir, frame_size=30, overlap_percent=70):
     """
-    Process all CSV files in background, shout and drill folders.
-    Apply FFT to convert from time domain to frequency domain.
+    Process all label schedules in the labelled folder.
+    Apply FFT to convert each whole recording from time domain to frequency domain, and label
+    each frame from the schedule of its recording.
     
     Args:
-        input_base_dir: Base directory containing background/ and shout/ and drill/ CSV folders
-        output_base_dir: Where to save frequency domain files
+        input_base_dir: Directory containing the *_labels.json label schedules from get_labelled_csv
+        output_base_dir: Where to save frequency domain files, in background/ and shout/ and drill/ folders
     """
-    # Read classes from the subdirectories in input_base_dir
-    classes = [d for d in os.listdir(input_base_dir) if os.path.isdir(os.path.join(input_base_dir, d))]
+    schedule_files = sorted(f for f in os.listdir(input_base_dir) if f.endswith('_labels.json'))
+    hop_size = hop_size_for(frame_size, overlap_percent)
     
-    for class_name in classes:
-        input_dir = os.path.join(input_base_dir, class_name)
-        output_freq_dir = os.path.join(output_base_dir, class_name)
-        
-        # Create output directory
-        os.makedirs(output_freq_dir, exist_ok=True)
+    for file_name in schedule_files:
+        print(f"Processing {file_name}...")
+        schedule = load_label_schedule(os.path.join(input_base_dir, file_name))
+        input_path = schedule['source']
         
-        # Get all CSV files
-        csv_files = [f for f in os.listdir(input_dir) if f.endswith('.csv')]
-        
-        for file_name in csv_files:
-            print(f"Processing {class_name}/{file_name}...")
-            
-            # Read CSV
-            input_path = os.path.join(input_dir, file_name)
+        # Read the whole, contiguous recording
+        with profiler.stage("process_all_files.read", input_path) as stage:
             time_df = pd.read_csv(input_path)
-            
-            # Convert to frequency domain
+            stage.read(input_path)
+        
+        # Convert to frequency domain, and label each frame from the schedule
+        with profiler.stage("process_all_files.fft", input_path):
             freq_df, sampling_rate = fourier_transform(time_df, frame_size, overlap_percent)
+            n_frames = freq_df['frame_id'].nunique()
+            frame_labels, _ = label_frames(np.arange(n_frames) * hop_size, frame_size, schedule['segments'])
 
-            # Plot and save spectrogram in directory one level up from output_freq_dir
-            spectrogram_directory = os.path.dirname(output_freq_dir) + '/spectrograms/' + class_name
-            print("Spectrogram directory:", spectrogram_directory)
-
-            plot_frequency_spectrum(time_df, freq_df, title=f"{class_name.capitalize()} - {file_name}", directory=spectrogram_directory)
-            
-            # Save frequency domain CSV, for each frame_id save a separate CSV file
-            base_name = os.path.splitext(file_name)[0]
-            for frame_id in freq_df['frame_id'].unique():
-                frame_data = freq_df[freq_df['frame_id'] == frame_id]
-                output_file_name = f"{base_name}_frame{frame_id}.csv"
-                output_path = os.path.join(output_freq_dir, output_file_name)
-                frame_data.to_csv(output_path, index=False)
\ No newline at end of file
+        # Plot and save spectrogram in directory one level up from the class folders
+        spectrogram_directory = os.path.join(output_base_dir, 'spectrograms', schedule['type'])
+        print("Spectrogram directory:", spectrogram_directory)
+
+        base_name = file_name[:-len('_labels.json')]
+        with profiler.stage("process_all_files.plot", input_path):
+            plot_frequency_spectrum(time_df, freq_df, title=f"{schedule['type'].capitalize()} - {base_name}", directory=spectrogram_directory)
+        
+        # Save frequency domain CSV, for each frame_id save a separate CSV file in the folder of its label
+        with profiler.stage("process_all_files.write", input_path) as stage:
+            for frame_id, frame_data in freq_df.groupby('frame_id'):
+                label = frame_labels[frame_id]
+                if label is None:
+                    continue
+                output_freq_dir = os.path.join(output_base_dir, label)
+                os.makedirs(output_freq_dir, exist_ok=True)
+                output_path = os.path.join(output_freq_dir, f"{base_name}_frame{frame_id}.csv")
+                frame_data.to_csv(output_path, index=False)
+                stage.written(output_path)
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import nullcontext
+
+# Peak RSS comes from getrusage, which is Unix-only: on Windows it is reported as 0
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class _StageRecord:
+    """Context manager that measures one stage, for one file or for a whole call."""
+
+    def __init__(self, profiler, stage, file_name):
+        self.profiler = profiler
+        self.stage = stage
+        self.file_name = file_name
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_read = 0
+        self.files_written = 0
+        self.cprofile = None
+
+    def read(self, path):
+        """Count a file read in this stage."""
+        self.bytes_read += os.path.getsize(path)
+        self.files_read += 1
+
+    def written(self, path):
+        """Count a file written in this stage."""
+        self.bytes_written += os.path.getsize(path)
+        self.files_written += 1
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        if self.profiler.cprofile_top and self.file_name:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        if self.cprofile:
+            self.cprofile.disable()
+        _, peak = tracemalloc.get_traced_memory()
+
+        self.profiler._add({
+            "stage": self.stage,
+            "file": self.file_name,
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "files_read": self.files_read,
+            "files_written": self.files_written,
+            "peak_traced_kb": peak / 1024,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+        }, self.cprofile)
+        return False
+
+class _DisabledStage(nullcontext):
+    """Stand-in returned when profiling is off, so instrumented code does not need to check."""
+
+    def __enter__(self):
+        return self
+
+    def read(self, path):
+        pass
+
+    def written(self, path):
+        pass
+
+_DISABLED_STAGE = _DisabledStage()
+
+class Profiler:
+    """
+    Opt-in profiler for the offline preprocessing pipeline.
+
+    Records wall time, CPU time, bytes and files read/written, peak traced memory (tracemalloc)
+    and peak RSS for each stage and file. Optionally keeps cProfile data for the slowest files.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.cprofile_top = 0
+        self._slowest = []  # (wall_s, label, cProfile.Profile), slowest first
+
+    def enable(self, cprofile_top=0):
+        """
+        Start profiling.
+
+        Args:
+            cprofile_top: Number of slowest files to keep cProfile data for (0 = no cProfile)
+        """
+        self.enabled = True
+        self.records = []
+        self.cprofile_top = cprofile_top
+        self._slowest = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stage(self, stage, file_name=None):
+        """
+        Measure a stage. Use as: with profiler.stage("fft", file_name) as s: ...; s.read(path)
+
+        Stages should not be nested, since the peak memory is reset at the start of each stage.
+        """
+        if not self.enabled:
+            return _DISABLED_STAGE
+        return _StageRecord(self, stage, file_name)
+
+    def _add(self, record, cprofile):
+        self.records.append(record)
+        if cprofile is None:
+            return
+        label = f"{record['stage']}_{os.path.basename(record['file'])}"
+        self._slowest.append((record['wall_s'], label, cprofile))
+        self._slowest.sort(key=lambda item: item[0], reverse=True)
+        del self._slowest[self.cprofile_top:]
+
+    def summary(self):
+        """
+        Aggregate the records per stage.
+
+        Returns:
+            Dictionary of stage -> totals (calls, files, wall/CPU time, bytes, max peak memory)
+        """
+        stages = {}
+        for r in self.records:
+            s = stages.setdefault(r['stage'], {
+                "calls": 0, "files": set(), "wall_s": 0.0, "cpu_s": 0.0, "bytes_read": 0, "bytes_written": 0,
+                "files_read": 0, "files_written": 0, "peak_traced_kb": 0.0, "max_rss_kb": 0
+            })
+            s["calls"] += 1
+            if r['file']:
+                s["files"].add(r['file'])
+            for key in ("wall_s", "cpu_s", "bytes_read", "bytes_written", "files_read", "files_written"):
+                s[key] += r[key]
+            s["peak_traced_kb"] = max(s["peak_traced_kb"], r["peak_traced_kb"])
+            s["max_rss_kb"] = max(s["max_rss_kb"], r["max_rss_kb"])
+
+        for s in stages.values():
+            s["files"] = len(s["files"])
+
+        return stages
+
+    def format_summary(self, stages):
+        """Format the per-stage summary as a human-readable table, slowest stage first."""
+        total_wall = sum(s["wall_s"] for s in stages.values()) or 1.0
+        lines = [f"{'Stage':<40} {'Calls':>6} {'Wall (s)':>9} {'%':>6} {'CPU (s)':>8} {'Read (MB)':>10} "
+                 f"{'Written (MB)':>13} {'Files r/w':>11} {'Peak traced (MB)':>17} {'Max RSS (MB)':>13}"]
+
+        for name, s in sorted(stages.items(), key=lambda item: item[1]["wall_s"], reverse=True):
+            lines.append(f"{name:<40} {s['calls']:>6} {s['wall_s']:>9.3f} {100 * s['wall_s'] / total_wall:>5.1f}% "
+                         f"{s['cpu_s']:>8.3f} {s['bytes_read'] / 1e6:>10.2f} {s['bytes_written'] / 1e6:>13.2f} "
+                         f"{s['files_read']:>5}/{s['files_written']:<5} {s['peak_traced_kb'] / 1024:>17.2f} "
+                         f"{s['max_rss_kb'] / 1024:>13.1f}")
+
+        return "\n".join(lines)
+
+    def write_report(self, output_dir="profile_report"):
+        """
+        Write profile_report.json (summary and per-file records), profile_report.txt (table)
+        and a cProfile dump for each of the slowest files, then print the table.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        stages = self.summary()
+        table = self.format_summary(stages)
+
+        with open(os.path.join(output_dir, "profile_report.json"), 'w') as f:
+            json.dump({"stages": stages, "records": self.records}, f, indent=4)
+        with open(os.path.join(output_dir, "profile_report.txt"), 'w') as f:
+            f.write(table + "\n")
+
+        for rank, (wall, label, cprofile) in enumerate(self._slowest, 1):
+            dump_path = os.path.join(output_dir, f"cprofile_{rank}_{label}.prof")
+            cprofile.dump_stats(dump_path)
+            print(f"cProfile of {label} ({wall:.3f}s) saved to {dump_path}")
+            pstats.Stats(cprofile).sort_stats("cumulative").print_stats(5)
+
+        print(table)
+        print(f"Profile report saved to {output_dir}")
+
+# Shared profiler used by preprocessing.py and feature_extract.py
+profiler = Profiler()
+
+def enable_profiling(cprofile_top=0):
+    """Turn on profiling of the preprocessing and feature extraction functions."""
+    profiler.enable(cprofile_top)
+
+def write_profile_report(output_dir="profile_report"):
+    """Write the profiling report and stop profiling."""
+    profiler.write_report(output_dir)
+    profiler.disable()
+
+# Opt in without code changes, e.g. NOISEWATCH_PROFILE=1 jupyter notebook
+if os.environ.get("NOISEWATCH_PROFILE") == "1":
+    enable_profiling(int(os.environ.get("NOISEWATCH_PROFILE_CPROFILE_TOP", "0")))
@@ -0,0 +1,40 @@
+###########################################################################
+# Incremental dataset builder: one part file per raw log                  #
+# Run from noise_prediction: python -m pytest test_dataset.py            #
+###########################################################################
+
+import os
+import shutil
+
+from dataset import load_dataset, load_manifest, update_dataset
+
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data", "raw_data", "drill11.json")
+
+def test_logs_with_the_same_stem_get_their_own_part(tmp_path):
+    raw_dir = tmp_path / "raw_data"
+    raw_dir.mkdir()
+    shutil.copy(SAMPLE_LOG, raw_dir / "drill1.json")
+    shutil.copy(SAMPLE_LOG, raw_dir / "drill1.txt")
+    dataset_dir = str(tmp_path / "dataset")
+
+    update_dataset(str(raw_dir), dataset_dir)
+
+    sources = load_manifest(dataset_dir)['sources']
+    outputs = [source['output'] for source in sources.values()]
+    assert len(set(outputs)) == 2
+    assert sorted(os.listdir(os.path.join(dataset_dir, "parts"))) == ["drill1.json.csv", "drill1.txt.csv"]
+    # Each log is loaded once
+    assert len(load_dataset(dataset_dir)) == sum(source['frames'] for source in sources.values())
+
+def test_unchanged_logs_are_not_processed_again(tmp_path):
+    raw_dir = tmp_path / "raw_data"
+    raw_dir.mkdir()
+    shutil.copy(SAMPLE_LOG, raw_dir / "drill1.json")
+    dataset_dir = str(tmp_path / "dataset")
+
+    update_dataset(str(raw_dir), dataset_dir)
+    shutil.copy(SAMPLE_LOG, raw_dir / "drill2.json")
+    changes = update_dataset(str(raw_dir), dataset_dir)
+
+    assert changes['added'] == ["drill2.json"]
+    assert changes['unchanged'] == ["drill1.json"]
@@ -0,0 +1,230 @@
+###########################################################################
+# In-process metrics of the sensor bridges, served in Prometheus text     #
+# format on http://<METRICS_ADDRESS>:<METRICS_PORT>/metrics               #
+# Cost of recording a metric: python bridge_metrics.py                    #
+# Canonical copy: rpi/bridge_metrics.py, check with rpi/check_copies.py   #
+###########################################################################
+
+import time
+import timeit
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upload latency buckets (seconds), from a fast Lambda response to the 15 s request timeout
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)
+
+class Counter:
+    """Monotonic count. inc() is a plain attribute add: no lock on the hot path."""
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class Gauge:
+    """Value that goes up and down, e.g. the uploads in flight."""
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum and count."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricFamily:
+    """
+    A named metric and its children, one per combination of label values.
+
+    Hot paths should keep the child returned by labels() instead of looking it up for each sample.
+    """
+
+    def __init__(self, name, help_text, kind, label_names, factory):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *label_values):
+        child = self.children.get(label_values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(label_values, self.factory())
+        return child
+
+class MetricsRegistry:
+    """Metrics of one bridge process, rendered in Prometheus text format on each scrape."""
+
+    def __init__(self, prefix="bridge"):
+        self.prefix = prefix
+        self._start_time = time.monotonic()
+        self._families = []
+        self._rates = []
+        self._callbacks = []
+
+    def _family(self, name, help_text, kind, label_names, factory):
+        family = MetricFamily(f"{self.prefix}_{name}", help_text, kind, label_names, factory)
+        self._families.append(family)
+        # Metrics without labels are used directly
+        return family if label_names else family.labels()
+
+    def counter(self, name, help_text, label_names=()):
+        return self._family(name, help_text, "counter", label_names, Counter)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._family(name, help_text, "gauge", label_names, Gauge)
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._family(name, help_text, "histogram", label_names, lambda: Histogram(buckets))
+
+    def rate(self, name, help_text, counter_family):
+        """
+        Gauge of the per-second rate of each child of a counter family, over the time since the
+        previous scrape (since the registry was created for the first scrape).
+        """
+        self._rates.append((f"{self.prefix}_{name}", help_text, counter_family, {}))
+
+    def callback(self, name, help_text, kind, function, label_names=()):
+        """
+        Metric read from existing state at scrape time.
+
+        Args:
+            function: Returns a number, or a {label values tuple: number} dictionary if label_names are given
+        """
+        self._callbacks.append((f"{self.prefix}_{name}", help_text, kind, tuple(label_names), function))
+
+    def render(self):
+        """All metrics in Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for family in self._families:
+            lines += _header(family.name, family.help_text, family.kind)
+            for label_values, child in list(family.children.items()):
+                labels = _format_labels(family.label_names, label_values)
+                if family.kind == "histogram":
+                    lines += _histogram_lines(family.name, family.label_names, label_values, child)
+                else:
+                    lines.append(f"{family.name}{labels} {_format_value(child.value)}")
+
+        now = time.monotonic()
+        for name, help_text, counter_family, previous in self._rates:
+            lines += _header(name, help_text, "gauge")
+            for label_values, child in list(counter_family.children.items()):
+                value = child.value
+                last_time, last_value = previous.get(label_values, (self._start_time, 0))
+                previous[label_values] = (now, value)
+                if now <= last_time:
+                    continue
+                rate = (value - last_value) / (now - last_time)
+                lines.append(f"{name}{_format_labels(counter_family.label_names, label_values)} {_format_value(rate)}")
+
+        for name, help_text, kind, label_names, function in self._callbacks:
+            lines += _header(name, help_text, kind)
+            values = function()
+            if not label_names:
+                values = {(): values}
+            for label_values, value in list(values.items()):
+                lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+def _header(name, help_text, kind):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(label_names, label_values):
+    if not label_names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+def _histogram_lines(name, label_names, label_values, histogram):
+    lines = []
+    cumulative = 0
+    bounds = [repr(float(bound)) for bound in histogram.buckets] + ["+Inf"]
+    for bound, count in zip(bounds, list(histogram.bucket_counts)):
+        cumulative += count
+        labels = _format_labels(label_names + ("le",), tuple(label_values) + (bound,))
+        lines.append(f"{name}_bucket{labels} {cumulative}")
+    labels = _format_labels(label_names, label_values)
+    lines.append(f"{name}_sum{labels} {repr(float(histogram.sum))}")
+    lines.append(f"{name}_count{labels} {histogram.count}")
+    return lines
+
+def start_metrics_server(registry, port, address="127.0.0.1"):
+    """
+    Serve registry.render() on /metrics from a daemon thread.
+
+    Returns:
+        server: The ThreadingHTTPServer, or None if port is 0 (metrics endpoint disabled)
+    """
+    if not port:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # No print per scrape
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics on http://{address}:{port}/metrics")
+    return server
+
+if __name__ == '__main__':
+    # Time the hot-path calls, as the bridges make them for each sample
+    registry = MetricsRegistry()
+    samples = registry.counter("samples_total", "Samples received", ["device"])
+    device_samples = samples.labels("Block 57 unit 801")
+    buffer_points = registry.gauge("buffer_points", "Points in the window being buffered")
+    latency = registry.histogram("upload_latency_seconds", "Upload latency")
+
+    n = 1000000
+    for name, statement in [
+        ("cached child inc()", device_samples.inc),
+        ("labels(device).inc()", lambda: samples.labels("Block 57 unit 801").inc()),
+        ("gauge set()", lambda: buffer_points.set(12)),
+        ("histogram observe()", lambda: latency.observe(0.3)),
+        ("empty call (overhead)", lambda: None)
+    ]:
+        seconds = min(timeit.repeat(statement, number=n, repeat=5))
+        print(f"{name:<24} {seconds / n * 1e9:>8.1f} ns")
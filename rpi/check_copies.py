@@ -0,0 +1,67 @@
+###########################################################################
+# The bridge modules are copied next to each bridge, the ingest queue     #
+# also next to the Lambda, and the get_house query modules into both      #
+# get_house Lambdas (the archive reader also into match_complaint):       #
+# check that the copies match their canonical file (line endings aside),  #
+# or overwrite them with --sync                                           #
+# Run from anywhere: python rpi/check_copies.py [--sync]                  #
+###########################################################################
+
+import os
+import sys
+import argparse
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Canonical file: its copies, relative to the repository root
+COPIES = {
+    "rpi/ingest_queue.py": ["sensors/esp32cam/ingest_queue.py", "lambda/noise_inference/ingest_queue.py"],
+    "rpi/energy_trigger.py": ["sensors/esp32cam/energy_trigger.py"],
+    "rpi/bridge_metrics.py": ["sensors/esp32cam/bridge_metrics.py"],
+    "lambda/get_house/range_cache.py": ["lambda/get_house_without_label/range_cache.py"],
+    "lambda/get_house/archive.py": ["lambda/get_house_without_label/archive.py", "lambda/match_complaint/archive.py"],
+}
+
+def read_text(path):
+    """Content of a file with LF line endings, and the line ending it uses."""
+    with open(os.path.join(REPO_DIR, path), newline='') as f:
+        content = f.read()
+    return content.replace('\r\n', '\n'), '\r\n' if '\r\n' in content else '\n'
+
+def check_copies(sync=False):
+    """
+    Compare every copy with its canonical file.
+
+    Args:
+        sync: Overwrite the copies that differ with the canonical content, keeping their line endings
+
+    Returns:
+        stale: Copies that differ from their canonical file (before syncing)
+    """
+    stale = []
+    for canonical, copies in COPIES.items():
+        expected, _ = read_text(canonical)
+        for copy in copies:
+            content, newline = read_text(copy)
+            if content == expected:
+                continue
+            stale.append(copy)
+            if sync:
+                with open(os.path.join(REPO_DIR, copy), 'w', newline='') as f:
+                    f.write(expected.replace('\n', newline))
+                print(f"{copy}: updated from {canonical}")
+            else:
+                print(f"{copy}: differs from {canonical}")
+    return stale
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sync', action='store_true', help="Overwrite the stale copies with their canonical file")
+    args = parser.parse_args()
+
+    stale = check_copies(args.sync)
+    if not stale:
+        print(f"All {sum(len(copies) for copies in COPIES.values())} copies match their canonical file")
+    elif not args.sync:
+        print("Edit the canonical file only, then run: python rpi/check_copies.py --sync")
+        sys.exit(1)
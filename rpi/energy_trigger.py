@@ -0,0 +1,177 @@
+###########################################################################
+# Energy-based software trigger for the sensor bridges                    #
+# Replay recorded logs: python energy_trigger.py <raw log JSON files>     #
+# Canonical copy: rpi/energy_trigger.py, check with rpi/check_copies.py   #
+###########################################################################
+
+import os
+import json
+import math
+import argparse
+from collections import deque
+
+# Default trigger settings, tuned on the sample recordings (about 43 samples per second)
+ENERGY_TRIGGER_SETTINGS = {
+    "window": 10,           # Samples in the running RMS
+    "on_ratio": 3.0,        # Trigger when the RMS is above on_ratio x noise floor...
+    "min_duration": 3,      # ...for at least this many consecutive samples
+    "off_ratio": 1.5,       # The event ends when the RMS drops below off_ratio x noise floor (hysteresis)
+    "refractory_ms": 2000,  # No new trigger within this time after the last one
+    "floor_alpha": 0.01,    # Adaptation rate of the noise floor, only updated while quiet
+    "warmup": 50            # Samples used to estimate the initial noise floor, no triggers before that
+}
+
+class EnergyTrigger:
+    """
+    Software trigger for one sensor, fed one sample at a time.
+
+    The running RMS of the last `window` values is compared with an adaptive noise floor.
+    A trigger fires when the RMS stays above on_ratio x floor for min_duration samples, then
+    the event stays active until the RMS drops below off_ratio x floor. The floor follows the
+    RMS slowly while no event is active, so it tracks each sensor's background level.
+    """
+
+    def __init__(self, window=10, on_ratio=3.0, min_duration=3, off_ratio=1.5, refractory_ms=2000,
+                 floor_alpha=0.01, warmup=50):
+        self.on_ratio = on_ratio
+        self.off_ratio = off_ratio
+        self.min_duration = min_duration
+        self.refractory_ms = refractory_ms
+        self.floor_alpha = floor_alpha
+        self.warmup = warmup
+
+        self._squares = deque(maxlen=window)
+        self._sum_squares = 0.0
+        self._above = 0
+        self._last_fire_ms = -math.inf
+
+        self.rms = 0.0
+        self.noise_floor = 0.0
+        self.active = False
+
+        # Decisions, to measure how many uploads the trigger saves
+        self.counters = {
+            "samples": 0,
+            "fired": 0,                   # Triggers that start an upload
+            "suppressed_short": 0,        # Loud runs shorter than min_duration
+            "suppressed_refractory": 0,   # Events within refractory_ms of the last trigger
+            "events_ended": 0             # Events that dropped below the off threshold
+        }
+
+    def update(self, value, timestamp_ms):
+        """
+        Add a sample.
+
+        Returns:
+            fired: True if this sample starts a new triggered window
+        """
+        counters = self.counters
+        counters["samples"] += 1
+
+        # Running RMS over the last `window` samples
+        square = value * value
+        if len(self._squares) == self._squares.maxlen:
+            self._sum_squares -= self._squares[0]
+        self._squares.append(square)
+        self._sum_squares += square
+        self.rms = math.sqrt(max(self._sum_squares, 0.0) / len(self._squares))
+
+        # Initial noise floor: mean RMS of the first samples
+        if counters["samples"] <= self.warmup:
+            self.noise_floor += (self.rms - self.noise_floor) / counters["samples"]
+            return False
+
+        if self.active:
+            if self.rms < self.noise_floor * self.off_ratio:
+                self.active = False
+                counters["events_ended"] += 1
+            return False
+
+        if self.rms > self.noise_floor * self.on_ratio:
+            self._above += 1
+            if self._above < self.min_duration:
+                return False
+
+            self._above = 0
+            self.active = True
+            if timestamp_ms - self._last_fire_ms < self.refractory_ms:
+                counters["suppressed_refractory"] += 1
+                return False
+
+            self._last_fire_ms = timestamp_ms
+            counters["fired"] += 1
+            return True
+
+        if self._above:
+            counters["suppressed_short"] += 1
+            self._above = 0
+
+        # Quiet: let the floor follow the background level
+        self.noise_floor += self.floor_alpha * (self.rms - self.noise_floor)
+        return False
+
+def simulate_uploads(samples, mode, buffer_size=30, settings=None):
+    """
+    Replay samples through the bridge trigger and buffering logic, and count the windows uploaded.
+
+    Args:
+        samples: List of (timestamp_ms, analog_value, digital_value)
+        mode: 'digital' (ESP32 digital trigger), 'energy' (software trigger) or 'either'
+        buffer_size: Data points collected per triggered window (BUFFER_SIZE in the bridges)
+
+    Returns:
+        uploads: Number of windows that would be sent to the Lambda
+        trigger: The EnergyTrigger, with its counters
+    """
+    trigger = EnergyTrigger(**(settings or ENERGY_TRIGGER_SETTINGS))
+    uploads = 0
+    buffered = 0
+
+    for timestamp_ms, analog_value, digital_value in samples:
+        energy_fired = trigger.update(analog_value, timestamp_ms)
+        fired = {"digital": digital_value == 1, "energy": energy_fired,
+                 "either": digital_value == 1 or energy_fired}[mode]
+
+        if buffered == 0 and fired:
+            buffered = 1
+        elif buffered > 0:
+            buffered += 1
+
+        if buffered == buffer_size:
+            uploads += 1
+            buffered = 0
+
+    return uploads, trigger
+
+def load_recording(file_name):
+    """Read a raw log of collect_data_though_rpi.py as a list of (timestamp_ms, analog_value, digital_value)."""
+    with open(file_name, 'r') as f:
+        sensor_data = json.load(f)["sensor_data"]
+    return [(p["timestamp"], float(p["analog_value"]), p.get("digital_value") or 0) for p in sensor_data]
+
+if __name__ == '__main__':
+    # Compare the number of Lambda calls of each trigger mode on recorded data
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='+', help="Raw JSON logs with timestamp, analog_value and digital_value")
+    # The window length differs per bridge, so there is no default to get wrong
+    parser.add_argument('--buffer-size', type=int, required=True,
+                        help="BUFFER_SIZE of the bridge replayed: 20 for rpi/get_MQTT_data.py, "
+                             "30 for sensors/esp32cam/subscriber.py")
+    args = parser.parse_args()
+
+    print(f"{'File':<24} {'Samples':>8} {'Digital':>8} {'Energy':>8} {'Either':>8}  Energy trigger counters")
+    totals = {"digital": 0, "energy": 0, "either": 0}
+    for file_name in args.files:
+        samples = load_recording(file_name)
+        uploads = {}
+        for mode in totals:
+            uploads[mode], trigger = simulate_uploads(samples, mode, args.buffer_size)
+            totals[mode] += uploads[mode]
+            if mode == "energy":
+                counters = trigger.counters
+        print(f"{os.path.basename(file_name):<24} {len(samples):>8} {uploads['digital']:>8} {uploads['energy']:>8} "
+              f"{uploads['either']:>8}  {counters}")
+
+    print(f"{'Total':<24} {'':>8} {totals['digital']:>8} {totals['energy']:>8} {totals['either']:>8}")
+    if totals["digital"]:
+        print(f"\nLambda calls with the energy trigger: {totals['energy'] / totals['digital']:.1%} of the digital trigger's")
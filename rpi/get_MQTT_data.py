@@ -1,43 +1,202 @@
 import paho.mqtt.client as mqtt
+import os
 import json
 import threading
 import time
+import struct
 import requests
 import datetime
 
+from energy_trigger import EnergyTrigger, ENERGY_TRIGGER_SETTINGS
+from bridge_metrics import MetricsRegistry, start_metrics_server
+from ingest_queue import open_queue, enqueue_window
+
 DATA_FILE = 'sensor_data.csv'
 
-MQTT_ADDRESS = '172.20.10.3'
+MQTT_ADDRESS = os.environ.get("MQTT_ADDRESS", '172.20.10.3')
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
 MQTT_USER = 'cloud'
 MQTT_PASSWORD = '123'
 DATA_TOPIC = 'esp1_data'
 STATUS_TOPIC = 'esp1_identifier'
 
 BUFFER_SIZE = 20
+
+# Binary data messages: one sample packed as Unix time (ms, int64), analog value (float32) and
+# digital value (uint8), little endian, 13 bytes instead of about 70 for JSON
+BINARY_SAMPLE = struct.Struct("<qfB")
 data_buffer = []
 buffer_counter = 0
 CURRENT_SENDER_ID = "unknown_sender"
 
+# What starts a window: 'digital' (the ESP32 digital trigger), 'energy' (software trigger
+# on the RMS energy, see energy_trigger.py) or 'either'
+TRIGGER_MODE = os.environ.get("TRIGGER_MODE", "digital")
+
+# One software trigger per sender, each with its own noise floor
+energy_triggers = {}
+
+# Upload retries on network errors and 5xx responses, before the window is dropped
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", "2"))
+
+# Where full windows go: unset posts each one to the inference endpoint. An SQS queue URL, or a
+# directory for the local FileQueue, enqueues them instead for the batched consumer (ingest_queue.py)
+INGEST_QUEUE = os.environ.get("INGEST_QUEUE")
+ingest_queue = open_queue(INGEST_QUEUE) if INGEST_QUEUE else None
+
+# Prometheus endpoint of this bridge, METRICS_PORT=0 to disable it
+METRICS_ADDRESS = os.environ.get("METRICS_ADDRESS", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9101"))
+
+metrics = MetricsRegistry()
+samples_total = metrics.counter("samples_total", "Samples received", ["device"])
+metrics.rate("samples_per_second", "Samples received per second since the previous scrape", samples_total)
+parse_errors_total = metrics.counter("parse_errors_total", "Samples with a field that could not be parsed", ["field"])
+triggers_total = metrics.counter("triggers_total", "Samples on which a trigger fired", ["device", "source"])
+metrics.rate("triggers_per_second", "Triggers per second since the previous scrape", triggers_total)
+windows_total = metrics.counter("windows_total", "Windows started by the trigger of TRIGGER_MODE", ["device"])
+buffer_points = metrics.gauge("buffer_points", "Points in the window being buffered")
+uploads_in_flight = metrics.gauge("uploads_in_flight", "Full windows waiting for their upload or enqueue to finish")
+uploads_total = metrics.counter("uploads_total", "Upload and enqueue attempts by result", ["result"])
+upload_retries_total = metrics.counter("upload_retries_total", "Upload attempts after a failed one")
+upload_drops_total = metrics.counter("upload_drops_total", "Windows dropped after the last retry failed")
+upload_latency = metrics.histogram("upload_latency_seconds", "Time until the Lambda endpoint answered")
+metrics.callback("energy_trigger_decisions_total", "Decisions of each sender's software trigger", "counter",
+                 lambda: {(sender_id, decision): value
+                          for sender_id, trigger in list(energy_triggers.items())
+                          for decision, value in trigger.counters.items()},
+                 ["device", "decision"])
+
+# The upload metrics are updated from the sender threads
+upload_metrics_lock = threading.Lock()
+
+# Per-sender trigger and metric children, looked up once per sample
+senders = {}
+
+def check_trigger(sender_id, analog_value, digital_value, timestamp_ms):
+    """
+    Update the sender's software trigger with a sample and return whether a window should start.
+
+    The software trigger sees every sample, also while a window is being buffered, so that its
+    noise floor and refractory period stay up to date.
+    """
+    sender = senders.get(sender_id)
+    if sender is None:
+        energy_triggers[sender_id] = EnergyTrigger(**ENERGY_TRIGGER_SETTINGS)
+        sender = senders[sender_id] = (
+            energy_triggers[sender_id],
+            samples_total.labels(sender_id),
+            triggers_total.labels(sender_id, "digital"),
+            triggers_total.labels(sender_id, "energy")
+        )
+    trigger, samples, digital_triggers, energy_triggers_fired = sender
+
+    energy_fired = trigger.update(analog_value, timestamp_ms)
+    digital_fired = digital_value == 1
+    samples.inc()
+    digital_triggers.inc(digital_fired)
+    energy_triggers_fired.inc(energy_fired)
+
+    if TRIGGER_MODE == "energy":
+        return energy_fired
+    if TRIGGER_MODE == "either":
+        return energy_fired or digital_fired
+    return digital_fired
+
+def post_with_retries(api_endpoint, lambda_data):
+    """
+    POST the window, retrying network errors and 5xx responses up to UPLOAD_RETRIES times.
+
+    Returns:
+        response: The last response, or None if every attempt failed with a network error
+    """
+    response = None
+    for attempt in range(UPLOAD_RETRIES + 1):
+        if attempt:
+            with upload_metrics_lock:
+                upload_retries_total.inc()
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
+        start = time.monotonic()
+        try:
+            response = requests.post(
+            api_endpoint,
+            json=lambda_data,
+            headers={'Content-Type': 'application/json'},
+            timeout=15
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"Network error: {e}")
+            with upload_metrics_lock:
+                uploads_total.labels("network_error").inc()
+            continue
+
+        with upload_metrics_lock:
+            upload_latency.observe(time.monotonic() - start)
+            uploads_total.labels("ok" if response.status_code == 200 else "http_error").inc()
+        # Client errors fail the same way again
+        if response.status_code < 500:
+            break
+    return response
+
+def enqueue_with_retries(final_payload):
+    """
+    Enqueue the window for the batched consumer, retrying failed sends UPLOAD_RETRIES times.
+
+    Returns:
+        Whether the window was enqueued
+    """
+    for attempt in range(UPLOAD_RETRIES + 1):
+        if attempt:
+            with upload_metrics_lock:
+                upload_retries_total.inc()
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
+        start = time.monotonic()
+        try:
+            enqueue_window(ingest_queue, final_payload)
+        except Exception as e:
+            print(f"Enqueue error: {e}")
+            with upload_metrics_lock:
+                uploads_total.labels("queue_error").inc()
+            continue
+
+        with upload_metrics_lock:
+            upload_latency.observe(time.monotonic() - start)
+            uploads_total.labels("queued").inc()
+        return True
+
+    with upload_metrics_lock:
+        upload_drops_total.inc()
+    return False
+
 def send_to_lambda_blocking(final_payload):
-    time.sleep(0.5)
+    try:
+        if ingest_queue is not None:
+            enqueue_with_retries(final_payload)
+            return
+
+        time.sleep(0.5)
 
-    lambda_data = final_payload
+        lambda_data = final_payload
 
-    API_ENDPOINT = "lambda_end_point"
+        API_ENDPOINT = "lambda_end_point"
 
-    response = requests.post(
-    API_ENDPOINT,
-    json=lambda_data,
-    headers={'Content-Type': 'application/json'}
-    )
+        response = post_with_retries(API_ENDPOINT, lambda_data)
 
-    if response.status_code == 200:
-        result = response.json()
-        print(f"Predicted label: {result['predicted_label']}")
-    else:
-        print(f"Error: {response.status_code}")
-        print(response.text)
-        print("\n=======================================================")
+        if response is not None and response.status_code == 200:
+            result = response.json()
+            print(f"Predicted label: {result['predicted_label']}")
+        else:
+            with upload_metrics_lock:
+                upload_drops_total.inc()
+            if response is not None:
+                print(f"Error: {response.status_code}")
+                print(response.text)
+            print("\n=======================================================")
+    finally:
+        with upload_metrics_lock:
+            uploads_in_flight.dec()
 
     print(f"LAMBDA SEND COMPLETE (THREAD):")
     print(f"Start Time: {final_payload['start_time']}")
@@ -45,6 +204,17 @@ def send_to_lambda_blocking(final_payload):
     print(f"Payload Preview: {json.dumps(final_payload['data'][:3], indent=2)} ...")
     print("=======================================================\n")
 
+def decode_sample(payload):
+    """
+    Timestamp, analog and digital value of a data message: a JSON object, or one binary sample.
+
+    The timestamp is a "%Y-%m-%d %H:%M:%S.%f" string (KY-037 publisher) or Unix time in ms (INMP441 publisher and binary samples).
+    """
+    if len(payload) == BINARY_SAMPLE.size and payload[:1] != b'{':
+        return BINARY_SAMPLE.unpack(payload)
+    data = json.loads(payload.decode('utf-8'))
+    return data.get("timestamp", "N/A"), data.get("analog", "N/A"), data.get("digital", "N/A")
+
 def on_connect(client, userdata, flags, rc):
     """ The callback for when the client receives a CONNACK response from the server."""
     print('Connected with result code ' + str(rc))
@@ -63,28 +233,30 @@ def on_message(client, userdata, msg):
     if msg.topic != DATA_TOPIC:
         return
     try:
-        payload_str = msg.payload.decode('utf-8') 
-        data = json.loads(payload_str)
-        
-        timestamp = data.get("timestamp", "N/A")
-        analog_value = data.get("analog", "N/A")
-        digital_value = data.get("digital", "N/A")
+        timestamp, analog_value, digital_value = decode_sample(msg.payload)
 
         try:
             analog_value_float = float(analog_value)
         except (ValueError, TypeError):
+            parse_errors_total.labels("analog").inc()
             analog_value_float = 0.0
 
         try:
-            dt_object = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f")
-            timestamp_ms_float = dt_object.timestamp() * 1000.0
-        except ValueError:
-            print(f"Warning: Timestamp format error for '{timestamp}'. Using current system time.")
+            if isinstance(timestamp, (int, float)):
+                timestamp_ms_float = float(timestamp)
+            else:
+                dt_object = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f")
+                timestamp_ms_float = dt_object.timestamp() * 1000.0
+        except (ValueError, TypeError):
+            # Counted instead of printed: a sender with the wrong format would print on every sample
+            parse_errors_total.labels("timestamp").inc()
             timestamp_ms_float = time.time() * 1000.0
 
-        if buffer_counter == 0 and digital_value == 1:
+        triggered = check_trigger(CURRENT_SENDER_ID, analog_value_float, digital_value, timestamp_ms_float)
+        if buffer_counter == 0 and triggered:
             buffer_counter = 1 
-            print(f"\n*** TRIGGER START! @ {timestamp} ***")
+            windows_total.labels(CURRENT_SENDER_ID).inc()
+            print(f"\n*** TRIGGER START ({TRIGGER_MODE})! @ {timestamp} ***")
         if buffer_counter > 0:
             point = {
                 "timestamp": timestamp_ms_float,
@@ -102,6 +274,8 @@ def on_message(client, userdata, msg):
                 }
                 
                 # prevent calling lamda block the refresh of buffer
+                with upload_metrics_lock:
+                    uploads_in_flight.inc()
                 sender_thread = threading.Thread(
                     target=send_to_lambda_blocking, 
                     args=(final_payload,)
@@ -113,20 +287,26 @@ def on_message(client, userdata, msg):
                 print("--- SEQUENZE COMPLETE. Buffer cleared, send job initiated in background. ---")
             else:
                 buffer_counter += 1
-                print(f"  [Buffer] Added point {buffer_counter-1}/{BUFFER_SIZE}")
+            buffer_points.set(len(data_buffer))
 
-    except json.JSONDecodeError:
-        print(f"Error decoding JSON: {msg.payload.decode('utf-8')}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        parse_errors_total.labels("json").inc()
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
 def main():
-    mqtt_client = mqtt.Client()
+    start_metrics_server(metrics, METRICS_PORT, METRICS_ADDRESS)
+
+    try:
+        mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    except AttributeError:
+        # paho-mqtt < 2.0 has no callback API versions
+        mqtt_client = mqtt.Client()
     mqtt_client.username_pw_set(MQTT_USER, MQTT_PASSWORD)
     mqtt_client.on_connect = on_connect
     mqtt_client.on_message = on_message
 
-    mqtt_client.connect(MQTT_ADDRESS, 1883)
+    mqtt_client.connect(MQTT_ADDRESS, MQTT_PORT)
     mqtt_client.loop_forever()
 
 
@@ -0,0 +1,119 @@
+import time
+import numpy as np
+
+# Bytes requested when nothing is waiting: blocks until the next line starts or the port timeout
+MIN_READ_SIZE = 1
+
+class SerialBatchReader:
+    """
+    Reads "RMS_VALUE|DIGITAL_TRIGGER" lines from the ESP32 in batches.
+
+    Each call drains every byte waiting on the port, keeps the unfinished last line in a reusable
+    buffer and decodes all complete lines at once into NumPy arrays. Timestamps come from a sample
+    counter anchored to the monotonic clock (one sample every sample_interval_ms), so the USB
+    batching jitter of the receipt time does not leak into them. The counter is re-anchored to the
+    receipt time when it drifts more than max_drift_ms from it, e.g. after a gap in the stream.
+    """
+
+    def __init__(self, ser, sample_interval_ms, max_drift_ms=250.0):
+        self.ser = ser
+        self.sample_interval_ms = sample_interval_ms
+        self.max_drift_ms = max_drift_ms
+
+        self._pending = bytearray()
+        # Wall clock time of the monotonic clock's zero, taken once so NTP steps do not move timestamps
+        self._wall_offset_ms = time.time() * 1000.0 - time.monotonic() * 1000.0
+        self._next_ms = None  # Monotonic time of the next sample
+        self._first_ms = None
+
+        self.counters = {
+            "batches": 0,
+            "samples": 0,
+            "malformed": 0,  # Lines skipped by the fallback parser
+            "reanchors": 0   # Times the sample counter was moved back to the receipt time
+        }
+
+    def read_batch(self):
+        """
+        Read every complete line available.
+
+        Returns:
+            timestamps: Array of timestamps (ms since epoch)
+            analog_values: Array of RMS values
+            digital_values: Array of digital trigger values
+            or None if no complete line arrived before the port timeout
+        """
+        ser = self.ser
+        data = ser.read(ser.in_waiting or MIN_READ_SIZE)
+        if not data:
+            return None
+        self._pending += data
+
+        end = self._pending.rfind(b'\n')
+        if end < 0:
+            return None
+        lines = bytes(self._pending[:end + 1])
+        del self._pending[:end + 1]
+
+        analog_values, digital_values = self._decode(lines)
+        if len(analog_values) == 0:
+            return None
+
+        self.counters["batches"] += 1
+        self.counters["samples"] += len(analog_values)
+        return self._timestamps(len(analog_values)), analog_values, digital_values
+
+    def _decode(self, lines):
+        """Parse complete lines, in one NumPy conversion when the whole batch is well formed."""
+        n_lines = lines.count(b'\n')
+        tokens = lines.replace(b'|', b' ').split()
+        if lines.count(b'|') == n_lines and len(tokens) == 2 * n_lines:
+            try:
+                values = np.array(tokens).astype(np.float64).reshape(n_lines, 2)
+                return values[:, 0], values[:, 1].astype(np.int8)
+            except ValueError:
+                pass
+
+        # Malformed or partial lines (e.g. after a reset): parse line by line and skip the bad ones
+        analog_values = []
+        digital_values = []
+        for line in lines.split(b'\n'):
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(b'|')
+            try:
+                if len(parts) != 2:
+                    raise ValueError
+                analog_value = float(parts[0])
+                digital_value = int(parts[1])
+            except ValueError:
+                self.counters["malformed"] += 1
+                continue
+            analog_values.append(analog_value)
+            digital_values.append(digital_value)
+
+        return np.array(analog_values, dtype=np.float64), np.array(digital_values, dtype=np.int8)
+
+    def _timestamps(self, n):
+        """Timestamps of the next n samples from the sample counter."""
+        interval = self.sample_interval_ms
+        now_ms = time.monotonic() * 1000.0
+
+        # The last sample of the batch arrived just before now
+        if self._next_ms is None or abs(now_ms - (self._next_ms + (n - 1) * interval)) > self.max_drift_ms:
+            if self._next_ms is not None:
+                self.counters["reanchors"] += 1
+            self._next_ms = now_ms - (n - 1) * interval
+            if self._first_ms is None:
+                self._first_ms = self._next_ms
+
+        timestamps = self._wall_offset_ms + self._next_ms + np.arange(n) * interval
+        self._next_ms += n * interval
+        return timestamps
+
+    def measured_interval_ms(self):
+        """Mean interval between samples since the first batch, to check sample_interval_ms against."""
+        if self._first_ms is None or self.counters["samples"] < 2:
+            return None
+        return (time.monotonic() * 1000.0 - self._first_ms) / (self.counters["samples"] - 1)
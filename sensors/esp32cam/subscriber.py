@@ -7,6 +7,11 @@ import json
 import threading
 import requests
 
+from energy_trigger import EnergyTrigger, ENERGY_TRIGGER_SETTINGS
+from serial_reader import SerialBatchReader
+from bridge_metrics import MetricsRegistry, start_metrics_server
+from ingest_queue import open_queue, enqueue_window
+
 # --- CONFIGURATION (SERIAL CONNECTION) ---
 # Check 'ls /dev/tty*' to confirm this name
 SERIAL_PORT = '/dev/ttyUSB0' 
@@ -16,17 +21,100 @@ BAUD_RATE = 115200
 API_ENDPOINT = "https://your-api-id.execute-api.region.amazonaws.com/stage/your-path" 
 BUFFER_SIZE = 30 # Data points to collect on trigger
 DEVICE_ID = "Block 57 unit 801" # Hardcode the ID since we aren't using MQTT IDENTIFIER_TOPIC
+SAMPLE_INTERVAL_MS = float(os.environ.get("SAMPLE_INTERVAL_MS", "23")) # Time between ESP32 lines, used for the timestamps
+
+# What starts a window: 'digital' (the ESP32 QUIET_THRESHOLD bit), 'energy' (software trigger
+# on the RMS energy, see energy_trigger.py) or 'either'
+TRIGGER_MODE = os.environ.get("TRIGGER_MODE", "digital")
 
 # --- GLOBAL STATE ---
 data_buffer = []
 buffer_counter = 0
+energy_trigger = EnergyTrigger(**ENERGY_TRIGGER_SETTINGS)
+
+# Upload retries on network errors and 5xx responses, before the window is dropped
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", "2"))
+
+# Where full windows go: unset posts each one to the inference endpoint. An SQS queue URL, or a
+# directory for the local FileQueue, enqueues them instead for the batched consumer (ingest_queue.py)
+INGEST_QUEUE = os.environ.get("INGEST_QUEUE")
+ingest_queue = open_queue(INGEST_QUEUE) if INGEST_QUEUE else None
+
+# Prometheus endpoint of this bridge, METRICS_PORT=0 to disable it
+METRICS_ADDRESS = os.environ.get("METRICS_ADDRESS", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9102"))
+
+# --- METRICS ---
+metrics = MetricsRegistry()
+samples_total = metrics.counter("samples_total", "Samples received", ["device"])
+metrics.rate("samples_per_second", "Samples received per second since the previous scrape", samples_total)
+triggers_total = metrics.counter("triggers_total", "Samples on which a trigger fired", ["device", "source"])
+metrics.rate("triggers_per_second", "Triggers per second since the previous scrape", triggers_total)
+windows_total = metrics.counter("windows_total", "Windows started by the trigger of TRIGGER_MODE", ["device"])
+buffer_points = metrics.gauge("buffer_points", "Points in the window being buffered")
+uploads_in_flight = metrics.gauge("uploads_in_flight", "Full windows waiting for their upload or enqueue to finish")
+uploads_total = metrics.counter("uploads_total", "Upload and enqueue attempts by result", ["result"])
+upload_retries_total = metrics.counter("upload_retries_total", "Upload attempts after a failed one")
+upload_drops_total = metrics.counter("upload_drops_total", "Windows dropped after the last retry failed")
+upload_latency = metrics.histogram("upload_latency_seconds", "Time until the Lambda endpoint answered")
+metrics.callback("energy_trigger_decisions_total", "Decisions of the software trigger", "counter",
+                 lambda: {(DEVICE_ID, decision): value for decision, value in energy_trigger.counters.items()},
+                 ["device", "decision"])
+
+# Hot path children, looked up once
+device_samples = samples_total.labels(DEVICE_ID)
+digital_triggers = triggers_total.labels(DEVICE_ID, "digital")
+energy_triggers_fired = triggers_total.labels(DEVICE_ID, "energy")
+device_windows = windows_total.labels(DEVICE_ID)
+
+# The upload metrics are updated from the sender threads
+upload_metrics_lock = threading.Lock()
 
 # ----------------------------------------------------
 # HELPER FUNCTION: LAMBDA SENDER
 # ----------------------------------------------------
 
+def enqueue_with_retries(final_payload):
+    """
+    Enqueue the window for the batched consumer, retrying failed sends UPLOAD_RETRIES times.
+
+    Returns:
+        Whether the window was enqueued
+    """
+    for attempt in range(UPLOAD_RETRIES + 1):
+        if attempt:
+            with upload_metrics_lock:
+                upload_retries_total.inc()
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
+        start = time.monotonic()
+        try:
+            enqueue_window(ingest_queue, final_payload)
+        except Exception as e:
+            print(f"Enqueue error: {e}")
+            with upload_metrics_lock:
+                uploads_total.labels("queue_error").inc()
+            continue
+
+        with upload_metrics_lock:
+            upload_latency.observe(time.monotonic() - start)
+            uploads_total.labels("queued").inc()
+        return True
+
+    with upload_metrics_lock:
+        upload_drops_total.inc()
+    return False
+
 def send_to_lambda_blocking(final_payload):
     """ Executes the HTTP POST request to the Lambda endpoint in a separate thread. """
+
+    if ingest_queue is not None:
+        try:
+            enqueue_with_retries(final_payload)
+        finally:
+            with upload_metrics_lock:
+                uploads_in_flight.dec()
+        return
     
     # ... (Lambda sending logic remains the same) ...
     
@@ -45,23 +133,48 @@ def send_to_lambda_blocking(final_payload):
     print(f"Payload Preview: {json.dumps(final_payload['data'][:3], indent=2)} ...")
     print("=======================================================")
     
-    # Execute POST Request
+    # Execute POST Request, retrying network errors and 5xx responses
+    delivered = False
     try:
-        response = requests.post(
-            API_ENDPOINT,
-            json=lambda_data,
-            headers={'Content-Type': 'application/json'},
-            timeout=15
-        )
-
-        if response.status_code == 200:
-            result = response.json()
-            print(f"✅ API Success: Predicted label: {result.get('predicted_label', 'No Label')}")
-        else:
+        for attempt in range(UPLOAD_RETRIES + 1):
+            if attempt:
+                with upload_metrics_lock:
+                    upload_retries_total.inc()
+                time.sleep(0.5 * 2 ** (attempt - 1))
+
+            start = time.monotonic()
+            try:
+                response = requests.post(
+                    API_ENDPOINT,
+                    json=lambda_data,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=15
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Network/Connection Error: {e}")
+                with upload_metrics_lock:
+                    uploads_total.labels("network_error").inc()
+                continue
+
+            with upload_metrics_lock:
+                upload_latency.observe(time.monotonic() - start)
+                uploads_total.labels("ok" if response.status_code == 200 else "http_error").inc()
+
+            if response.status_code == 200:
+                result = response.json()
+                print(f"✅ API Success: Predicted label: {result.get('predicted_label', 'No Label')}")
+                delivered = True
+                break
+
             print(f"❌ API Error: Status {response.status_code}. Response: {response.text[:100]}...")
-            
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Network/Connection Error: {e}")
+            # Client errors fail the same way again
+            if response.status_code < 500:
+                break
+    finally:
+        with upload_metrics_lock:
+            uploads_in_flight.dec()
+            if not delivered:
+                upload_drops_total.inc()
 
     print("--- LAMBDA SEND COMPLETE ---\n")
 
@@ -69,12 +182,73 @@ def send_to_lambda_blocking(final_payload):
 # MAIN RECEIVER FUNCTION (Serial Listener)
 # ----------------------------------------------------
 
-def serial_listener():
+def handle_sample(timestamp_float, analog_value_float, digital_value_int):
+    """ Runs the trigger and buffering logic for one data point, and sends full buffers. """
     global data_buffer, buffer_counter
+
+    # --- Trigger and Buffering Logic ---
+    
+    # The software trigger sees every sample, so its noise floor stays up to date while buffering
+    energy_fired = energy_trigger.update(analog_value_float, timestamp_float)
+    digital_fired = digital_value_int == 1
+    device_samples.inc()
+    digital_triggers.inc(digital_fired)
+    energy_triggers_fired.inc(energy_fired)
+
+    if TRIGGER_MODE == "energy":
+        triggered = energy_fired
+    elif TRIGGER_MODE == "either":
+        triggered = energy_fired or digital_fired
+    else:
+        triggered = digital_fired
+
+    # Trigger Start: Start buffering ONLY when buffer is empty AND the trigger fired
+    if buffer_counter == 0 and triggered:
+        buffer_counter = 1 
+        device_windows.inc()
+        print(f"\n*** TRIGGER START ({TRIGGER_MODE})! - RMS: {analog_value_float:.2f} ***") 
+    
+    # Buffering Logic
+    if buffer_counter > 0:
+        point = {
+            "timestamp": timestamp_float,
+            "analog_value": analog_value_float
+        }
+        data_buffer.append(point)
+        
+        # CRITICAL: Increment the counter after a point is added
+        buffer_counter += 1
+        
+        # Check if we have collected the required number of samples (BUFFER_SIZE=30)
+        if buffer_counter > BUFFER_SIZE: 
+            print(f"✅ Buffer Full. Preparing to send {len(data_buffer)} points.")
+            
+            final_payload = {
+                "start_time": data_buffer[0]['timestamp'],
+                "house_id": DEVICE_ID, 
+                "data": data_buffer
+            }
+            
+            # Send in Background Thread
+            with upload_metrics_lock:
+                uploads_in_flight.inc()
+            sender_thread = threading.Thread(
+                target=send_to_lambda_blocking, 
+                args=(final_payload,)
+            )
+            sender_thread.start()
+            
+            # Reset state
+            data_buffer = [] 
+            buffer_counter = 0
+        buffer_points.set(len(data_buffer))
+
+def serial_listener():
+    start_metrics_server(metrics, METRICS_PORT, METRICS_ADDRESS)
     
     # 1. Setup Serial Connection
     try:
-        # Note: timeout=None for blocking read, but we use a small timeout for robustness
+        # The reader drains whatever is waiting; the timeout only bounds the wait for the next line
         ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=0.5) 
         ser.reset_input_buffer()
         print(f"✅ Serial connection established on {SERIAL_PORT} at {BAUD_RATE} baud.")
@@ -84,70 +258,27 @@ def serial_listener():
         return
         
     print(f"Listening for acoustic data from ESP32-CAM ({DEVICE_ID})...")
+    reader = SerialBatchReader(ser, SAMPLE_INTERVAL_MS)
+    metrics.callback("parse_errors_total", "Serial lines that could not be parsed", "counter",
+                     lambda: reader.counters["malformed"])
+    metrics.callback("serial_reader_total", "Serial reader batches, samples, malformed lines and re-anchors", "counter",
+                     lambda: {(name,): value for name, value in reader.counters.items()}, ["counter"])
+    metrics.callback("serial_measured_interval_ms", "Measured interval between ESP32 lines, to check SAMPLE_INTERVAL_MS",
+                     "gauge", lambda: reader.measured_interval_ms() or 0.0)
     
     while True:
         try:
-            # 2. Read Data Line
-            line = ser.readline().decode('utf-8').strip()
-            
-            if not line:
-                continue
-            
-            # Data format: "RMS_VALUE|DIGITAL_TRIGGER"
-            parts = line.split('|')
-            if len(parts) != 2:
-                # print(f"Warning: Skipping malformed line: {line}") # Uncomment for deeper debugging
+            # 2. Read every complete line waiting on the port
+            # Data format: "RMS_VALUE|DIGITAL_TRIGGER", timestamps from the sample counter (ESP32-CAM doesn't have NTP time)
+            batch = reader.read_batch()
+            if batch is None:
                 continue
+            timestamps, analog_values, digital_values = batch
 
-            # 3. Parse Data
-            try:
-                analog_value_float = float(parts[0])
-                digital_value_int = int(parts[1])
-            except ValueError:
-                # print("Warning: Skipping line due to parsing error.")
-                continue
-
-            # Generate precise timestamp at time of receipt (since ESP32-CAM doesn't have NTP time)
-            timestamp_float = time.time() * 1000.0
-            
-            # --- Trigger and Buffering Logic ---
-            
-            # Trigger Start: Start buffering ONLY when buffer is empty AND digital state is 1
-            if buffer_counter == 0 and digital_value_int == 1:
-                buffer_counter = 1 
-                print(f"\n*** TRIGGER START! - RMS: {analog_value_float:.2f} ***") 
-            
-            # Buffering Logic
-            if buffer_counter > 0:
-                point = {
-                    "timestamp": timestamp_float,
-                    "analog_value": analog_value_float
-                }
-                data_buffer.append(point)
-                
-                # CRITICAL: Increment the counter after a point is added
-                buffer_counter += 1
-                
-                # Check if we have collected the required number of samples (BUFFER_SIZE=30)
-                if buffer_counter > BUFFER_SIZE: 
-                    print(f"✅ Buffer Full. Preparing to send {len(data_buffer)} points.")
-                    
-                    final_payload = {
-                        "start_time": data_buffer[0]['timestamp'],
-                        "house_id": DEVICE_ID, 
-                        "data": data_buffer
-                    }
-                    
-                    # Send in Background Thread
-                    sender_thread = threading.Thread(
-                        target=send_to_lambda_blocking, 
-                        args=(final_payload,)
-                    )
-                    sender_thread.start()
-                    
-                    # Reset state
-                    data_buffer = [] 
-                    buffer_counter = 0
+            # 3. Trigger and buffer each data point
+            for timestamp_float, analog_value_float, digital_value_int in zip(
+                    timestamps.tolist(), analog_values.tolist(), digital_values.tolist()):
+                handle_sample(timestamp_float, analog_value_float, digital_value_int)
 
         except KeyboardInterrupt:
             print("\nExiting serial listener.")